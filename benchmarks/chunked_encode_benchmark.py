@@ -0,0 +1,55 @@
+"""
+scale_video 分片并行编码：加速比随分片数的变化
+
+用法：
+    python benchmarks/chunked_encode_benchmark.py [--input video.mp4] [--chunks 1,2,4,8,16] [--width 640]
+
+不指定 --input 时用 lavfi 生成一段 60 秒 1080p、每 2 秒一个关键帧的测试视频。
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import ffmpeg_mcp.cut_video as cut_video  # noqa: E402
+
+
+def make_input(folder):
+    path = os.path.join(folder, "bench_src.mp4")
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=30:duration=60",
+         "-f", "lavfi", "-i", "sine=frequency=440:duration=60",
+         "-c:v", "libx264", "-g", "60", "-c:a", "aac", "-shortest", path],
+        capture_output=True, check=True,
+    )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input")
+    parser.add_argument("--chunks", default="1,2,4,8,16")
+    parser.add_argument("--width", type=int, default=640)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="chunk_bench_")
+    source = args.input or make_input(folder)
+    print(f"cpu_count={os.cpu_count()} input={source}")
+    print(f"{'chunks':>7} {'status':>7} {'wall(s)':>9} {'speedup':>8}")
+    baseline = None
+    for chunks in [int(c) for c in args.chunks.split(",")]:
+        output = os.path.join(folder, f"scaled_{chunks}.mp4")
+        begin = time.time()
+        result = cut_video.scale_video(source, args.width, -2, output, chunks=chunks)
+        wall = time.time() - begin
+        if baseline is None:
+            baseline = wall
+        print(f"{chunks:>7} {result[0]:>7} {wall:>9.2f} {baseline / wall:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+concat_videos(fast=False) 单层滤镜拼接 vs 分层拼接 的耗时和内存对比
+
+用法：
+    python benchmarks/concat_tree_benchmark.py [--counts 10,50,100,250,500,1000] [--clip-seconds 1]
+
+每个测量在独立的 Python 子进程中执行，峰值内存取该子进程内最大的单个 ffmpeg 进程 RSS
+（resource.RUSAGE_CHILDREN），单层模式在输入较多时可能因文件描述符或内存不足而失败。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def make_clips(folder, count, seconds):
+    """用 lavfi 生成 count 个小测试片段（复用同一个源文件的硬链接/拷贝）"""
+    src = os.path.join(folder, "src.mp4")
+    if not os.path.exists(src):
+        subprocess.run(
+            ["ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=25:duration={seconds}",
+             "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+             "-c:v", "libx264", "-c:a", "aac", "-shortest", src],
+            capture_output=True, check=True,
+        )
+    clips = []
+    for i in range(count):
+        path = os.path.join(folder, f"clip_{i:04d}.mp4")
+        if not os.path.exists(path):
+            try:
+                os.link(src, path)
+            except OSError:
+                subprocess.run(["cp", src, path], check=True)
+        clips.append(path)
+    return clips
+
+
+def run_single(mode, count, folder, seconds):
+    import resource
+    import ffmpeg_mcp.cut_video as cut_video
+    import ffmpeg_mcp.ffmpeg as ffmpeg
+
+    clips = make_clips(folder, count, seconds)
+    fmt_ctx = ffmpeg.media_format_ctx(clips[0])
+    output = os.path.join(folder, f"out_{mode}_{count}.mp4")
+    begin = time.time()
+    if mode == "flat":
+        result = cut_video._concat_filter(clips, output, fmt_ctx, timeout=3600)
+        fan_in = count
+    else:
+        v = fmt_ctx.video_streams[0]
+        fan_in = cut_video._concat_fan_in(v.width, v.height, cut_video.NORMALIZE_WORKERS)
+        result = cut_video._concat_tree(clips, output, fmt_ctx, fan_in)
+    wall = time.time() - begin
+    peak_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({"mode": mode, "count": count, "status": result[0], "fan_in": fan_in,
+                      "wall": round(wall, 2), "peak_rss_mb": round(peak_kb / 1024, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="10,50,100,250,500,1000")
+    parser.add_argument("--clip-seconds", type=float, default=1)
+    parser.add_argument("--run", nargs=3, metavar=("MODE", "COUNT", "FOLDER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        mode, count, folder = args.run
+        run_single(mode, int(count), folder, args.clip_seconds)
+        return
+
+    folder = tempfile.mkdtemp(prefix="concat_bench_")
+    print(f"{'N':>6} {'mode':>6} {'fan_in':>7} {'status':>7} {'wall(s)':>9} {'peak RSS(MB)':>13}")
+    for count in [int(c) for c in args.counts.split(",")]:
+        for mode in ("flat", "tree"):
+            proc = subprocess.run(
+                [sys.executable, __file__, "--clip-seconds", str(args.clip_seconds), "--run", mode, str(count), folder],
+                capture_output=True, text=True,
+            )
+            lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+            if not lines:
+                print(f"{count:>6} {mode:>6} {'-':>7} {'crash':>7}")
+                continue
+            r = json.loads(lines[-1])
+            print(f"{count:>6} {mode:>6} {r['fan_in']:>7} {r['status']:>7} {r['wall']:>9} {r['peak_rss_mb']:>13}")
+
+
+if __name__ == "__main__":
+    main()
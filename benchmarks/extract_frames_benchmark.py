@@ -0,0 +1,65 @@
+"""
+extract_frames_from_video 分片抽取全部帧：吞吐（帧/秒）随分片数的变化
+
+用法：
+    python benchmarks/extract_frames_benchmark.py [--input video.mp4] [--shards 1,2,4,8] [--format 0]
+
+不指定 --input 时用 lavfi 生成一段 20 秒 720p、每 2 秒一个关键帧的测试视频。
+每次运行后检查输出编号是否从 frame_0001 起连续，与不分片时一致。
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import ffmpeg_mcp.cut_video as cut_video  # noqa: E402
+
+
+def make_input(folder):
+    path = os.path.join(folder, "bench_src.mp4")
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=20",
+         "-c:v", "libx264", "-g", "60", path],
+        capture_output=True, check=True,
+    )
+    return path
+
+
+def contiguous(folder):
+    names = sorted(f for f in os.listdir(folder) if f.startswith("frame_"))
+    expected = [f"frame_{i:04d}{os.path.splitext(n)[1]}" for i, n in enumerate(names, 1)]
+    return len(names), names == expected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input")
+    parser.add_argument("--shards", default="1,2,4,8")
+    parser.add_argument("--format", type=int, default=0)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="frames_bench_")
+    source = args.input or make_input(folder)
+    print(f"cpu_count={os.cpu_count()} input={source}")
+    print(f"{'shards':>7} {'status':>7} {'frames':>7} {'wall(s)':>9} {'fps':>9} {'speedup':>8} {'contiguous':>11}")
+    baseline = None
+    for shards in [int(s) for s in args.shards.split(",")]:
+        output = os.path.join(folder, f"frames_{shards}")
+        os.makedirs(output)
+        begin = time.time()
+        result = cut_video.extract_frames_from_video(source, 0, output, args.format, shards=shards)
+        wall = time.time() - begin
+        count, ok = contiguous(output)
+        if baseline is None:
+            baseline = wall
+        print(f"{shards:>7} {result[0]:>7} {count:>7} {wall:>9.2f} {count / wall:>9.1f} {baseline / wall:>8.2f} {str(ok):>11}")
+        shutil.rmtree(output, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+批量作业（fan-out）
+
+对一组文件（显式列表或 /videos 下的 glob）执行同一个操作，整体只有一个 task_id：
+- 子任务通过进程内共享的有界执行器调度，多个批量作业共享同一组工作线程；
+- 输入按需展开、按窗口提交，不会一次性创建十万个 future；
+- 任务状态里只保存汇总计数（完成 / 失败 / 运行中）和 ETA，
+  每个子任务只保留一条紧凑记录（输入、状态码、输出路径、错误摘要），通过分页接口查询。
+"""
+import glob
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg_mcp.job_graph as job_graph
+import ffmpeg_mcp.utils as utils
+
+# 所有批量作业共享的子任务并发数
+BATCH_WORKERS = int(os.getenv("MCP_BATCH_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+# 保留的已结束批量作业数（超出后丢弃最早的子任务记录）
+MAX_FINISHED_BATCHES = 32
+# 汇总状态写回 task_manager 的最小间隔（秒）
+PUBLISH_INTERVAL = 1.0
+# 错误摘要的最大长度
+ERROR_SUMMARY_CHARS = 300
+
+VIDEO_EXTS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.ts'}
+
+# 以 video_path 为输入、可以批量执行的操作
+BATCH_OPERATIONS = ("clip_video", "clip_video_batch", "scale_video", "run_pipeline",
+                    "extract_frames_from_video", "package_video")
+
+executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="ffmpeg_mcp_batch")
+
+_batches = OrderedDict()
+_batches_lock = threading.Lock()
+
+
+def iter_inputs(files=None, pattern=None):
+    """依次产出输入文件：先是显式列表，再是 /videos 下匹配 pattern 的视频文件（惰性遍历）"""
+    for f in files or []:
+        yield f
+    if pattern:
+        root = os.path.abspath(utils.get_videos_dir())
+        for path in glob.iglob(os.path.join(root, pattern), recursive=True):
+            path = os.path.abspath(path)
+            if (path.startswith(root + os.sep) and os.path.isfile(path)
+                    and os.path.splitext(path)[1].lower() in VIDEO_EXTS):
+                yield path
+
+
+def validate(operation, files=None, pattern=None):
+    if operation not in BATCH_OPERATIONS:
+        raise ValueError(f"operation 必须是 {list(BATCH_OPERATIONS)} 之一")
+    validate_inputs(files, pattern)
+
+
+def validate_inputs(files=None, pattern=None):
+    if not files and not pattern:
+        raise ValueError("files 或 pattern 至少需要一个")
+    if files is not None and not isinstance(files, list):
+        raise ValueError("files 必须是列表")
+    if pattern and (os.path.isabs(pattern) or ".." in pattern.split("/")):
+        raise ValueError("pattern 必须是 /videos 下的相对路径")
+
+
+class BatchJob:
+    def __init__(self, task_id, operation, params, output_dir):
+        self.task_id = task_id
+        self.operation = operation
+        self.params = dict(params or {})
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.total = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.expanding = True
+        self.started = time.time()
+        self.finished = None
+        # 每个子任务一条 (index, input, status, output_path, error)
+        self.results = []
+        self._last_publish = 0.0
+
+    def summary(self) -> dict:
+        with self.lock:
+            done = self.completed + self.failed
+            elapsed = (self.finished or time.time()) - self.started
+            eta = None
+            if done and self.finished is None:
+                eta = round(elapsed / done * (self.total - done), 1)
+            return {
+                "operation": self.operation,
+                "total": self.total,
+                "expanding": self.expanding,
+                "completed": self.completed,
+                "failed": self.failed,
+                "running": self.running,
+                "pending": self.total - done - self.running,
+                "elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": eta,
+                "output_dir": self.output_dir,
+            }
+
+    def page(self, offset=0, limit=100, status=None) -> dict:
+        """按完成顺序分页查询子任务结果；status 可选 completed / failed"""
+        with self.lock:
+            records = self.results
+            if status == "failed":
+                records = [r for r in records if r[2] != 0]
+            elif status == "completed":
+                records = [r for r in records if r[2] == 0]
+            items = records[offset:offset + limit]
+            total = len(records)
+        keys = ("index", "input", "status", "path", "error")
+        return {"total": total, "offset": offset, "limit": limit, "items": [dict(zip(keys, r)) for r in items]}
+
+    def _record(self, index, path, res):
+        status = res.get("status", -1)
+        error = None
+        if status != 0:
+            error = (res.get("log") or "").strip()[-ERROR_SUMMARY_CHARS:]
+        record = (index, path, status, res.get("path") or "", error)
+        with self.lock:
+            self.running -= 1
+            if status == 0:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.results.append(record)
+
+
+def get_batch(task_id):
+    with _batches_lock:
+        return _batches.get(task_id)
+
+
+def _register(job):
+    with _batches_lock:
+        _batches[job.task_id] = job
+        finished = [k for k, b in _batches.items() if b.finished is not None]
+        for k in finished[:max(0, len(finished) - MAX_FINISHED_BATCHES)]:
+            del _batches[k]
+
+
+def run_batch(task_id, operation, params=None, files=None, pattern=None, output_dir=None, on_progress=None):
+    """
+    执行批量作业（阻塞直到全部子任务结束）。
+
+    参数:
+        operation (str): BATCH_OPERATIONS 中的操作，params 为其参数（不含 video_path）
+        files (list) / pattern (str): 输入文件列表 / /videos 下的 glob（如 "**/*.mp4"）
+        output_dir (str): 子任务输出目录，默认 /output/batch_<task_id 前 8 位>
+        on_progress (callable): 汇总状态变化时回调 on_progress(summary)，至多每秒一次
+    返回:
+        BatchJob
+    """
+    validate(operation, files, pattern)
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(utils.get_default_output_path("batch")), f"batch_{task_id[:8]}")
+    os.makedirs(output_dir, exist_ok=True)
+    job = BatchJob(task_id, operation, params, output_dir)
+    _register(job)
+    op = job_graph.OPERATIONS[operation]
+
+    def publish(force=False):
+        now = time.time()
+        if on_progress and (force or now - job._last_publish >= PUBLISH_INTERVAL):
+            job._last_publish = now
+            on_progress(job.summary())
+
+    def child(index, path):
+        with job.lock:
+            job.running += 1
+        try:
+            local = utils.ensure_local_path(path)
+            base = os.path.splitext(os.path.basename(local))[0]
+            output = os.path.join(output_dir, f"{base}_{index:06d}")
+            res = op(dict(job.params, video_path=local), output)
+        except Exception as e:
+            res = {"status": -1, "log": str(e), "path": ""}
+        job._record(index, path, res)
+        publish()
+
+    # 提交窗口：最多同时排队 2 倍并发数的子任务，输入按需展开
+    window_size = BATCH_WORKERS * 2
+    window = threading.BoundedSemaphore(window_size)
+    for index, path in enumerate(iter_inputs(files, pattern)):
+        window.acquire()
+        with job.lock:
+            job.total += 1
+        future = executor.submit(child, index, path)
+        future.add_done_callback(lambda _: window.release())
+    with job.lock:
+        job.expanding = False
+    for _ in range(window_size):
+        window.acquire()
+    with job.lock:
+        job.finished = time.time()
+    publish(force=True)
+    return job
@@ -0,0 +1,225 @@
+"""
+分片并行编码
+
+在关键帧处把输入切成 N 段，每段由独立的 ffmpeg 进程用完全相同的参数并行编码（不含音频），
+再用 concat demuxer 无损拼接各段画面，并在同一次 ffmpeg 中处理整条音轨（copy 或混音），
+避免音频分段编码带来的接缝。
+
+分片既可以在本机线程池中执行（local），也可以投递到共享队列由远程 worker 执行（queue，
+见 job_queue.py / worker.py），由环境变量 MCP_CHUNK_BACKEND 或 backend 参数选择。
+"""
+import os
+import shlex
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.job_queue as job_queue
+import ffmpeg_mcp.keyframe_index as keyframe_index
+
+# 分片数上限，避免把很短的视频切得过碎
+MAX_CHUNKS = int(os.getenv("MCP_MAX_CHUNKS", "32"))
+# 分片执行后端：local（本机线程池）或 queue（共享队列 + 远程 worker）
+CHUNK_BACKEND = os.getenv("MCP_CHUNK_BACKEND", "local")
+
+
+def plan_chunks(video_path, chunks):
+    """
+    按时长均分后对齐到最近的关键帧，返回 [(start, end), ...]，最后一段 end 为 None。
+    没有关键帧索引或只有一个关键帧时返回单段。
+    """
+    index = keyframe_index.get_keyframe_index(video_path)
+    if index is None or len(index) < 2:
+        return [(0.0, None)]
+    duration = index.duration or index.times()[-1]
+    chunks = max(1, min(int(chunks), MAX_CHUNKS, len(index)))
+    boundaries = []
+    for k in range(1, chunks):
+        kf = index.nearest_keyframe(duration * k / chunks)
+        if kf is not None and kf > 0 and kf < duration and kf not in boundaries:
+            boundaries.append(kf)
+    boundaries.sort()
+    starts = [0.0] + boundaries
+    ends = boundaries + [None]
+    return list(zip(starts, ends))
+
+
+def input_duration(path):
+    """视频流时长（秒），无法获取时返回 None"""
+    fmt_ctx = ffmpeg.media_format_ctx(path)
+    if fmt_ctx is None or not fmt_ctx.video_streams:
+        return None
+    try:
+        return float(fmt_ctx.video_streams[0].duration)
+    except (TypeError, ValueError):
+        return None
+
+
+def clamp_to_inputs(ranges, extra_durations):
+    """
+    额外输入（如叠加视频）比源文件短时，起点不早于其结束时间的分片里该输入没有任何画面，
+    无法像不分片时那样保持最后一帧（overlay 的 eof_action=repeat）。
+    把这些分片并入包含该结束时间的那一段，保证分片结果与不分片一致。
+    """
+    durations = [d for d in extra_durations if d is not None]
+    if not durations:
+        return ranges
+    limit = min(durations)
+    kept = [r for r in ranges if r[0] < limit] or ranges[:1]
+    if len(kept) < len(ranges):
+        kept[-1] = (kept[-1][0], None)
+    return kept
+
+
+def build_chunk_commands(video_path, ranges, chunk_args, temp_dir, ext, extra_inputs=(), threads=0):
+    """
+    生成每个分片的 ffmpeg 参数。源文件与额外输入（如叠加视频）做相同的输入侧 seek，
+    分片只输出画面（-an）。
+
+    返回:
+        list: [(chunk_path, cmd), ...]
+    """
+    commands = []
+    for i, (start, end) in enumerate(ranges):
+        chunk_path = os.path.join(temp_dir, f"chunk_{i:04d}{ext}")
+        duration = f"-t {end - start}" if end is not None else ""
+        inputs = " ".join(
+            f"-ss {start} {duration} -i {shlex.quote(p)}" for p in [video_path, *extra_inputs]
+        )
+        thread_args = f"-threads {threads}" if threads > 0 else ""
+        cmd = f"{inputs} {chunk_args} {thread_args} -an -y {shlex.quote(chunk_path)}"
+        commands.append((chunk_path, cmd))
+    return commands
+
+
+def run_commands_local(commands, timeout=1000):
+    """在本机并行执行所有分片命令，返回 [(code, log, seconds), ...]（与 commands 顺序一致）"""
+    def run(item):
+        _, cmd = item
+        begin = time.time()
+        code, log = ffmpeg.run_ffmpeg(cmd, timeout=timeout)
+        return code, log, time.time() - begin
+
+    with ThreadPoolExecutor(max_workers=max(1, len(commands))) as pool:
+        return list(pool.map(run, commands))
+
+
+def run_commands_queue(commands, timeout=1000, queue=None, poll_interval=0.5):
+    """
+    把分片命令投递到共享队列，等待 worker 执行完毕，返回 [(code, log, seconds), ...]。
+    等待期间把心跳超时（worker 已死亡）的分片重新放回队列；分片路径必须位于共享存储上。
+    每次领取写到独立的文件，完成后只把被接受的那一次输出移动到分片路径，
+    迟到的慢 worker 写的是它自己的文件，不会覆盖拼接所用的分片。
+    有分片失败或超时时先取消其余待处理分片，等仍在执行的分片结束后再删除作业，
+    避免 worker 写入已删除的记录、输出到已清理的目录。
+    """
+    queue = queue or job_queue.ChunkQueue()
+    job_id = uuid.uuid4().hex
+    queue.enqueue(job_id, commands)
+    deadline = time.time() + timeout
+    try:
+        while True:
+            queue.requeue_stale(job_id)
+            rows = queue.job_chunks(job_id)
+            if all(r["status"] in ("done", "failed") for r in rows):
+                return [_accept_attempt(chunk_path, r) for (chunk_path, _), r in zip(commands, rows)]
+            if any(r["status"] == "failed" for r in rows):
+                return [(r["code"] if r["status"] == "failed" else 0, r["log"] or "", 0.0) for r in rows]
+            if time.time() > deadline:
+                pending = [r["idx"] for r in rows if r["status"] not in ("done", "failed")]
+                return [(-1 if r["idx"] in pending else 0, "等待 worker 超时" if r["idx"] in pending else "", 0.0)
+                        for r in rows]
+            time.sleep(poll_interval)
+    finally:
+        _drain_job(queue, job_id, max(deadline, time.time() + job_queue.HEARTBEAT_TIMEOUT), poll_interval)
+        queue.delete_job(job_id)
+
+
+def _accept_attempt(chunk_path, row):
+    """把被接受的那一次尝试的输出移动到分片路径，返回 (code, log, seconds)"""
+    seconds = (row["finished"] or 0) - (row["started"] or 0)
+    if row["status"] != "done":
+        return row["code"], row["log"] or "", seconds
+    try:
+        os.replace(row["attempt_path"], chunk_path)
+    except OSError as e:
+        return -1, f"找不到分片输出 {row['attempt_path']}: {e}", seconds
+    return row["code"], row["log"] or "", seconds
+
+
+def _drain_job(queue, job_id, deadline, poll_interval):
+    """取消作业中尚未领取的分片，并等待已领取的分片执行完（worker 死亡的分片直接取消）"""
+    while True:
+        queue.requeue_stale(job_id)
+        if queue.cancel_job(job_id) == 0 or time.time() > deadline:
+            return
+        time.sleep(poll_interval)
+
+
+def encode_chunked(video_path, output_path, chunk_args, audio_args, chunks,
+                   extra_inputs=(), timeout=1000, backend=None):
+    """
+    分片并行编码入口。
+
+    参数:
+        video_path (str): 源视频
+        output_path (str): 输出路径
+        chunk_args (str): 每个分片的画面处理与编码参数（滤镜、-map、编码器）
+        audio_args (str): 最终合并时的参数；输入 0 为拼接后的画面，1 为源文件，2.. 为 extra_inputs
+        chunks (int): 分片数
+        extra_inputs (list): 需要与源文件同步 seek 的额外输入；比源文件短时，其结束之后不再分片
+        backend (str): local 或 queue，默认取 MCP_CHUNK_BACKEND
+    返回:
+        tuple: (status_code, log, output_path, report)，report 记录分片数、各片耗时和加速比
+    """
+    backend = backend or CHUNK_BACKEND
+    ranges = clamp_to_inputs(plan_chunks(video_path, chunks), [input_duration(p) for p in extra_inputs])
+    ext = os.path.splitext(output_path)[1] or ".mp4"
+    if backend == "queue":
+        # 分片由其它节点编码：写到共享目录，线程数交给 worker 所在机器的 ffmpeg 自行决定
+        threads = 0
+        temp_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_chunks_", dir=job_queue.default_shared_dir())
+    else:
+        # 每个 ffmpeg 自身也是多线程的，按分片数均分 CPU，避免过度争抢
+        threads = max(1, (os.cpu_count() or 1) // len(ranges))
+        temp_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_chunks_")
+    try:
+        commands = build_chunk_commands(video_path, ranges, chunk_args, temp_dir, ext, extra_inputs, threads)
+        begin = time.time()
+        if backend == "queue":
+            results = run_commands_queue(commands, timeout)
+        else:
+            results = run_commands_local(commands, timeout)
+        encode_wall = time.time() - begin
+
+        logs = [log for _, log, _ in results]
+        for i, (code, log, _) in enumerate(results):
+            if code != 0:
+                return (-1, f"分片 {i} 编码失败: {log}", "")
+
+        list_file = os.path.join(temp_dir, "chunks.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            for chunk_path, _ in commands:
+                f.write(f"file '{chunk_path}'\n")
+        inputs = " ".join(f"-i {shlex.quote(p)}" for p in [video_path, *extra_inputs])
+        cmd = (f"-f concat -safe 0 -i {shlex.quote(list_file)} {inputs} "
+               f"{audio_args} -c:v copy -y {shlex.quote(output_path)}")
+        code, log = ffmpeg.run_ffmpeg(cmd, timeout=timeout)
+        logs.append(log)
+
+        chunk_seconds = [round(t, 2) for _, _, t in results]
+        report = {
+            "backend": backend,
+            "chunks": len(ranges),
+            "ranges": [[start, end] for start, end in ranges],
+            "chunk_seconds": chunk_seconds,
+            "encode_wall_seconds": round(encode_wall, 2),
+            # 串行编码所需时间（各片耗时之和）与并行实际耗时之比
+            "speedup": round(sum(chunk_seconds) / encode_wall, 2) if encode_wall > 0 else None,
+        }
+        return (code, "\n".join(logs), output_path, report)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
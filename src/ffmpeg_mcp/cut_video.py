@@ -1,11 +1,25 @@
 import ffmpeg_mcp.ffmpeg as ffmpeg
 import ffmpeg_mcp.utils as utils
+import ffmpeg_mcp.encode_planner as encode_planner
+import ffmpeg_mcp.frame_archive as frame_archive
+import ffmpeg_mcp.frame_dedupe as frame_dedupe
+import ffmpeg_mcp.frames as frames
+import ffmpeg_mcp.keyframe_index as keyframe_index
+import ffmpeg_mcp.ladder as ladder
+import ffmpeg_mcp.packaging as packaging
+import ffmpeg_mcp.pipeline as pipeline
+import ffmpeg_mcp.sprites as sprites
+import ffmpeg_mcp.chunked_encode as chunked_encode
+from ffmpeg_mcp.media_cache import mezzanine_cache, sprite_cache
+import json
 import os
 import shlex
 import random
 import shutil
 import tempfile
-from typing import List
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
 from enum import Enum
 
 def clip_video_ffmpeg(video_path, start = None, end = None, duration=None, output_path = None, time_out = 30):
@@ -23,45 +37,275 @@ def clip_video_ffmpeg(video_path, start = None, end = None, duration=None, outpu
     error - 错误码
     str - ffmpeg执行过程中所有日志
     str - 生成的剪辑文件路径
+    dict - 每路流 copy/encode 的决定及原因
     示例：
     clip_video("input.mp4", "00:01:30", "02:30")
     """
     try:
         if (output_path == None):
             output_path = utils.get_default_output_path(video_path, "_clip")
-        cmd = f"-i {shlex.quote(video_path)} "
-        if (start != None):
-            start_sec = utils.convert_to_seconds(start)
-            cmd = f"{cmd} -ss {start_sec}"
+        start_sec = utils.convert_to_seconds(start) if start != None else 0.0
         if (end == None and duration is not None):
             end = start_sec + utils.convert_to_seconds(duration)
+        # 起点在关键帧上时可直接 stream copy，否则重新编码以保证精确起切。
+        # 只使用已缓存的索引：首次剪辑不等待全量扫描，直接输入侧 -ss 重新编码，索引在后台构建供后续剪辑使用
+        index = keyframe_index.cached_keyframe_index(video_path)
+        if index is None:
+            keyframe_index.prefetch_keyframe_index(video_path)
+        plan = encode_planner.plan_clip(ffmpeg.media_format_ctx(video_path), index, start_sec, output_path)
+        # 输入侧 seek，避免从头解码到起点
+        cmd = f"-ss {start_sec} -i {shlex.quote(video_path)}"
         if (end != None):
             end_sec = utils.convert_to_seconds(end)
-            cmd = f"{cmd} -to {end_sec}"
-        cmd = f"{cmd} -y {shlex.quote(output_path)}"
+            cmd = f"{cmd} -t {end_sec - start_sec}"
+        cmd = f"{cmd} {encode_planner.codec_args(plan)} -y {shlex.quote(output_path)}"
         print(cmd)
         status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=time_out)
         print(log)
-        return {status_code, log, output_path}
+        return (status_code, log, output_path, plan)
     except Exception as e:
         print(f"剪辑失败: {str(e)}")
-        return {-1, str(e), ""}
-    
-    
+        return (-1, str(e), "")
+
+
+# 单次 ffmpeg 调用最多同时写出的片段数，避免同时打开过多编码器
+BATCH_CLIP_MAX_OUTPUTS = 32
+
+
+def _parse_clip_range(video_path, index, item, batch_id=""):
+    """
+    把 dict 或 (start, end, output_path) 形式的区间解析成统一结构，区间无效时抛出 ValueError。
+    默认输出文件名带 batch_id，同一源文件的多次批量剪辑不会互相覆盖。
+    """
+    if isinstance(item, dict):
+        start = item.get("start")
+        end = item.get("end")
+        duration = item.get("duration")
+        output_path = item.get("output_path")
+    else:
+        values = list(item) + [None] * 3
+        start, end, output_path = values[:3]
+        duration = None
+    start_sec = utils.convert_to_seconds(start) if start is not None else 0.0
+    if end is not None:
+        end_sec = utils.convert_to_seconds(end)
+    elif duration is not None:
+        end_sec = start_sec + utils.convert_to_seconds(duration)
+    else:
+        raise ValueError(f"第 {index} 个区间缺少 end 或 duration")
+    if output_path is None:
+        output_path = utils.get_default_output_path(video_path, f"_clip_{batch_id}_{index:03d}")
+    return {"index": index, "start": start_sec, "end": end_sec, "path": output_path}
+
+
+def clip_video_batch(video_path, ranges, time_out = 600):
+    """
+    从同一个源视频批量剪辑多个片段，一次 ffmpeg 调用写出多个输出，只解码一遍源文件
+
+    参数：
+    video_path : str - 源视频文件路径
+    ranges : list - 剪辑区间列表，每项为 {"start", "end"/"duration", "output_path"} 或 [start, end, output_path]
+    time_out: int - 每次 ffmpeg 调用的超时时间，默认为600s
+    返回：
+    tuple: (status_code, log, clips)，clips 为每个片段的 {index, start, end, path, status}，
+           无效区间单独标记为失败（status=-1, error），不影响其它片段
+    """
+    batch_id = uuid.uuid4().hex[:8]
+    clips = []
+    for i, r in enumerate(ranges):
+        try:
+            clips.append(_parse_clip_range(video_path, i, r, batch_id))
+        except (ValueError, TypeError) as e:
+            clips.append({"index": i, "path": "", "status": -1, "error": str(e)})
+    logs = []
+    valid = []
+    for clip in clips:
+        if clip.get("status") == -1:
+            continue
+        if clip["end"] <= clip["start"]:
+            clip["status"] = -1
+            clip["error"] = "结束时间必须大于开始时间"
+        else:
+            valid.append(clip)
+
+    # 按开始时间排序分组：每组从组内最早的开始时间做输入侧 seek，组内各输出再用相对偏移截取
+    valid.sort(key=lambda c: c["start"])
+    for g in range(0, len(valid), BATCH_CLIP_MAX_OUTPUTS):
+        group = valid[g:g + BATCH_CLIP_MAX_OUTPUTS]
+        seek = group[0]["start"]
+        cmd = f"-y -ss {seek} -i {shlex.quote(video_path)}"
+        for clip in group:
+            cmd = f"{cmd} -ss {clip['start'] - seek} -t {clip['end'] - clip['start']} {shlex.quote(clip['path'])}"
+        status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=time_out)
+        logs.append(log)
+        for clip in group:
+            produced = os.path.exists(clip["path"]) and os.path.getsize(clip["path"]) > 0
+            clip["status"] = 0 if status_code == 0 and produced else -1
+
+    code = 0 if all(c["status"] == 0 for c in clips) else -1
+    return (code, "\n".join(logs), clips)
+
+
+# 自动拼接模式下并行规格化转码的 ffmpeg 进程数（每个 ffmpeg 自身也是多线程的）
+NORMALIZE_WORKERS = int(os.getenv("MCP_NORMALIZE_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+
+
+def _profile_option(codec, profile):
+    """ffprobe 的 profile 名称（如 "Constrained Baseline"、"High 10"）转成 -profile:v 参数，无法对应时返回空串"""
+    value = encode_planner.ENCODER_PROFILES.get(codec, {}).get(profile)
+    return f"-profile:v {value}" if value else ""
+
+
+def _normalize_command(input_path, fmt_ctx, target, output_path):
+    """
+    生成把单个输入转码成目标规格（encode_planner.media_fingerprint）的 ffmpeg 参数，
+    调用前须已用 encode_planner.normalization_blocker 确认目标编码有对应的编码器。
+    """
+    video, audio = target
+    inputs = f"-i {shlex.quote(input_path)}"
+    args = []
+    if video:
+        codec, profile, width, height, pix_fmt, fps, time_base = video
+        vf = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+              f"pad={width}:{height}:({width}-iw)/2:({height}-ih)/2,setsar=1")
+        if fps and fps != "0/0":
+            vf = f"{vf},fps={fps}"
+        if pix_fmt:
+            vf = f"{vf},format={pix_fmt}"
+        args.append(f"-vf '{vf}' -c:v {encode_planner.VIDEO_ENCODERS[codec]}")
+        profile_arg = _profile_option(codec, profile)
+        if profile_arg:
+            args.append(profile_arg)
+        if time_base and "/" in time_base:
+            args.append(f"-video_track_timescale {time_base.split('/')[1]}")
+    if audio:
+        codec, sample_rate, channels, channel_layout = audio
+        args.append(f"-c:a {encode_planner.AUDIO_ENCODERS[codec]} -ar {sample_rate} -ac {channels}")
+        if len(fmt_ctx.audio_streams) == 0:
+            # 目标规格有音轨而该输入没有，补一条静音音轨
+            inputs = f"{inputs} -f lavfi -i anullsrc=r={sample_rate}:cl={channel_layout or 'stereo'}"
+            args.append("-map 0:v -map 1:a -shortest")
+    else:
+        args.append("-an")
+    return f"{inputs} {' '.join(args)} -y {shlex.quote(output_path)}"
+
+
+def _concat_auto(input_files, output_path, mux_args=""):
+    """
+    自动拼接：按多数输入的规格，只把不一致的输入并行转码成同一规格，
+    然后整体用 concat demuxer 直接 stream copy。
+    转码结果按 (输入内容指纹, 目标规格) 存入 mezzanine 缓存，同一素材再次拼接时直接复用。
+    目标编码没有编码器，或转码结果的规格与目标不一致时，改为整体重新编码（concat 滤镜）。
+    """
+    fmt_ctxs = []
+    for file in input_files:
+        fmt_ctx = ffmpeg.media_format_ctx(file)
+        if fmt_ctx is None:
+            return (-1, f"{file} 视频解析失败！！", "")
+        fmt_ctxs.append(fmt_ctx)
+    target, outliers = encode_planner.plan_concat_normalization(fmt_ctxs)
+    blocker = encode_planner.normalization_blocker(target) if outliers else None
+    if blocker:
+        return _concat_reencode(input_files, output_path, fmt_ctxs, target, mux_args, blocker)
+
+    # 工作目录与缓存放在同一文件系统上：缓存条目以硬链接形式放进来，拼接期间被其它任务淘汰也不受影响
+    temp_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_", dir=utils.get_cache_dir("tmp"))
+    try:
+        ext = os.path.splitext(output_path)[1] or ".mp4"
+        entries = [{"path": f} for f in input_files]
+        logs = []
+
+        def matches_target(path):
+            normalized_ctx = ffmpeg.media_format_ctx(path)
+            return normalized_ctx is not None and encode_planner.media_fingerprint(normalized_ctx) == target
+
+        def normalize(i):
+            key = mezzanine_cache.make_key(utils.content_fingerprint(input_files[i]), target)
+            normalized_path = os.path.join(temp_dir, f"normalized_{i:04d}{ext}")
+            if mezzanine_cache.checkout(key, ext, normalized_path):
+                return i, 0, f"mezzanine 缓存命中: {input_files[i]}", normalized_path, matches_target(normalized_path)
+            cmd = _normalize_command(input_files[i], fmt_ctxs[i], target, normalized_path)
+            code, log = ffmpeg.run_ffmpeg(cmd, timeout=1000)
+            matched = code == 0 and matches_target(normalized_path)
+            if matched:
+                mezzanine_cache.put(key, normalized_path, ext, link_to=normalized_path)
+            return i, code, log, normalized_path, matched
+
+        mismatched = []
+        with ThreadPoolExecutor(max_workers=NORMALIZE_WORKERS) as pool:
+            for i, code, log, normalized_path, matched in pool.map(normalize, outliers):
+                logs.append(log)
+                if code != 0:
+                    return (-1, f"{input_files[i]} 规格化转码失败: {log}", "")
+                if not matched:
+                    mismatched.append(input_files[i])
+                entries[i]["path"] = normalized_path
+        if mismatched:
+            return _concat_reencode(input_files, output_path, fmt_ctxs, target, mux_args,
+                                    f"转码结果与目标规格不一致: {mismatched}")
+
+        list_file = os.path.join(temp_dir, "filelist.txt")
+        _write_concat_list(list_file, entries)
+        cmd = f"-f concat -safe 0 -i {shlex.quote(list_file)} -c copy {mux_args} -y {shlex.quote(output_path)}"
+        code, log = ffmpeg.run_ffmpeg(cmd)
+        logs.append(log)
+        plan = {
+            "target": encode_planner.fingerprint_to_dict(target),
+            "normalized": [input_files[i] for i in outliers],
+            "copied": len(input_files) - len(outliers),
+        }
+        return (code, "\n".join(logs), output_path, plan)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _concat_reencode(input_files, output_path, fmt_ctxs, target, mux_args, reason):
+    """无法把不一致的输入转成目标规格时，所有输入用 concat 滤镜整体重新编码"""
+    code, log = _concat_filter(input_files, output_path, fmt_ctxs[0], mux_args=mux_args)[:2]
+    plan = {
+        "target": encode_planner.fingerprint_to_dict(target),
+        "normalized": list(input_files),
+        "copied": 0,
+        "reencoded": reason,
+    }
+    return (code, f"{reason}，改为整体重新编码\n{log}", output_path, plan)
+
+
+# 渐进式输出：fragmented 写分片 MP4，编码过程中已写出的部分即可被读取/播放；
+# faststart 在编码结束后把 moov 移到文件头，完成的文件可以边下边播
+MOVFLAGS = {
+    "fragmented": "-movflags +frag_keyframe+empty_moov+default_base_moof",
+    "faststart": "-movflags +faststart",
+}
+MOVFLAGS_EXTS = (".mp4", ".mov", ".m4v")
+
+
+def _movflags_args(movflags, output_path) -> str:
+    if not movflags:
+        return ""
+    if movflags not in MOVFLAGS:
+        raise ValueError(f"不支持的 movflags: {movflags}，可选 {list(MOVFLAGS)}")
+    if os.path.splitext(output_path)[1].lower() not in MOVFLAGS_EXTS:
+        return ""
+    return MOVFLAGS[movflags]
 
 
 def concat_videos(input_files: List[str], output_path: str = None, 
-                      fast: bool = True):
+                      fast: Union[bool, str] = True, chunks: int = 0, movflags: str = None):
     """
     使用FFmpeg拼接多个视频文件
     
     参数:
     input_files (List[str]): 输入视频文件路径列表
     output_path (str): 合并后的输出文件路径
-    fast (bool): 拼接方法，可选值："True"（默认，要求所有视频必须具有相同的编码格式、分辨率、帧率等参数）| "False(当不确定合并的视频编码格式、分辨率、帧率等参数是否相同的情况下，这个参数应该是False)"
+    fast (bool|str): 拼接方法，可选值："True"（默认，要求所有视频必须具有相同的编码格式、分辨率、帧率等参数）| "False(当不确定合并的视频编码格式、分辨率、帧率等参数是否相同的情况下，这个参数应该是False)" | "auto"（只转码与多数输入规格不一致的视频，其余直接 stream copy）
+    
+    chunks (int): fast=False 时大于1表示把输入分成 chunks 组并行编码，再无损拼接
+    
+    movflags (str): MP4/MOV 输出的渐进式写法，fragmented（编码中即可读取）| faststart（moov 前置）
     
     返回:
-    None
+    tuple: (status_code, log, output_path[, plan])，auto/分组模式附带规划信息
     
     注意:
     1. 当fast=True时，要求所有视频必须具有相同的编码格式、分辨率、帧率等参数
@@ -74,6 +318,9 @@ def concat_videos(input_files: List[str], output_path: str = None,
     for file in input_files:
         if not utils.is_url(file) and not os.path.exists(file):
             raise FileNotFoundError(f"输入文件 {file} 不存在")
+    mux_args = _movflags_args(movflags, output_path)
+    if fast == "auto":
+        return _concat_auto(input_files, output_path, mux_args)
     if fast == True:
         try:
             # 创建临时文件列表
@@ -84,7 +331,7 @@ def concat_videos(input_files: List[str], output_path: str = None,
                     f.write(f"file '{path_to_write}'\n")
             
             # 构建FFmpeg命令
-            cmd = f"-f concat -safe 0 -i {shlex.quote(temp_list_file)} -c copy -y {shlex.quote(output_path)}"
+            cmd = f"-f concat -safe 0 -i {shlex.quote(temp_list_file)} -c copy {mux_args} -y {shlex.quote(output_path)}"
             code, log = ffmpeg.run_ffmpeg(cmd)
             return (code, log, output_path)
         finally:
@@ -93,62 +340,160 @@ def concat_videos(input_files: List[str], output_path: str = None,
                 os.remove(temp_list_file)
 
     elif fast == False:
-        inputs = []
-        filter_str = ""
         fmt_ctx = ffmpeg.media_format_ctx(input_files[0])
         if fmt_ctx is None:
             return -1, f"{input_files[0]} 视频解析失败！！"
-        map = ""
-        if len(fmt_ctx.video_streams) > 0: ## 视频+音频
-            width = fmt_ctx.video_streams[0].width
-            height = fmt_ctx.video_streams[0].height
-            aspect = float(width)/float(height)
-            for i, file in enumerate(input_files):
-                if i == 0:
-                    filter_str += f"[{i}:v]setsar=1[{i}v];"
-                if i > 0:
-                    tmp_fmt_ctx = ffmpeg.media_format_ctx(file)
-                    if (tmp_fmt_ctx is None):
-                        return -1, f"{input_files[i]} 视频解析失败！！"
-                    if len(tmp_fmt_ctx.video_streams) == 0:
-                        return -1, f"{input_files[i]} 不包含视频流！！"
-                    tmp_width = tmp_fmt_ctx.video_streams[0].width
-                    tmp_height = tmp_fmt_ctx.video_streams[0].height
-                    tmp_aspect = float(tmp_width)/float(tmp_height) 
-                    if tmp_width == width and tmp_height == height:
-                        filter_str += f"[{i}:v]setsar=1[{i}v];"
-                    elif tmp_aspect == aspect:
-                        filter_str += f"[{i}:v]scale={width}:{height},setsar=1[{i}v];"
-                    elif abs(tmp_aspect-aspect) < 0.15: #使用increase
-                        filter_str += f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=increase,setsar=1,crop=x=(iw-{width})/2:y=({height}-ih)/2:w={width}:h={height},setsar=1[{i}v];"
-                    else:
-                        filter_str += f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,setsar=1,pad={width}:{height}:({width}-iw)/2:({height}-ih)/2,setsar=1[{i}v];"  
-            for i, file in enumerate(input_files):
-                if len(fmt_ctx.audio_streams) > 0:
-                    filter_str += f"[{i}v][{i}:a]"
+        if len(fmt_ctx.video_streams) > 0:
+            v = fmt_ctx.video_streams[0]
+            fan_in = _concat_fan_in(v.width, v.height, NORMALIZE_WORKERS)
+            if chunks and int(chunks) > 1:
+                # 按指定并行度分组：每组一个 ffmpeg 进程
+                fan_in = min(fan_in, -(-len(input_files) // int(chunks)))
+            if len(input_files) > fan_in:
+                # 输入过多时分组并行拼接，避免一次打开所有文件和解码器
+                return _concat_tree(input_files, output_path, fmt_ctx, fan_in, mux_args)
+        return _concat_filter(input_files, output_path, fmt_ctx, mux_args=mux_args)
+
+
+# 分层拼接时单个分组最多同时打开的输入数
+MAX_CONCAT_FAN_IN = int(os.getenv("MCP_CONCAT_MAX_FAN_IN", "64"))
+
+
+def _available_memory() -> int:
+    """当前可用物理内存（字节），无法获取时按 2GB 估算"""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 2 * 1024 ** 3
+
+
+def _concat_fan_in(width, height, workers) -> int:
+    """
+    根据可用内存、并行数和文件描述符上限估算每组最多拼接多少个输入。
+    每个输入按一个解码器缓冲约 16 帧 yuv420 画面估算内存。
+    """
+    per_input = max(int((width or 1920) * (height or 1080) * 1.5 * 16), 16 * 1024 ** 2)
+    fan_in = _available_memory() // (workers * per_input)
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft > 0:
+            fan_in = min(fan_in, soft // (workers * 4))
+    except (ImportError, ValueError, OSError):
+        pass
+    return int(max(2, min(fan_in, MAX_CONCAT_FAN_IN)))
+
+
+def _concat_filter(input_files, output_path, fmt_ctx, normalize=None, timeout=300, mux_args=""):
+    """
+    用 concat 滤镜重新编码拼接，所有画面缩放到参考输入 fmt_ctx 的分辨率。
+    normalize 不为空时额外统一帧率、像素格式、音频采样率和编码参数，
+    保证不同分组的输出规格完全一致，可以再用 concat demuxer 直接 stream copy。
+    """
+    filter_str = ""
+    map = ""
+    if len(fmt_ctx.video_streams) > 0: ## 视频+音频
+        width = fmt_ctx.video_streams[0].width
+        height = fmt_ctx.video_streams[0].height
+        aspect = float(width)/float(height)
+        for i, file in enumerate(input_files):
+            if i == 0 and normalize is None:
+                chain = "setsar=1"
+            else:
+                tmp_fmt_ctx = ffmpeg.media_format_ctx(file)
+                if (tmp_fmt_ctx is None):
+                    return -1, f"{input_files[i]} 视频解析失败！！"
+                if len(tmp_fmt_ctx.video_streams) == 0:
+                    return -1, f"{input_files[i]} 不包含视频流！！"
+                tmp_width = tmp_fmt_ctx.video_streams[0].width
+                tmp_height = tmp_fmt_ctx.video_streams[0].height
+                tmp_aspect = float(tmp_width)/float(tmp_height) 
+                if tmp_width == width and tmp_height == height:
+                    chain = "setsar=1"
+                elif tmp_aspect == aspect:
+                    chain = f"scale={width}:{height},setsar=1"
+                elif abs(tmp_aspect-aspect) < 0.15: #使用increase
+                    chain = f"scale={width}:{height}:force_original_aspect_ratio=increase,setsar=1,crop=x=(iw-{width})/2:y=({height}-ih)/2:w={width}:h={height},setsar=1"
                 else:
-                    filter_str += f"[{i}v]"
-            a = 0
-            map = " -map '[outv]' "
-            out = "[outv]"
+                    chain = f"scale={width}:{height}:force_original_aspect_ratio=decrease,setsar=1,pad={width}:{height}:({width}-iw)/2:({height}-ih)/2,setsar=1"
+            if normalize:
+                chain = f"{chain},fps={normalize['fps']},format={normalize['pix_fmt']}"
+            filter_str += f"[{i}:v]{chain}[{i}v];"
+        if normalize and len(fmt_ctx.audio_streams) > 0:
+            for i in range(len(input_files)):
+                filter_str += (f"[{i}:a]aresample={normalize['sample_rate']},"
+                               f"aformat=channel_layouts={normalize['channel_layout']}[{i}a];")
+        for i, file in enumerate(input_files):
             if len(fmt_ctx.audio_streams) > 0:
-                a = 1
-                map = " -map '[outv]' -map '[outa]' "
-                out = "[outv][outa]"
-            filter_str += f"concat=n={len(input_files)}:v=1:a={a}{out}"
-        elif len(fmt_ctx.audio_streams) > 0: # 音频
-            for i, file in enumerate(input_files):
-                filter_str += f"[{i}:a]"
-            filter_str += f"concat=n={len(input_files)}:a=1:v=0[outa]"
-            map = " -map '[outa]' "
-            
-        if len(filter_str) == 0:
-            return -1, f"{input_files[0]} 视频中不包含任何音视频流！！"
-        # 构建输入参数和滤镜表达式
-        inputs_str = " ".join([f"-i {shlex.quote(f)}" for f in input_files])
-        cmd = f" {inputs_str} -lavfi '{filter_str}' {map} -y {shlex.quote(output_path)}"
+                a_label = f"[{i}a]" if normalize else f"[{i}:a]"
+                filter_str += f"[{i}v]{a_label}"
+            else:
+                filter_str += f"[{i}v]"
+        a = 0
+        map = " -map '[outv]' "
+        out = "[outv]"
+        if len(fmt_ctx.audio_streams) > 0:
+            a = 1
+            map = " -map '[outv]' -map '[outa]' "
+            out = "[outv][outa]"
+        filter_str += f"concat=n={len(input_files)}:v=1:a={a}{out}"
+    elif len(fmt_ctx.audio_streams) > 0: # 音频
+        for i, file in enumerate(input_files):
+            filter_str += f"[{i}:a]"
+        filter_str += f"concat=n={len(input_files)}:a=1:v=0[outa]"
+        map = " -map '[outa]' "
+        
+    if len(filter_str) == 0:
+        return -1, f"{input_files[0]} 视频中不包含任何音视频流！！"
+    # 构建输入参数和滤镜表达式
+    inputs_str = " ".join([f"-i {shlex.quote(f)}" for f in input_files])
+    codec_str = normalize["codec_args"] if normalize else ""
+    cmd = f" {inputs_str} -lavfi '{filter_str}' {map} {codec_str} {mux_args} -y {shlex.quote(output_path)}"
+    code, log = ffmpeg.run_ffmpeg(cmd, timeout=timeout)
+    return (code, log, output_path)
+
+
+def _concat_tree(input_files, output_path, fmt_ctx, fan_in, mux_args=""):
+    """
+    分层拼接：每 fan_in 个输入一组，各组用统一的编码参数并行重新编码，
+    再把各组输出用 concat demuxer 直接 stream copy 拼接（demuxer 按顺序逐个打开文件）。
+    """
+    v = fmt_ctx.video_streams[0]
+    a = fmt_ctx.audio_streams[0] if fmt_ctx.audio_streams else None
+    normalize = {
+        "fps": v.r_frame_rate if v.r_frame_rate and v.r_frame_rate != "0/0" else "25",
+        "pix_fmt": "yuv420p",
+        "sample_rate": (a.sample_rate if a else None) or 48000,
+        "channel_layout": (a.channel_layout if a else None) or "stereo",
+        "codec_args": "-c:v libx264 -c:a aac -video_track_timescale 90000",
+    }
+    groups = [input_files[i:i + fan_in] for i in range(0, len(input_files), fan_in)]
+    ext = os.path.splitext(output_path)[1] or ".mp4"
+    temp_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_")
+    try:
+        def render(g):
+            group_path = os.path.join(temp_dir, f"group_{g:04d}{ext}")
+            result = _concat_filter(groups[g], group_path, fmt_ctx, normalize, timeout=1000)
+            return g, result[0], result[1], group_path
+
+        logs = []
+        entries = []
+        with ThreadPoolExecutor(max_workers=NORMALIZE_WORKERS) as pool:
+            for g, code, log, group_path in pool.map(render, range(len(groups))):
+                logs.append(log)
+                if code != 0:
+                    return (-1, f"第 {g} 组拼接失败: {log}", "")
+                entries.append({"path": group_path})
+
+        list_file = os.path.join(temp_dir, "filelist.txt")
+        _write_concat_list(list_file, entries)
+        cmd = f"-f concat -safe 0 -i {shlex.quote(list_file)} -c copy {mux_args} -y {shlex.quote(output_path)}"
         code, log = ffmpeg.run_ffmpeg(cmd)
-        return (code, log, output_path)
+        logs.append(log)
+        plan = {"mode": "tree", "fan_in": fan_in, "groups": len(groups)}
+        return (code, "\n".join(logs), output_path, plan)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
     
 
 def get_video_info(video_path: str):
@@ -180,6 +525,86 @@ def get_audio_duration(audio_path: str) -> float:
         raise ValueError(f"无法解析音频时长: {log}. 错误: {e}")
 
 
+def _concat_escape(path: str) -> str:
+    """concat demuxer 列表文件中单引号路径的转义"""
+    return path.replace("'", "'\\''")
+
+
+def _write_concat_list(list_file, entries):
+    """
+    写 concat demuxer 列表文件。
+    entries 中每项为 {"path", "inpoint"(可选), "outpoint"(可选)}，
+    有 inpoint/outpoint 时由 demuxer 直接截取，不再需要生成中间片段文件。
+    """
+    with open(list_file, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(f"file '{_concat_escape(os.path.abspath(e['path']))}'\n")
+            if e.get("inpoint"):
+                f.write(f"inpoint {e['inpoint']}\n")
+            if e.get("outpoint") is not None:
+                f.write(f"outpoint {e['outpoint']}\n")
+
+
+def _audio_mux_args(mute_video_audio, audio_input_index, duration):
+    """替换/混合音频的映射参数，输出时长统一用 -t 限定"""
+    if mute_video_audio:
+        # 只保留MP3音频
+        return f'-map 0:v -map {audio_input_index}:a -t {duration}'
+    # 混合视频原声和MP3
+    return (f'-filter_complex "[0:a][{audio_input_index}:a]amix=inputs=2:weights=\'1 3\'[outa]" '
+            f'-map 0:v -map "[outa]" -t {duration}')
+
+
+def _concat_with_audio(entries, audio_path, output_path, mute_video_audio, duration, temp_dir, plan):
+    """
+    单次 ffmpeg 完成「拼接视频 + 替换/混合音频」。
+
+    只有一个视频需要循环时使用 -stream_loop；否则生成带 inpoint/outpoint 的 concat 列表。
+    plan 为 encode_planner 的规划结果，决定各路流是否直接 copy。
+    demuxer 拼接失败（输入参数不一致）时回退到 concat 滤镜，同样只跑一次 ffmpeg。
+
+    返回:
+        tuple: (status_code, log, plan)，回退时 plan 会更新为实际的编码决定
+    """
+    audio_q = shlex.quote(audio_path)
+    out_q = shlex.quote(output_path)
+    distinct_paths = {e["path"] for e in entries}
+    if len(distinct_paths) == 1 and len(entries) > 1:
+        video_input = f'-stream_loop -1 -i {shlex.quote(entries[0]["path"])}'
+    else:
+        list_file = os.path.join(temp_dir, "filelist.txt")
+        _write_concat_list(list_file, entries)
+        video_input = f'-f concat -safe 0 -i {shlex.quote(list_file)}'
+
+    codecs = encode_planner.codec_args(plan)
+    cmd = f'{video_input} -i {audio_q} {_audio_mux_args(mute_video_audio, 1, duration)} {codecs} -y {out_q}'
+    code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
+    if code == 0:
+        return code, log, plan
+
+    # 回退到 concat 滤镜模式
+    print(f"快速拼接失败，回退到滤镜拼接模式: {log}")
+    inputs = []
+    for e in entries:
+        trim = f'-t {e["outpoint"]} ' if e.get("outpoint") is not None else ""
+        inputs.append(f'{trim}-i {shlex.quote(e["path"])}')
+    n = len(entries)
+    v_labels = "".join(f"[{i}:v]" for i in range(n))
+    filter_str = f"{v_labels}concat=n={n}:v=1:a=0[outv]"
+    if mute_video_audio:
+        maps = f'-map "[outv]" -map {n}:a'
+    else:
+        a_labels = "".join(f"[{i}:a]" for i in range(n))
+        filter_str += (f";{a_labels}concat=n={n}:v=0:a=1[va];"
+                       f"[va][{n}:a]amix=inputs=2:weights='1 3'[outa]")
+        maps = '-map "[outv]" -map "[outa]"'
+    plan = dict(plan, video=encode_planner.decision("video", "encode", "concat demuxer 拼接失败，回退到滤镜拼接"))
+    codecs = encode_planner.codec_args(plan)
+    cmd = f'{" ".join(inputs)} -i {audio_q} -filter_complex "{filter_str}" {maps} {codecs} -t {duration} -y {out_q}'
+    code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
+    return code, log, plan
+
+
 def concat_videos_with_mp3(video_paths, audio_path, output_path=None,
                             mute_video_audio=True, order="sequence"):
     """
@@ -193,7 +618,7 @@ def concat_videos_with_mp3(video_paths, audio_path, output_path=None,
         order (str): 拼接顺序 sequence(默认)|random|reverse
 
     返回:
-        tuple: (status_code, log, output_path)
+        tuple: (status_code, log, output_path[, plan])，成功时附带每路流 copy/encode 的决定
     """
     try:
         if output_path is None:
@@ -220,7 +645,7 @@ def concat_videos_with_mp3(video_paths, audio_path, output_path=None,
             if v_duration <= 0:
                 print(f"跳过时长为0的视频: {vp}")
                 continue
-            video_infos.append({"path": vp, "duration": v_duration})
+            video_infos.append({"path": vp, "duration": v_duration, "fmt_ctx": fmt_ctx})
 
         if not video_infos:
             return (-1, "没有有效的视频文件", "")
@@ -243,57 +668,25 @@ def concat_videos_with_mp3(video_paths, audio_path, output_path=None,
             remaining -= use_duration
             idx += 1
 
-        # Step 5: 处理每个片段（裁剪或使用完整视频）
+        # Step 5: 一次 ffmpeg 完成拼接与音频替换，裁剪由 concat 列表的 outpoint 完成
+        entries = []
+        for seg in segments:
+            entry = {"path": seg["path"]}
+            if seg["duration"] < seg["full_duration"] - 0.01:
+                entry["outpoint"] = seg["duration"]
+            entries.append(entry)
+
+        plan = encode_planner.plan_audio_replace([vi["fmt_ctx"] for vi in video_infos],
+                                                 ffmpeg.media_format_ctx(audio_path),
+                                                 output_path, mute_video_audio)
         temp_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_")
         try:
-            segment_files = []
-            for i, seg in enumerate(segments):
-                seg_path = os.path.join(temp_dir, f"segment_{i:04d}.mp4")
-                if seg["duration"] < seg["full_duration"] - 0.01:
-                    # 需要裁剪
-                    cmd = f'-i {shlex.quote(seg["path"])} -t {seg["duration"]} -c copy -y {shlex.quote(seg_path)}'
-                else:
-                    # 使用完整视频
-                    cmd = f'-i {shlex.quote(seg["path"])} -c copy -y {shlex.quote(seg_path)}'
-                code, log = ffmpeg.run_ffmpeg(cmd, timeout=300)
-                if code != 0:
-                    return (-1, f"处理片段 {i} 失败: {log}", "")
-                segment_files.append(seg_path)
-
-            # Step 6: 拼接所有片段
-            merged_path = os.path.join(temp_dir, "merged.mp4")
-            list_file = os.path.join(temp_dir, "filelist.txt")
-            with open(list_file, "w", encoding="utf-8") as f:
-                for sf in segment_files:
-                    f.write(f"file '{sf}'\n")
-
-            cmd = f'-f concat -safe 0 -i {shlex.quote(list_file)} -c copy -y {shlex.quote(merged_path)}'
-            code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
-            if code != 0:
-                # 回退到重编码模式
-                print(f"快速拼接失败，回退到重编码模式: {log}")
-                inputs_str = " ".join([f'-i {shlex.quote(sf)}' for sf in segment_files])
-                filter_str = f"concat=n={len(segment_files)}:v=1:a=0[outv]"
-                cmd = f'{inputs_str} -lavfi \'{filter_str}\' -map \'[outv]\' -y {shlex.quote(merged_path)}'
-                code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
-                if code != 0:
-                    return (-1, f"拼接失败: {log}", "")
-
-            # Step 7: 替换/混合音频
-            if mute_video_audio:
-                # 只保留MP3音频
-                cmd = f'-i {shlex.quote(merged_path)} -i {shlex.quote(audio_path)} -map 0:v -map 1:a -shortest -y {shlex.quote(output_path)}'
-            else:
-                # 混合视频原声和MP3
-                cmd = (f'-i {shlex.quote(merged_path)} -i {shlex.quote(audio_path)} '
-                       f'-filter_complex "[0:a][1:a]amix=inputs=2:weights=\'1 3\'[outa]" '
-                       f'-map 0:v -map "[outa]" -shortest -y {shlex.quote(output_path)}')
-
-            code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
+            code, log, plan = _concat_with_audio(entries, audio_path, output_path,
+                                                 mute_video_audio, audio_duration, temp_dir, plan)
             if code != 0:
-                return (-1, f"替换音频失败: {log}", "")
+                return (-1, f"拼接并替换音频失败: {log}", "")
 
-            return (0, f"成功，输出: {output_path}", output_path)
+            return (0, f"成功，输出: {output_path}", output_path, plan)
 
         finally:
             # 清理临时目录
@@ -318,7 +711,7 @@ def concat_videos_with_mp3_video_first(video_paths, audio_path, output_path=None
         order (str): 拼接顺序 sequence(默认)|random|reverse
 
     返回:
-        tuple: (status_code, log, output_path)
+        tuple: (status_code, log, output_path[, plan])，成功时附带每路流 copy/encode 的决定
     """
     try:
         if output_path is None:
@@ -345,7 +738,7 @@ def concat_videos_with_mp3_video_first(video_paths, audio_path, output_path=None
             if v_duration <= 0:
                 print(f"跳过时长为0的视频: {vp}")
                 continue
-            video_infos.append({"path": vp, "duration": v_duration})
+            video_infos.append({"path": vp, "duration": v_duration, "fmt_ctx": fmt_ctx})
 
         if not video_infos:
             return (-1, "没有有效的视频文件", "")
@@ -361,40 +754,19 @@ def concat_videos_with_mp3_video_first(video_paths, audio_path, output_path=None
         if total_video_duration > audio_duration:
             return (-1, f"音频长度不足：视频总时长 {total_video_duration:.2f}s > 音频时长 {audio_duration:.2f}s", "")
 
-        # Step 5: 拼接所有视频（不需要裁剪/循环）
+        # Step 5: 一次 ffmpeg 拼接所有视频（不需要裁剪/循环）并把音频裁剪到视频总时长
+        entries = [{"path": vi["path"]} for vi in video_infos]
+        plan = encode_planner.plan_audio_replace([vi["fmt_ctx"] for vi in video_infos],
+                                                 ffmpeg.media_format_ctx(audio_path),
+                                                 output_path, mute_video_audio)
         temp_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_")
         try:
-            list_file = os.path.join(temp_dir, "filelist.txt")
-            with open(list_file, "w", encoding="utf-8") as f:
-                for vi in video_infos:
-                    f.write(f"file '{vi['path']}'\n")
-
-            merged_path = os.path.join(temp_dir, "merged.mp4")
-            cmd = f'-f concat -safe 0 -i {shlex.quote(list_file)} -c copy -y {shlex.quote(merged_path)}'
-            code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
-            if code != 0:
-                # 回退到重编码模式
-                print(f"快速拼接失败，回退到重编码模式: {log}")
-                inputs_str = " ".join([f'-i {shlex.quote(vi["path"])}' for vi in video_infos])
-                filter_str = f"concat=n={len(video_infos)}:v=1:a=0[outv]"
-                cmd = f'{inputs_str} -lavfi \'{filter_str}\' -map \'[outv]\' -y {shlex.quote(merged_path)}'
-                code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
-                if code != 0:
-                    return (-1, f"拼接失败: {log}", "")
-
-            # Step 6: 替换/混合音频，裁剪音频到视频总时长
-            if mute_video_audio:
-                cmd = f'-i {shlex.quote(merged_path)} -i {shlex.quote(audio_path)} -map 0:v -map 1:a -t {total_video_duration} -y {shlex.quote(output_path)}'
-            else:
-                cmd = (f'-i {shlex.quote(merged_path)} -i {shlex.quote(audio_path)} '
-                       f'-filter_complex "[0:a][1:a]amix=inputs=2:weights=\'1 3\'[outa]" '
-                       f'-map 0:v -map "[outa]" -t {total_video_duration} -y {shlex.quote(output_path)}')
-
-            code, log = ffmpeg.run_ffmpeg(cmd, timeout=600)
+            code, log, plan = _concat_with_audio(entries, audio_path, output_path,
+                                                 mute_video_audio, total_video_duration, temp_dir, plan)
             if code != 0:
-                return (-1, f"替换音频失败: {log}", "")
+                return (-1, f"拼接并替换音频失败: {log}", "")
 
-            return (0, f"成功，输出: {output_path}", output_path)
+            return (0, f"成功，输出: {output_path}", output_path, plan)
 
         finally:
             shutil.rmtree(temp_dir, ignore_errors=True)
@@ -433,7 +805,7 @@ class Position(Enum):
     LeftCenter = 8,
     Center = 9
            
-def overlay_video(background_video, overlay_video, output_path: str = None, position: int = 1,  dx = 0, dy = 0):
+def overlay_video(background_video, overlay_video, output_path: str = None, position: int = 1,  dx = 0, dy = 0, chunks = 0):
     """
     两个视频叠加，注意不是拼接长度，而是画中画效果
 
@@ -444,52 +816,33 @@ def overlay_video(background_video, overlay_video, output_path: str = None, posi
     position(enum) - 相对位置，TopLeft: 左上角,TopCenter: 上居中, TopRight: 右上角 RightCenter: 右居中 BottomRight: 右下角 BottomCenter: 下居中 BottomLeft: 左下角 LeftCenter: 左居中 Center: 居中
     dx(int) - 整形,前景视频坐标x值
     dy(int) - 整形,前景视频坐标y值
+    chunks(int) - 大于1时按关键帧切成多段并行编码（适合长视频、多核机器）
     """
     try:
         if (output_path == None):
             output_path = utils.get_default_output_path(background_video, "_overlay")
-        x = ""
-        y = ""
-        if position == 1:
-            x = f"{dx}"
-            y = f"{dy}"
-        elif position == Position.LeftCenter:
-             x = f"{dx}"
-             y = f"(H-h)/2+{dy}"
-        elif position == 7:
-            x = f"{dx}"
-            y = f"(H-h)+{dy}"
-        elif position == 6:
-            x = f"(W-w)/2+{dx}"
-            y = f"(H-h)+{dy}"
-        elif position == 5:
-            x = f"(W-w)+{dx}"
-            y = f"(H-h)+{dy}"    
-        elif position == 4:
-            x = f"(W-w)+{dx}"
-            y = f"(H-h)/2+{dy}"    
-        elif position == 3:
-            x = f"(W-w)+{dx}"
-            y = f"{dy}"   
-        elif position == 2:
-            x = f"(W-w)/2+{dx}"
-            y = f"{dy}"   
-        elif position == 9:
-            x = f"(W-w)/2+{dx}"
-            y = f"(H-h)/2+{dy}"   
+        x, y = pipeline.overlay_xy(position, dx, dy)
+
+        if chunks and int(chunks) > 1:
+            return chunked_encode.encode_chunked(
+                background_video, output_path,
+                chunk_args=f"-filter_complex \"[0:v][1:v]overlay=x={x}:y={y}[ov]\" -map '[ov]'",
+                audio_args="-filter_complex \"[1:a][2:a]amix=inputs=2:weights='3 1'[oa]\" -map 0:v -map '[oa]'",
+                chunks=int(chunks), extra_inputs=[overlay_video])
             
         cmd = f" -i {shlex.quote(background_video)} -i {shlex.quote(overlay_video)} -filter_complex \"[0:v][1:v]overlay=x={x}:y={y}[ov];[0:a][1:a]amix=inputs=2:weights='3 1'[oa]\" -map '[ov]' -map '[oa]'"
         cmd = f"{cmd} -y {shlex.quote(output_path)}"
         print(cmd)
         status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=1000)
         print(log)
-        return {status_code, log, output_path}
+        return (status_code, log, output_path)
     except Exception as e:
         print(f"剪辑失败: {str(e)}")
-        return {-1, str(e), ""}
+        return (-1, str(e), "")
     
     
-def scale_video(video_path, width, height = -2,output_path: str = None):
+def scale_video(video_path, width, height = -2,output_path: str = None, chunks = 0,
+                renditions: list = None, keyframe_interval: float = 2, package: str = None):
     """
     视频缩放
 
@@ -497,57 +850,373 @@ def scale_video(video_path, width, height = -2,output_path: str = None):
     width(int) - 目标宽度， 如果是-2,代表保持宽高比，且是2的倍数。
     height(int) - 目标高度，如果是-2,代表保持宽高比，且是2的倍数。
     output_path(str) - 输出路径
+    chunks(int) - 大于1时按关键帧切成多段并行编码（适合长视频、多核机器）
+    renditions(list) - 多码率阶梯，如 [1080, 720, "854x480", {"height": 360, "video_bitrate": "800k"}]；
+                       指定后忽略 width/height/output_path，一次解码输出全部分辨率
+    keyframe_interval(float) - 多码率时各路关键帧对齐的间隔（秒），0 表示不对齐；打包时即分片时长
+    package(str) - 与 renditions 一起使用，hls 或 dash：直接输出切片和清单而不是每路一个 MP4，
+                   output_path 此时为输出目录
+    返回：
+    tuple: (status_code, log, output_path[, report])，分片模式附带分片耗时与加速比，
+           多码率模式附带每一路的输出路径和文件大小，打包模式返回清单路径和打包信息
     """
     try:
+        if renditions and package:
+            return package_video(video_path, package, renditions, output_path,
+                                 segment_seconds=keyframe_interval or packaging.SEGMENT_SECONDS)
+        if renditions:
+            return scale_video_ladder(video_path, renditions, keyframe_interval)
+
         if (output_path == None):
             output_path = utils.get_default_output_path(video_path, "_scaled")
+
+        if chunks and int(chunks) > 1:
+            return chunked_encode.encode_chunked(
+                video_path, output_path,
+                chunk_args=f"-vf scale={width}:{height}",
+                audio_args="-map 0:v -map 1:a? -c:a copy",
+                chunks=int(chunks))
     
         cmd = f" -i {shlex.quote(video_path)} -filter_complex \"scale={width}:{height}\""
         cmd = f"{cmd} -y {shlex.quote(output_path)}"
         print(cmd)
         status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=1000)
         print(log)
-        return {status_code, log, output_path}
+        return (status_code, log, output_path)
     except Exception as e:
         print(f"剪辑失败: {str(e)}")
-        return {-1, str(e), ""}
+        return (-1, str(e), "")
     
 
-def extract_frames_from_video(video_path,fps=0, output_folder=None, format=0, total_frames=0):
+def scale_video_ladder(video_path, renditions, keyframe_interval: float = 2, time_out=3600):
+    """
+    一次解码输出多码率阶梯：split 后每路独立 scale、编码并写入各自的文件。
+
+    返回：
+    tuple: (status_code, log, 第一路输出路径, [{name, width, height, path, size}, ...])
     """
-    使用 FFmpeg 提取视频中的每一帧图像。
+    specs = ladder.parse_renditions(renditions)
+    fmt_ctx = ffmpeg.media_format_ctx(video_path)
+    filter_complex, labels = ladder.split_filter(specs)
+
+    outputs = []
+    cmd = f"-i {shlex.quote(video_path)} -filter_complex \"{filter_complex}\""
+    for r, label in zip(specs, labels):
+        path = r.get("output_path") or utils.get_default_output_path(video_path, f"_{r['name']}")
+        audio_plan = encode_planner.plan_audio_copy(fmt_ctx.audio_streams[:1], path)
+        if audio_plan is None:
+            audio_args = ""
+        elif audio_plan["action"] == "copy":
+            audio_args = "-map 0:a:0 -c:a copy"
+        else:
+            bitrate = f" -b:a {r['audio_bitrate']}" if r.get("audio_bitrate") else ""
+            audio_args = f"-map 0:a:0 -c:a aac{bitrate}"
+        cmd += (f" -map \"[{label}]\" {ladder.video_encoder_args(r)} {ladder.keyframe_args(r, keyframe_interval)}"
+                f" {audio_args} -y {shlex.quote(path)}")
+        outputs.append({"name": r["name"], "path": path})
+
+    status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=time_out)
+    if status_code != 0:
+        return (status_code, log, "")
+    for out in outputs:
+        out_ctx = ffmpeg.media_format_ctx(out["path"])
+        stream = out_ctx.video_streams[0] if out_ctx and out_ctx.video_streams else None
+        out["width"] = stream.width if stream else None
+        out["height"] = stream.height if stream else None
+        out["size"] = os.path.getsize(out["path"])
+    return (status_code, log, outputs[0]["path"], outputs)
+
+
+def package_video(video_path, format: str = "hls", renditions: list = None, output_dir: str = None,
+                  segment_seconds: float = packaging.SEGMENT_SECONDS, segment_type: str = "fmp4", time_out=3600):
+    """
+    打包为 HLS / DASH：分片边生成边写盘，清单随之刷新，客户端可以在编码结束前开始播放。
+
+    参数：
+    format(str) - hls 或 dash
+    renditions(list) - 多码率阶梯，为空时只打包源视频（编码兼容时不转码）
+    output_dir(str) - 输出目录，默认 /output 下以 _hls / _dash 结尾的目录
+    segment_seconds(float) - 分片时长
+    segment_type(str) - HLS 分片类型 fmp4 或 mpegts
+    返回：
+    tuple: (status_code, log, manifest_path, report)
+    """
+    try:
+        fmt_ctx = ffmpeg.media_format_ctx(video_path)
+        if fmt_ctx is None or not fmt_ctx.video_streams:
+            return (-1, f"无法读取视频流: {video_path}", "")
+        output_dir = output_dir or packaging.default_output_dir(video_path, format)
+        cmd, report = packaging.build_package_command(
+            video_path, fmt_ctx, output_dir, format, renditions, segment_seconds, segment_type)
+        status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=time_out)
+        if status_code != 0:
+            return (status_code, log, "")
+        report["files"] = len(os.listdir(output_dir))
+        return (status_code, log, report["manifest"], report)
+    except Exception as e:
+        print(f"打包失败: {str(e)}")
+        return (-1, str(e), "")
+
+
+def run_pipeline(video_path, operations: list, output_path: str = None, encoding: dict = None,
+                 movflags: str = None, time_out=3600):
+    """
+    把多个操作（clip / scale / overlay / concat）融合为一次 ffmpeg 调用，只写最终输出。
+
+    参数：
+    operations(list) - 按顺序执行的操作，如 [{"op": "clip", "start": 5, "end": 20}, {"op": "scale", "width": 1280}]
+    encoding(dict) - 视频编码参数，如 {"codec": "libx264", "crf": 20, "preset": "veryfast"}
+    movflags(str) - 同 concat_videos 的 movflags
+    返回：
+    tuple: (status_code, log, output_path, plan)
+    """
+    try:
+        if output_path is None:
+            output_path = utils.get_default_output_path(video_path, "_pipeline")
+        encoding = dict(encoding or {})
+        encoding.setdefault("codec", ladder.DEFAULT_VIDEO_CODEC)
+        output_args = f"{ladder.video_encoder_args(encoding)} -c:a aac {_movflags_args(movflags, output_path)}"
+        cmd, plan = pipeline.compile_pipeline(video_path, operations, output_path, output_args)
+        status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=time_out)
+        return (status_code, log, output_path, plan)
+    except Exception as e:
+        print(f"流水线执行失败: {str(e)}")
+        return (-1, str(e), "")
+
+
+def grab_frames(video_path, timestamps, keyframe_only=False, output_folder=None, format=1, inline=False,
+                time_out=600):
+    """
+    抓取任意时间点的画面，不用 fps 滤镜解码整个视频。
+
+    :param timestamps: 时间点列表（秒数或 HH:MM:SS）
+    :param keyframe_only: 取每个时间点最近的关键帧，只解码关键帧本身，速度最快但时间不精确
+    :param output_folder: 图片输出目录，默认在输出目录下为本次调用新建 grab_<随机串> 子目录
+    :param inline: 以 Base64 返回图片内容，不保留文件
+    :return: (status, log, output_folder, grabs)，grabs 与 timestamps 一一对应：
+             {"timestamp", "time", "path"}（inline 时为 {"timestamp", "time", "mime_type", "data"}），抓取失败时 path 为 None
+    """
+    import base64 as b64
+    import mimetypes
+
+    seconds = frames.parse_timestamps(timestamps)
+    ext = frames.image_ext(format)
+    if inline:
+        output_folder = tempfile.mkdtemp(prefix="ffmpeg_mcp_grab_")
+    elif output_folder is None:
+        # 每次调用一个子目录，并发的抓帧任务互不覆盖
+        output_folder = os.path.join(os.path.dirname(utils.get_default_output_path(video_path)),
+                                     f"grab_{uuid.uuid4().hex[:8]}")
+    os.makedirs(output_folder, exist_ok=True)
+
+    if keyframe_only:
+        # 需要知道每个时间点对应的关键帧，只能等待索引
+        index = keyframe_index.get_keyframe_index(video_path)
+    else:
+        # 索引只用于把同一 GOP 内的时间点归为一组：不等待全量扫描，未缓存时按时间间隔分组，索引在后台构建
+        index = keyframe_index.cached_keyframe_index(video_path)
+        if index is None:
+            keyframe_index.prefetch_keyframe_index(video_path)
+    # 请求的时间点 -> 实际取到的帧时间
+    actual = {t: t for t in seconds}
+    if keyframe_only and index is not None and len(index):
+        actual = {t: index.nearest_keyframe(t) for t in seconds}
+        targets = sorted(set(actual.values()))
+        jobs = [targets[i:i + frames.MAX_GROUP_SIZE] for i in range(0, len(targets), frames.MAX_GROUP_SIZE)]
+        build = frames.build_keyframe_grab_command
+    else:
+        jobs = frames.group_timestamps(seconds, index)
+        build = frames.build_grab_command
+
+    def run(targets):
+        paths = [frames.grab_path(output_folder, video_path, t, ext) for t in targets]
+        return ffmpeg.run_ffmpeg(build(video_path, targets, paths), timeout=time_out)
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=frames.GRAB_WORKERS) as pool:
+        for code, log in pool.map(run, jobs):
+            if code != 0:
+                failures.append(log)
+
+    grabs = []
+    for requested, t in zip(timestamps, seconds):
+        path = frames.grab_path(output_folder, video_path, actual[t], ext)
+        item = {"timestamp": requested, "time": round(actual[t], 3), "path": path if os.path.exists(path) else None}
+        if inline and item["path"]:
+            mime_type, _ = mimetypes.guess_type(path)
+            with open(path, "rb") as f:
+                item = {"timestamp": requested, "time": item["time"], "mime_type": mime_type or "image/" + ext,
+                        "data": b64.b64encode(f.read()).decode("utf-8")}
+        grabs.append(item)
+    if inline:
+        shutil.rmtree(output_folder, ignore_errors=True)
+        output_folder = ""
+
+    missing = sum(1 for g in grabs if not g.get("path") and not g.get("data"))
+    status = 0 if not failures and not missing else -1
+    log = f"grabbed {len(grabs) - missing}/{len(grabs)} frames in {len(jobs)} ffmpeg runs"
+    if failures:
+        log += "\n" + "\n".join(failures)
+    return (status, log, output_folder, grabs)
+
+
+def _extract_frames_sharded(video_path, output_folder, ext, shards, time_out):
+    """
+    全部帧分片并行抽取：在关键帧处把时间线切成 N 段，每段一个 ffmpeg 进程，
+    按关键帧索引中的逐 GOP 帧数算出每段的 start_number，输出与单次抽取相同的连续编号。
+    无法分片（没有关键帧索引、只有一个 GOP）时返回 None。
+    """
+    index = keyframe_index.get_keyframe_index(video_path)
+    if index is None or len(index) < 2:
+        return None
+    plan = frames.plan_shards(index, chunked_encode.plan_chunks(video_path, shards))
+    if plan is None or len(plan) < 2:
+        return None
+    pattern = frames.frame_pattern(output_folder, ext)
+    commands = [(pattern, frames.build_shard_command(video_path, start, count, pattern, start_number))
+                for start, count, start_number in plan]
+    results = chunked_encode.run_commands_local(commands, timeout=time_out)
+    extracted = []
+    logs = []
+    status_code = 0
+    for (start, count, start_number), (code, log, _) in zip(plan, results):
+        extracted += frames.collect_shard_frames(log, start, count, pattern, start_number)
+        logs.append(frames.strip_showinfo(log))
+        if code != 0:
+            status_code = code
+    return (status_code, "\n".join(logs), pattern, extracted)
+
+
+def _extract_frames_deduped(video_path, output_folder, windows, ext, fps, total_frames, keyframes_only,
+                            min_interval, width, quality, dedupe, dedupe_threshold, time_out):
+    """dhash / phash：图片经管道读出并在内存中去重，只把新画面写进 output_folder，编号连续"""
+    index = {}
+    for name, data in frame_archive.iter_frame_images(
+            video_path, windows, ext, fps, total_frames, keyframes_only, min_interval, width, quality,
+            index, time_out, dedupe, dedupe_threshold):
+        with open(os.path.join(output_folder, name), "wb") as f:
+            f.write(data)
+    extracted = [{"path": os.path.join(output_folder, item["name"]), "time": item["time"], "window": item["window"]}
+                 for item in index["frames"]]
+    pattern = frames.frame_pattern(output_folder, ext, 0 if len(windows) > 1 else None)
+    return (index["status"], index["log"], pattern, extracted)
+
+
+def extract_frames_from_video(video_path,fps=0, output_folder=None, format=0, total_frames=0,
+                              start=None, end=None, duration=None, windows=None, shards=0,
+                              keyframes_only=False, min_interval=0, width=0, quality=None, archive=None,
+                              dedupe=None, dedupe_threshold=None, time_out=1000):
+    """
+    使用 FFmpeg 提取视频中的图像。
 
     :param video_path: 视频文件的路径。
     :param fps: 每多少秒抽一帧，如果传0，代表每一帧都抽
     :param output_folder: 输出图像的文件夹路径。
     :param format: 输出图像的图片格式 0：png 1:jpg 2:webp。
+    :param total_frames: 每个时间窗口最多抽取多少张，0 代表不限制
+    :param start/end/duration: 只抽取这一段时间内的帧（输入侧 seek，不从文件开头解码）
+    :param windows: 多个时间窗口，如 [[60, 65], {"start": "01:30:00", "duration": 5}]，一次 ffmpeg 调用完成
+    :param shards: 抽取全部帧（fps=0，不限张数、不限时间）时分成多少个并行的 ffmpeg 进程，0/1 不分片
+    :param keyframes_only: 只解码关键帧（预览图模式），相邻两帧至少间隔 min_interval 秒（默认取 fps）
+    :param width: 输出宽度，0 为原始尺寸，高度按比例
+    :param quality: jpg / webp 质量预设 low / medium / high
+    :param archive: zip / tar：所有帧直接写进输出目录下的一个归档文件（附 frames.json），不生成单独的图片文件；
+                    此时 output_path 为归档路径，frames 中为归档内的文件名 name
+    :param dedupe: 去掉相邻的重复画面：mpdecimate（ffmpeg 滤镜，最快）、dhash / phash（感知哈希，需要 numpy）；
+                   dhash / phash 在抽帧过程中边读边算哈希，重复的图片不会写到磁盘或归档中
+                   （ffmpeg 内部仍会编码一次），保留的图片连续编号
+    :param dedupe_threshold: dhash / phash 的汉明距离阈值（0-64），与上一张保留帧的距离大于该值才保留，默认 5 / 10
+    :return: (status, log, output_path, frames)，frames 为 [{"path", "time", "window"}]，time 为帧在源文件中的时间（秒）
     """
     # 确保输出文件夹存在
     if output_folder == None:
           output_folder = os.path.dirname(utils.get_default_output_path(video_path))
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-    img_ext = "png"
-    if (format == 0):
-        img_ext = "png"
-    elif (format == 1):
-        img_ext = "jpg"
-    else:
-        img_ext = "webp"
-    output_path = os.path.join(output_folder, f'frame_%04d.{img_ext}')
     try:
-        cmd = f" -i {shlex.quote(video_path)}"
-        # 执行 FFmpeg 命令
-        if fps > 0:
-            cmd = f" {cmd} -vf 'fps=1/{fps}'"
-        else:
-            cmd = f" {cmd} -vsync 0"
-        if (total_frames > 0):
-            cmd = f" {cmd} -vframes {total_frames} "
-        cmd = f" {cmd} -y {shlex.quote(output_path)}"
-        status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=1000)
+        parsed = frames.parse_windows(windows, start, end, duration)
+        frame_dedupe.validate(dedupe)
+        if archive:
+            name = os.path.splitext(os.path.basename(video_path))[0]
+            archive_path = os.path.join(output_folder, f"{name}_frames.{archive}")
+            status_code, log, path, extracted = frame_archive.write_archive(
+                archive_path, video_path, archive, parsed, format, fps, total_frames,
+                keyframes_only, min_interval, width, quality, dedupe, dedupe_threshold)
+            print(log)
+            return (status_code, log, path, extracted)
+        if (shards > 1 and fps <= 0 and total_frames <= 0 and parsed == [(None, None)]
+                and not keyframes_only and not width and quality is None and not dedupe):
+            result = _extract_frames_sharded(video_path, output_folder, frames.image_ext(format), shards, time_out)
+            if result is not None:
+                return result
+        if dedupe in frame_dedupe.HASH_SIZES:
+            result = _extract_frames_deduped(video_path, output_folder, parsed, frames.image_ext(format), fps,
+                                             total_frames, keyframes_only, min_interval, width, quality,
+                                             dedupe, dedupe_threshold, time_out)
+            print(result[1])
+            return result
+        cmd, patterns = frames.build_extract_command(
+            video_path, parsed, output_folder, frames.image_ext(format), fps, total_frames,
+            keyframes_only, min_interval, width, quality, dedupe)
+        status_code, log = ffmpeg.run_ffmpeg(cmd, timeout=time_out)
+        extracted = frames.collect_frames(log, parsed, patterns, total_frames)
+        log = frames.strip_showinfo(log)
         print(log)
-        return {status_code, log, output_path}
+        return (status_code, log, patterns[0], extracted)
     except Exception as e:
         print(f"抽取失败: {str(e)}")
-        return {-1, str(e), ""}
+        return (-1, str(e), "", [])
+
+
+def generate_sprite_sheet(video_path, interval=10, width=160, columns=10, rows=10, format=1,
+                          keyframes_only=False, index_format="vtt", output_folder=None, time_out=1000):
+    """
+    生成拖动预览雪碧图：一次 ffmpeg 调用（fps / 关键帧 + scale + tile）输出若干张大图和坐标索引。
+
+    :param interval: 每隔多少秒取一张缩略图
+    :param width: 缩略图宽度，高度按比例
+    :param columns/rows: 每张大图的列数、行数
+    :param format: 大图格式 0：png 1:jpg 2:webp
+    :param keyframes_only: 只解码关键帧，相邻缩略图至少间隔 interval 秒，长视频快很多，时间不精确
+    :param index_format: vtt（WebVTT，#xywh 坐标）或 json
+    :return: (status, log, index_path, sheets)
+    """
+    ext = frames.image_ext(format)
+    sprites.validate(interval, width, columns, rows, index_format)
+    if output_folder is None:
+        output_folder = os.path.dirname(utils.get_default_output_path(video_path))
+    os.makedirs(output_folder, exist_ok=True)
+
+    spec = sprites.layout(video_path, interval, width, columns, rows, ext, keyframes_only)
+    key = sprite_cache.make_key("sprite", utils.content_fingerprint(video_path), spec)
+    log = "sprite 缓存命中"
+    status_code = 0
+    cached = None
+    manifest_path = sprite_cache.get(key, ".json")
+    if manifest_path:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        cached = [sprite_cache.get(key, f"_{i:04d}.{ext}") for i in range(manifest["sheets"])]
+        cues = manifest["cues"]
+        if not all(cached):
+            cached = None
+    if cached is None:
+        work_dir = tempfile.mkdtemp(prefix="ffmpeg_mcp_sprite_")
+        try:
+            status_code, log, sheets, cues = sprites.render_sheets(video_path, spec, work_dir, time_out)
+            if status_code != 0 or not sheets:
+                return (status_code or -1, log, "", [])
+            cached = [sprite_cache.put(key, path, f"_{i:04d}.{ext}") for i, path in enumerate(sheets)]
+            manifest_tmp = os.path.join(work_dir, "manifest.json")
+            with open(manifest_tmp, "w", encoding="utf-8") as f:
+                json.dump({"sheets": len(cached), "cues": cues}, f)
+            sprite_cache.put(key, manifest_tmp, ".json")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    prefix = f"{os.path.splitext(os.path.basename(video_path))[0]}_sprite"
+    names = [sprites.sheet_name(prefix, i, ext) for i in range(len(cached))]
+    sheets = [sprites.link_or_copy(src, os.path.join(output_folder, name)) for src, name in zip(cached, names)]
+    index_path = sprites.write_index(os.path.join(output_folder, f"{prefix}s.{index_format}"),
+                                     index_format, spec, cues, names)
+    return (status_code, log, index_path, sheets)
@@ -0,0 +1,196 @@
+"""
+编码规避规划器
+
+根据探测到的输入流信息和要执行的操作，逐路流决定能否直接 stream copy（-c copy），
+只有确实需要时才重新编码。每个决定都带有原因，写入任务结果便于排查。
+"""
+import os
+from collections import Counter
+
+# 各容器可以直接封装的编码；None 表示不做限制（如 mkv）
+CONTAINER_CODECS = {
+    ".mp4": {
+        "video": {"h264", "hevc", "av1", "vp9", "mpeg4"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "opus", "alac", "flac"},
+    },
+    ".m4v": {
+        "video": {"h264", "hevc", "av1", "mpeg4"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "alac"},
+    },
+    ".mov": {
+        "video": {"h264", "hevc", "prores", "mpeg4", "mjpeg"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "alac", "pcm_s16le", "pcm_s24le"},
+    },
+    ".webm": {
+        "video": {"vp8", "vp9", "av1"},
+        "audio": {"opus", "vorbis"},
+    },
+    ".ts": {
+        "video": {"h264", "hevc", "mpeg2video"},
+        "audio": {"aac", "mp3", "ac3", "eac3"},
+    },
+    ".mkv": None,
+}
+
+
+def decision(stream: str, action: str, reason: str) -> dict:
+    return {"stream": stream, "action": action, "reason": reason}
+
+
+def container_accepts(output_path: str, kind: str, codec_name) -> bool:
+    """输出容器能否直接封装该编码"""
+    ext = os.path.splitext(output_path or "")[1].lower()
+    allowed = CONTAINER_CODECS.get(ext, {})
+    if allowed is None:
+        return True
+    return codec_name in allowed.get(kind, set())
+
+
+def _video_params(stream):
+    return (stream.codec_name, stream.profile, stream.width, stream.height, stream.pix_fmt)
+
+
+def _audio_params(stream):
+    return (stream.codec_name, stream.sample_rate, stream.channels)
+
+
+def plan_video_copy(video_streams, output_path, filtered=False):
+    """判断一组（按顺序拼接的）视频流能否直接 copy"""
+    if not video_streams:
+        return None
+    if filtered:
+        return decision("video", "encode", "视频需要经过滤镜处理")
+    first = _video_params(video_streams[0])
+    if any(_video_params(s) != first for s in video_streams[1:]):
+        return decision("video", "encode", "输入视频的编码/分辨率/像素格式不一致")
+    if not container_accepts(output_path, "video", first[0]):
+        return decision("video", "encode", f"{first[0]} 不能直接封装到 {os.path.splitext(output_path)[1]}")
+    return decision("video", "copy", f"{first[0]} 编码参数一致且容器兼容")
+
+
+def plan_audio_copy(audio_streams, output_path, filtered=False):
+    """判断一组（按顺序拼接的）音频流能否直接 copy"""
+    if not audio_streams:
+        return None
+    if filtered:
+        return decision("audio", "encode", "音频需要经过滤镜处理")
+    first = _audio_params(audio_streams[0])
+    if any(_audio_params(s) != first for s in audio_streams[1:]):
+        return decision("audio", "encode", "输入音频的编码/采样率/声道数不一致")
+    if not container_accepts(output_path, "audio", first[0]):
+        return decision("audio", "encode", f"{first[0]} 不能直接封装到 {os.path.splitext(output_path)[1]}")
+    return decision("audio", "copy", f"{first[0]} 编码参数一致且容器兼容")
+
+
+def plan_audio_replace(video_ctxs, audio_ctx, output_path, mute_video_audio=True):
+    """
+    拼接视频并替换/混合音频：画面不做任何处理，只要各段参数一致就直接 copy；
+    静音原声时外部音频也可直接 copy，混音则必须重新编码。
+    """
+    video = plan_video_copy([c.video_streams[0] for c in video_ctxs if c.video_streams], output_path)
+    if mute_video_audio:
+        audio_streams = audio_ctx.audio_streams[:1] if audio_ctx is not None else []
+        audio = plan_audio_copy(audio_streams, output_path)
+    else:
+        audio = decision("audio", "encode", "原声与外部音频混音需要重新编码")
+    return {"video": video, "audio": audio}
+
+
+def plan_clip(fmt_ctx, keyframe_index, start_sec, output_path):
+    """
+    剪辑：起点正好落在关键帧上时视频可以直接 copy，否则必须重新编码才能精确起切。
+    keyframe_index 为 None（索引尚未建立）时保守地重新编码，不在这里触发全量扫描。
+    音频帧很短，只要容器兼容就直接 copy。
+    """
+    if fmt_ctx is None:
+        return {"video": decision("video", "encode", "无法解析输入"), "audio": None}
+    video = None
+    if fmt_ctx.video_streams:
+        if keyframe_index is None or len(keyframe_index) == 0:
+            video = decision("video", "encode", "关键帧索引尚未建立，按输入侧 -ss 重新编码")
+        elif not keyframe_index.is_keyframe(start_sec):
+            prev_kf = keyframe_index.prev_keyframe(start_sec)
+            video = decision("video", "encode", f"起点 {start_sec}s 不在关键帧上（前一关键帧 {prev_kf}s）")
+        else:
+            video = plan_video_copy(fmt_ctx.video_streams[:1], output_path)
+    audio = plan_audio_copy(fmt_ctx.audio_streams[:1], output_path)
+    return {"video": video, "audio": audio}
+
+
+def codec_args(plan, fallback_video: str = "", fallback_audio: str = "") -> str:
+    """根据规划结果生成 -c:v / -c:a 参数；需要编码时使用 fallback 参数（默认交给 ffmpeg 选择编码器）"""
+    args = []
+    video = plan.get("video")
+    audio = plan.get("audio")
+    if video is not None:
+        args.append("-c:v copy" if video["action"] == "copy" else fallback_video)
+    if audio is not None:
+        args.append("-c:a copy" if audio["action"] == "copy" else fallback_audio)
+    return " ".join(a for a in args if a)
+
+
+# --- 拼接兼容性规划 ---
+
+# 规格化转码时各编码对应的编码器
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "vp9": "libvpx-vp9", "av1": "libaom-av1", "mpeg4": "mpeg4"}
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus", "vorbis": "libvorbis", "ac3": "ac3"}
+# ffprobe 报告的 profile 名称 -> 编码器的 -profile:v 取值；表中没有的 profile 不传 -profile:v
+ENCODER_PROFILES = {
+    "h264": {"Baseline": "baseline", "Constrained Baseline": "baseline", "Main": "main", "High": "high",
+             "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"},
+    "hevc": {"Main": "main", "Main 10": "main10", "Main Still Picture": "mainstillpicture"},
+}
+
+
+def media_fingerprint(fmt_ctx) -> tuple:
+    """
+    拼接兼容性指纹：只要两个输入的指纹相同，就可以用 concat demuxer 直接 stream copy。
+    包含视频编码、profile、分辨率、像素格式、帧率、时间基，以及音频编码、采样率、声道布局。
+    """
+    video = None
+    audio = None
+    if fmt_ctx.video_streams:
+        v = fmt_ctx.video_streams[0]
+        video = (v.codec_name, v.profile, v.width, v.height, v.pix_fmt, v.r_frame_rate, v.time_base)
+    if fmt_ctx.audio_streams:
+        a = fmt_ctx.audio_streams[0]
+        audio = (a.codec_name, a.sample_rate, a.channels, a.channel_layout)
+    return (video, audio)
+
+
+def fingerprint_to_dict(fingerprint) -> dict:
+    video, audio = fingerprint
+    result = {"video": None, "audio": None}
+    if video:
+        keys = ("codec", "profile", "width", "height", "pix_fmt", "fps", "time_base")
+        result["video"] = dict(zip(keys, video))
+    if audio:
+        keys = ("codec", "sample_rate", "channels", "channel_layout")
+        result["audio"] = dict(zip(keys, audio))
+    return result
+
+
+def plan_concat_normalization(fmt_ctxs):
+    """
+    以多数输入的指纹作为目标规格，找出与之不一致、需要转码的输入。
+
+    返回:
+        tuple: (target_fingerprint, outlier_indexes)
+    """
+    fingerprints = [media_fingerprint(c) for c in fmt_ctxs]
+    target, _ = Counter(fingerprints).most_common(1)[0]
+    outliers = [i for i, fp in enumerate(fingerprints) if fp != target]
+    return target, outliers
+
+
+def normalization_blocker(target):
+    """
+    目标规格中有没有编码器可以产出的编码：没有时返回原因，可以转码时返回 None。
+    不能换成别的编码凑数，否则转码结果与直接 copy 的输入规格不同，concat demuxer 会拼出损坏的文件。
+    """
+    video, audio = target
+    if video and video[0] not in VIDEO_ENCODERS:
+        return f"目标视频编码 {video[0]} 没有可用的编码器"
+    if audio and audio[0] not in AUDIO_ENCODERS:
+        return f"目标音频编码 {audio[0]} 没有可用的编码器"
+    return None
@@ -29,6 +29,8 @@ def run_command(command, timeout=300):
     logs = []
     return_code = 0
     append_msg = ""
+    proc = None
+    thread = None
     def read_output(proc):
         try:
             while True:
@@ -66,10 +68,10 @@ def run_command(command, timeout=300):
         # 捕获所有其他异常
     finally:
         # 确保清理资源
-        if 'proc' in globals() and proc and proc.poll() is None:  # 如果进程仍在运行
+        if proc is not None and proc.poll() is None:  # 如果进程仍在运行
             proc.kill()
-        if 'thread' in globals() and thread:
-            thread.join()  #
+        if thread is not None:
+            thread.join()  # 等读线程把剩余输出读完，避免日志被截断
         logs.append(append_msg)
         return return_code, '\n'.join(logs), append_msg
     
@@ -171,6 +173,74 @@ def run_ffplay(cmd, timeout = 60):
         return code,cmd,'\n'.join(logs)
     return code, cmd, log
     
+class FFmpegPipe:
+    """
+    以二进制管道方式运行 ffmpeg（输出写到 pipe:1），供调用方直接读取原始数据，不经过磁盘。
+    stderr 由后台线程持续读走，避免缓冲区写满导致 ffmpeg 阻塞。
+
+        with FFmpegPipe(cmd) as pipe:
+            n = pipe.readinto(buffer)
+        code, log = pipe.result()
+    """
+
+    def __init__(self, cmd, pass_fds=()):
+        """pass_fds：传给 ffmpeg 的额外文件描述符（如 pipe:N 输出用的管道写端）"""
+        cmd_dir = command_dir()
+        if cmd_dir is None:
+            raise RuntimeError("Not Support Platform")
+        self.cmd = f"{cmd_dir}/ffmpeg {cmd}"
+        self.logs = [self.cmd]
+        self.code = None
+        args = shlex.split(self.cmd, posix=(sys.platform != 'win32'))
+        extra = {"pass_fds": tuple(pass_fds)} if pass_fds else {}
+        self.proc = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, bufsize=0, **extra)
+        self._thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._thread.start()
+
+    def _drain_stderr(self):
+        for line in iter(self.proc.stderr.readline, b""):
+            self.logs.append(line.decode("utf-8", errors="replace").rstrip("\n"))
+
+    def readinto(self, buffer) -> int:
+        """尽量填满 buffer（支持缓冲区协议的对象），返回读到的字节数，0 表示输出已结束"""
+        total = 0
+        with memoryview(buffer).cast("B") as view:
+            while total < len(view):
+                with view[total:] as rest:
+                    n = self.proc.stdout.readinto(rest)
+                if not n:
+                    break
+                total += n
+        return total
+
+    def read(self, size=65536) -> bytes:
+        """读取至多 size 字节，返回 b"" 表示输出已结束"""
+        return self.proc.stdout.read(size)
+
+    def close(self, timeout=10):
+        """结束进程（读到一半时直接终止），返回 (code, log)"""
+        if self.code is None:
+            if self.proc.poll() is None:
+                self.proc.stdout.close()
+                try:
+                    self.proc.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+                    self.proc.wait()
+            self.code = self.proc.returncode
+            self._thread.join()
+        return self.result()
+
+    def result(self):
+        return self.code, '\n'.join(self.logs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def media_format_ctx(path):
     cmd = f" -show_streams -of json -v error -i {shlex.quote(path)}"
     code, cmd, log = run_ffprobe(cmd)
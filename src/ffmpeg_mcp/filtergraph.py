@@ -0,0 +1,110 @@
+"""
+filtergraph 构建器
+
+用带类型（视频 v / 音频 a）的流对象描述 filter_complex，取代手工拼接滤镜字符串：
+- 每个滤镜的输入输出都是 Stream，按需自动生成唯一的标签；
+- 同一个流只能被消费一次（ffmpeg 的要求），需要复用时显式 split；
+- 参数值按 filtergraph 的两级转义规则处理，路径、表达式中的 : , ' 等字符不会破坏图结构。
+"""
+import shlex
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Stream:
+    label: str
+    kind: str  # "v" 或 "a"
+
+    def __str__(self):
+        return f"[{self.label}]"
+
+
+def escape_value(value) -> str:
+    """滤镜参数值转义：先转义选项层的 \\ ' :，再转义图层的 \\ ' [ ] , ;"""
+    text = str(value)
+    for ch in ("\\", "'", ":"):
+        text = text.replace(ch, "\\" + ch)
+    for ch in ("\\", "'", "[", "]", ",", ";"):
+        text = text.replace(ch, "\\" + ch)
+    return text
+
+
+class FilterGraph:
+    def __init__(self):
+        self.inputs = []  # [(输入参数, 路径)]
+        self.filters = []
+        self._consumed = set()
+        self._count = 0
+
+    def add_input(self, path, args: str = "") -> int:
+        """添加一个输入文件，args 为输入侧参数（如 -ss 3 -t 5），返回输入编号"""
+        self.inputs.append((args, path))
+        return len(self.inputs) - 1
+
+    def input_stream(self, index: int, kind: str, stream_index: int = 0) -> Stream:
+        return Stream(f"{index}:{kind}:{stream_index}", kind)
+
+    def _new_stream(self, kind) -> Stream:
+        self._count += 1
+        return Stream(f"{kind}{self._count}", kind)
+
+    def apply(self, name, inputs, out_kinds="v", *args, **params):
+        """
+        添加一个滤镜。
+
+        参数:
+            name (str): 滤镜名
+            inputs (list): 输入 Stream（可以为空，如 anullsrc 这类源滤镜）
+            out_kinds (str): 输出流类型序列，如 "v"、"a"、"va"
+            args: 位置参数，params: 命名参数（值为 None 的忽略）
+        返回:
+            Stream 或 Stream 元组（多个输出时）
+        """
+        for s in inputs:
+            if not isinstance(s, Stream):
+                raise TypeError(f"{name} 的输入必须是 Stream: {s!r}")
+            if self._is_input(s):
+                continue
+            if s in self._consumed:
+                raise ValueError(f"流 {s} 已被使用，需要复用时请先 split")
+            self._consumed.add(s)
+        options = [escape_value(a) for a in args]
+        options += [f"{k}={escape_value(v)}" for k, v in params.items() if v is not None]
+        spec = name + ("=" + ":".join(options) if options else "")
+        outputs = tuple(self._new_stream(k) for k in out_kinds)
+        self.filters.append("".join(map(str, inputs)) + spec + "".join(map(str, outputs)))
+        return outputs[0] if len(outputs) == 1 else outputs
+
+    def chain(self, stream, *filters):
+        """对单个流依次应用多个单输入单输出滤镜，filters 为 (name, args, params) 或滤镜名"""
+        for f in filters:
+            name, args, params = (f, (), {}) if isinstance(f, str) else f
+            stream = self.apply(name, [stream], stream.kind, *args, **params)
+        return stream
+
+    def split(self, stream, n):
+        if n == 1:
+            return [stream]
+        return list(self.apply("split" if stream.kind == "v" else "asplit", [stream], stream.kind * n, n))
+
+    def render(self) -> str:
+        return ";".join(self.filters)
+
+    def command(self, maps, output_args, output_path) -> str:
+        """生成完整 ffmpeg 参数；maps 为最终输出的 Stream 列表"""
+        return self.command_outputs([(maps, output_args, output_path)])
+
+    def command_outputs(self, outputs) -> str:
+        """一次调用写多个输出，outputs 为 [(maps, output_args, output_path)]"""
+        cmd = " ".join(f"{args} -i {shlex.quote(path)}".strip() for args, path in self.inputs)
+        if self.filters:
+            cmd += f" -filter_complex {shlex.quote(self.render())}"
+        for maps, output_args, output_path in outputs:
+            for s in maps:
+                cmd += f" -map {shlex.quote(str(s) if not self._is_input(s) else s.label)}"
+            cmd += f" {output_args} -y {shlex.quote(output_path)}"
+        return cmd
+
+    @staticmethod
+    def _is_input(stream) -> bool:
+        return ":" in stream.label
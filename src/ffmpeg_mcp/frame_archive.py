@@ -0,0 +1,243 @@
+"""
+抽帧打包
+
+ffmpeg 以 image2pipe 把图片连续写到管道，服务端按图片格式切分出每一帧，
+边抽边写进 zip（ZIP_STORED，图片本身已压缩）或 tar 流：
+既可以直接作为 HTTP 响应流给客户端，也可以写成磁盘上的一个归档文件，
+不会先在输出目录里落下成千上万个小文件。
+
+归档末尾附带 frames.json：每一帧的文件名、在源视频中的时间（秒）和所属窗口，以及 ffmpeg 的退出码。
+"""
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.frame_dedupe as frame_dedupe
+import ffmpeg_mcp.frames as frames
+
+ARCHIVE_FORMATS = ("zip", "tar")
+MEDIA_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+INDEX_NAME = "frames.json"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class ImageSplitter:
+    """把 image2pipe 的字节流切分成一张张完整的图片（png / jpg / webp）"""
+
+    def __init__(self, ext):
+        if ext not in frames.PIPE_CODECS:
+            raise ValueError(f"不支持的图片格式: {ext}")
+        self.ext = ext
+        self.buffer = bytearray()
+
+    def feed(self, data) -> list:
+        self.buffer += data
+        images = []
+        while True:
+            end = self._image_end()
+            if end is None:
+                break
+            images.append(bytes(self.buffer[:end]))
+            del self.buffer[:end]
+        return images
+
+    def _image_end(self):
+        buf = self.buffer
+        if self.ext == "jpg":
+            # 熵编码数据中的 0xFF 后面总是跟着 0x00，EOI(FFD9) 只会出现在图片末尾
+            if len(buf) < 4:
+                return None
+            end = buf.find(b"\xff\xd9", 2)
+            return end + 2 if end >= 0 else None
+        if self.ext == "webp":
+            # RIFF 头中给出了整个文件的长度
+            if len(buf) < 8:
+                return None
+            size = int.from_bytes(buf[4:8], "little") + 8
+            size += size & 1
+            return size if len(buf) >= size else None
+        # png：逐个 chunk 解析到 IEND
+        pos = len(PNG_SIGNATURE)
+        while pos + 8 <= len(buf):
+            length = int.from_bytes(buf[pos:pos + 4], "big")
+            chunk_type = bytes(buf[pos + 4:pos + 8])
+            pos += 12 + length
+            if pos > len(buf):
+                return None
+            if chunk_type == b"IEND":
+                return pos
+        return None
+
+
+def _open_pipe(video_path, k, window, ext, fps, total_frames, keyframes_only, min_interval, width, quality,
+               dedupe, dedupe_threshold):
+    """启动单个窗口的 ffmpeg，返回 (FFmpegPipe, StreamFilter 或 None)"""
+    if dedupe not in frame_dedupe.HASH_SIZES:
+        cmd = frames.build_pipe_command(video_path, k, window, ext, fps, total_frames,
+                                        keyframes_only, min_interval, width, quality, dedupe)
+        return ffmpeg.FFmpegPipe(cmd), None
+    hash_r, hash_w = os.pipe()
+    try:
+        cmd = frames.build_pipe_command(video_path, k, window, ext, fps, total_frames,
+                                        keyframes_only, min_interval, width, quality, dedupe, hash_w)
+        pipe = ffmpeg.FFmpegPipe(cmd, pass_fds=(hash_w,))
+    except Exception:
+        os.close(hash_r)
+        raise
+    finally:
+        # 父进程不保留写端，ffmpeg 退出后读取方才能读到 EOF
+        os.close(hash_w)
+    return pipe, frame_dedupe.StreamFilter(dedupe, hash_r, dedupe_threshold)
+
+
+def iter_frame_images(video_path, windows, ext, fps=0, total_frames=0, keyframes_only=False, min_interval=0,
+                      width=0, quality=None, index=None, time_out=1000, dedupe=None, dedupe_threshold=None):
+    """
+    逐个窗口运行 ffmpeg（image2pipe），依次产出 (name, data)。
+    每个窗口结束后把该窗口各帧的时间追加到 index["frames"]，ffmpeg 的退出码与日志记在 index 中。
+    dedupe 为 dhash / phash 时重复的图片在这里就被丢弃，产出的图片仍然连续编号。
+    """
+    index = index if index is not None else {}
+    index.setdefault("frames", [])
+    index.setdefault("status", 0)
+    logs = []
+    deadline = time.time() + time_out
+    for k, window in enumerate(windows):
+        pipe, dedupe_filter = _open_pipe(video_path, k, window, ext, fps, total_frames, keyframes_only,
+                                         min_interval, width, quality, dedupe, dedupe_threshold)
+        splitter = ImageSplitter(ext)
+        pattern = os.path.basename(frames.frame_pattern("", ext, k if len(windows) > 1 else None))
+        names = []
+        # 每张产出的图片在未去重的帧序列中的序号，用来对应 showinfo 的时间
+        sources = []
+
+        def emit(kept):
+            for i, image in kept:
+                name = pattern % (len(names) + 1)
+                names.append(name)
+                sources.append(i)
+                yield name, image
+
+        decoded = 0
+        with pipe:
+            while time.time() < deadline:
+                data = pipe.read()
+                if not data:
+                    break
+                for image in splitter.feed(data):
+                    kept = dedupe_filter.feed(image) if dedupe_filter else [(decoded, image)]
+                    decoded += 1
+                    yield from emit(kept)
+        if dedupe_filter:
+            yield from emit(dedupe_filter.finish())
+        code, log = pipe.result()
+        if time.time() >= deadline:
+            code = -1
+            log += "\nTimeout expired"
+        if code != 0:
+            index["status"] = code
+        start = window[0] or 0
+        times = sorted(frames.parse_showinfo(log).get(k, []))
+        for name, i in zip(names, sources):
+            t = round(start + times[i][1], 3) if i < len(times) else None
+            index["frames"].append({"name": name, "time": t, "window": k})
+        log = frames.strip_showinfo(log)
+        if dedupe_filter:
+            log += f"\n{dedupe}: kept {len(names)}/{decoded} frames"
+        logs.append(log)
+    index["log"] = "\n".join(logs)
+
+
+class _Sink(io.RawIOBase):
+    """只写、不可 seek 的缓冲：zipfile / tarfile 写进来的字节由生成器取走"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _iter_archive_bytes(images, archive, index):
+    sink = _Sink()
+    if archive == "zip":
+        zf = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+        for name, data in images:
+            zf.writestr(zipfile.ZipInfo(name, time.localtime()[:6]), data)
+            yield sink.take()
+        zf.writestr(zipfile.ZipInfo(INDEX_NAME, time.localtime()[:6]), json.dumps(index, ensure_ascii=False))
+        zf.close()
+    else:
+        tf = tarfile.open(fileobj=sink, mode="w|")
+        for name, data in images:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tf.addfile(info, io.BytesIO(data))
+            yield sink.take()
+        payload = json.dumps(index, ensure_ascii=False).encode("utf-8")
+        info = tarfile.TarInfo(INDEX_NAME)
+        info.size = len(payload)
+        info.mtime = int(time.time())
+        tf.addfile(info, io.BytesIO(payload))
+        tf.close()
+    yield sink.take()
+
+
+def iter_archive(video_path, archive="zip", windows=None, format=1, fps=0, total_frames=0,
+                 keyframes_only=False, min_interval=0, width=0, quality=None, index=None, dedupe=None,
+                 dedupe_threshold=None):
+    """
+    产出归档（zip / tar）的字节块，可直接作为 StreamingResponse 的内容。
+    index 传入 dict 时，结束后其中包含 frames / status / log。
+    """
+    if archive not in ARCHIVE_FORMATS:
+        raise ValueError(f"archive 必须是 {list(ARCHIVE_FORMATS)} 之一")
+    index = index if index is not None else {}
+    windows = windows or [(None, None)]
+    images = iter_frame_images(video_path, windows, frames.image_ext(format), fps, total_frames,
+                               keyframes_only, min_interval, width, quality, index,
+                               dedupe=dedupe, dedupe_threshold=dedupe_threshold)
+    # frames.json 只需要帧列表和状态，日志留给调用方
+    public = {}
+
+    def finished_images():
+        yield from images
+        public.update(frames=index["frames"], status=index["status"])
+
+    for chunk in _iter_archive_bytes(finished_images(), archive, public):
+        if chunk:
+            yield chunk
+
+
+def write_archive(path, video_path, archive="zip", windows=None, format=1, fps=0, total_frames=0,
+                  keyframes_only=False, min_interval=0, width=0, quality=None, dedupe=None, dedupe_threshold=None):
+    """
+    把抽出的帧写成磁盘上的一个归档文件。
+
+    返回:
+        tuple: (status, log, path, frames)，frames 为 [{"name", "time", "window"}]
+    """
+    index = {}
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        for chunk in iter_archive(video_path, archive, windows, format, fps, total_frames,
+                                  keyframes_only, min_interval, width, quality, index, dedupe,
+                                  dedupe_threshold):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    return index.get("status", -1), index.get("log", ""), path, index.get("frames", [])
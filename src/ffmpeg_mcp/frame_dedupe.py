@@ -0,0 +1,147 @@
+"""
+抽帧去重
+
+屏幕录制、静止镜头按固定 fps 抽帧会得到大量几乎相同的画面。两种去重方式：
+- mpdecimate：ffmpeg 滤镜，直接丢弃与上一张保留帧差异很小的帧，开销最低；
+- dhash / phash：同一次解码中额外输出一路极小的灰度 rawvideo（9x8 / 32x32）到第二个管道，
+  后台线程边读边用 NumPy 计算感知哈希；图片以 image2pipe 写到 stdout，
+  与同一帧的哈希配对后只把与上一张保留帧汉明距离超过阈值的图片写到磁盘或归档中。
+  重复画面在 ffmpeg 内部仍会被编码一次，但不会落盘，也不需要事后删除、重新编号。
+
+dhash / phash 需要 NumPy（pip install ffmpeg-mcp[numpy]），以及支持向子进程传递管道的 POSIX 系统。
+"""
+import os
+import threading
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+DEDUPE_METHODS = ("dhash", "phash", "mpdecimate")
+# 感知哈希使用的灰度小图尺寸 (宽, 高)
+HASH_SIZES = {"dhash": (9, 8), "phash": (32, 32)}
+# 默认汉明距离阈值（64 位哈希）：距离大于阈值才认为是新画面
+DEFAULT_THRESHOLDS = {"dhash": 5, "phash": 10}
+
+
+def validate(method):
+    if method is None:
+        return
+    if method not in DEDUPE_METHODS:
+        raise ValueError(f"dedupe 必须是 {list(DEDUPE_METHODS)} 之一")
+    if method in HASH_SIZES:
+        if np is None:
+            raise ValueError(f"dedupe={method} 需要安装 numpy，或使用 mpdecimate")
+        if os.name != "posix":
+            raise ValueError(f"dedupe={method} 只支持 Linux / macOS，请使用 mpdecimate")
+
+
+def _pack_bits(bits):
+    """(n, 64) 的布尔矩阵打包为 n 个 64 位整数"""
+    return [int(v) for v in np.packbits(bits, axis=1).view(">u8").ravel()]
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+def hash_frames(raw: bytes, method: str) -> list:
+    """对连续的灰度 rawvideo 小图批量计算感知哈希，返回 64 位整数列表"""
+    w, h = HASH_SIZES[method]
+    count = len(raw) // (w * h)
+    if count == 0:
+        return []
+    pixels = np.frombuffer(raw, dtype=np.uint8, count=count * w * h).reshape(count, h, w).astype(np.float32)
+    if method == "dhash":
+        bits = (pixels[:, :, 1:] > pixels[:, :, :-1]).reshape(count, 64)
+    else:
+        d = _dct_matrix(w).astype(np.float32)
+        low = np.einsum("ij,njk,lk->nil", d, pixels, d)[:, :8, :8].reshape(count, 64)
+        # 与中位数比较（不含直流分量）
+        median = np.median(low[:, 1:], axis=1, keepdims=True)
+        bits = low > median
+    return _pack_bits(bits)
+
+
+def select_distinct(hashes, threshold) -> list:
+    """依次比较，只保留与上一张保留帧汉明距离大于 threshold 的帧，返回保留的下标"""
+    kept = []
+    last = None
+    for i, value in enumerate(hashes):
+        if last is None or (value ^ last).bit_count() > threshold:
+            kept.append(i)
+            last = value
+    return kept
+
+
+class StreamFilter:
+    """
+    边抽帧边去重。后台线程从 fd（ffmpeg 的灰度 rawvideo 输出管道）读取小图并批量计算哈希；
+    调用方按顺序 feed 每一张图片，图片与同一序号的哈希配对后才做判断，
+    哈希尚未到达的图片暂存在内存中（ffmpeg 侧用 -flush_packets 1 保证哈希及时写出）。
+
+        f = StreamFilter("dhash", read_fd)
+        for image in images:
+            for i, image in f.feed(image):
+                write(image)          # i 为该图片在未去重序列中的序号
+        for i, image in f.finish():
+            write(image)
+    """
+
+    def __init__(self, method, fd, threshold=None):
+        self.method = method
+        self.threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        w, h = HASH_SIZES[method]
+        self.frame_bytes = w * h
+        self.hashes = []
+        self.pending = deque()
+        self.index = 0
+        self.last = None
+        self.dropped = 0
+        self._file = os.fdopen(fd, "rb", buffering=0)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        buf = bytearray()
+        with self._file:
+            while True:
+                data = self._file.read(65536)
+                if not data:
+                    break
+                buf += data
+                size = len(buf) // self.frame_bytes * self.frame_bytes
+                if size:
+                    self.hashes.extend(hash_frames(bytes(buf[:size]), self.method))
+                    del buf[:size]
+
+    def feed(self, item) -> list:
+        """送入下一张图片，返回已经可以确定保留的 [(序号, item)]"""
+        self.pending.append(item)
+        return self._resolve(final=False)
+
+    def finish(self) -> list:
+        """图片输出结束后调用：等待哈希读完，返回剩余保留的图片（缺少哈希的图片按新画面保留）"""
+        self._thread.join()
+        return self._resolve(final=True)
+
+    def _resolve(self, final):
+        available = len(self.hashes)
+        kept = []
+        while self.pending and (self.index < available or final):
+            item = self.pending.popleft()
+            value = self.hashes[self.index] if self.index < available else None
+            if value is None or self.last is None or (value ^ self.last).bit_count() > self.threshold:
+                if value is not None:
+                    self.last = value
+                kept.append((self.index, item))
+            else:
+                self.dropped += 1
+            self.index += 1
+        return kept
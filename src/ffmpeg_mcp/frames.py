@@ -0,0 +1,336 @@
+"""
+抽帧
+
+按时间窗口抽帧：每个窗口作为一个带输入侧 -ss/-t 的输入，先跳到窗口前的关键帧，
+再由 ffmpeg 丢弃窗口开始前的帧（accurate seek），不会从文件开头解码。
+多个窗口在一次 ffmpeg 调用中完成；每个窗口的画面经过 showinfo，
+从日志中解析出每一帧的时间戳。
+
+稀疏时间点抓帧：相近的时间点合并为一次 seek，各组在有界线程池中并行执行；
+只取关键帧时借助关键帧索引直接定位，只解码关键帧本身。
+"""
+import os
+import re
+import shlex
+
+import ffmpeg_mcp.frame_dedupe as frame_dedupe
+import ffmpeg_mcp.utils as utils
+from ffmpeg_mcp.filtergraph import FilterGraph
+
+# format 参数对应的图片格式：0 png 1 jpg 2 webp
+IMAGE_EXTS = {0: "png", 1: "jpg", 2: "webp"}
+
+# image2pipe 输出时各图片格式的编码器
+PIPE_CODECS = {"png": "png", "jpg": "mjpeg", "webp": "libwebp"}
+
+# 图片质量预设（png 为无损格式，不受影响）
+QUALITY_PRESETS = {
+    "low": {"jpg": "-q:v 10", "webp": "-quality 50"},
+    "medium": {"jpg": "-q:v 5", "webp": "-quality 75"},
+    "high": {"jpg": "-q:v 2", "webp": "-quality 90"},
+}
+
+# showinfo 的实例名带上窗口编号，日志前缀形如 [Parsed_showinfo@frames_w0_1 @ 0x...] 或 [frames_w0 @ 0x...]
+SHOWINFO = re.compile(r"frames_w(\d+).*?\bn:\s*(\d+)\b.*?\bpts_time:\s*([-+0-9.eE]+)")
+
+
+def image_ext(format) -> str:
+    return IMAGE_EXTS.get(format, "webp")
+
+
+def quality_args(ext, quality=None) -> str:
+    """质量预设对应的编码参数，quality 为空时使用编码器默认值"""
+    if quality is None:
+        return ""
+    if quality not in QUALITY_PRESETS:
+        raise ValueError(f"quality 必须是 {list(QUALITY_PRESETS)} 之一")
+    return QUALITY_PRESETS[quality].get(ext, "")
+
+
+def parse_windows(windows=None, start=None, end=None, duration=None):
+    """
+    解析抽帧时间窗口，返回 [(start, end)]，end 为 None 表示到文件末尾。
+
+    windows 的每一项为 {"start", "end"/"duration"} 或 [start, end]；
+    未给 windows 时使用 start / end / duration 组成单个窗口，全部为空时返回 [(None, None)]（整个文件）。
+    """
+    if windows is None:
+        if start is None and end is None and duration is None:
+            return [(None, None)]
+        windows = [{"start": start, "end": end, "duration": duration}]
+    if not isinstance(windows, list) or not windows:
+        raise ValueError("windows 必须是非空列表")
+    parsed = []
+    for i, item in enumerate(windows):
+        if isinstance(item, dict):
+            w_start, w_end, w_duration = item.get("start"), item.get("end"), item.get("duration")
+        elif isinstance(item, (list, tuple)) and 1 <= len(item) <= 2:
+            w_start, w_end, w_duration = item[0], item[1] if len(item) > 1 else None, None
+        else:
+            raise ValueError(f"第 {i} 个窗口格式不正确: {item}")
+        w_start = utils.convert_to_seconds(w_start) if w_start is not None else 0.0
+        if w_end is not None:
+            w_end = utils.convert_to_seconds(w_end)
+        elif w_duration is not None:
+            w_end = w_start + utils.convert_to_seconds(w_duration)
+        if w_start < 0 or (w_end is not None and w_end <= w_start):
+            raise ValueError(f"第 {i} 个窗口的时间范围不正确: {item}")
+        parsed.append((w_start, w_end))
+    return parsed
+
+
+def window_input_args(start, end) -> str:
+    args = f"-ss {start}" if start else ""
+    if end is not None:
+        args += f" -t {end - (start or 0)}"
+    return args.strip()
+
+
+def frame_pattern(output_folder, ext, window_index=None) -> str:
+    if window_index is None:
+        return os.path.join(output_folder, f"frame_%04d.{ext}")
+    return os.path.join(output_folder, f"frame_w{window_index:02d}_%04d.{ext}")
+
+
+def _window_output(graph, video_path, k, window, ext, fps=0, total_frames=0,
+                   keyframes_only=False, min_interval=0, width=0, quality=None, dedupe=None):
+    """
+    为一个窗口添加输入与滤镜链，返回 (stream, output_args, hash_stream)。
+
+    dedupe=mpdecimate 时直接在滤镜链里丢弃重复画面；dhash / phash 时 split 出一路灰度小图
+    （hash_stream），供 frame_dedupe.StreamFilter 计算感知哈希，其余情况下 hash_stream 为 None。
+    """
+    start, end = window
+    input_args = window_input_args(start, end)
+    if keyframes_only:
+        input_args = f"-skip_frame nokey {input_args}".strip()
+    index = graph.add_input(video_path, input_args)
+    stream = graph.input_stream(index, "v")
+    spacing = min_interval or fps
+    if keyframes_only:
+        if spacing > 0:
+            stream = graph.chain(
+                stream, ("select", (f"isnan(prev_selected_t)+gte(t-prev_selected_t,{spacing})",), {}))
+    elif fps > 0:
+        stream = graph.chain(stream, ("fps", (f"1/{fps}",), {}))
+    if dedupe == "mpdecimate":
+        stream = graph.chain(stream, "mpdecimate")
+    hash_stream = None
+    if dedupe in frame_dedupe.HASH_SIZES:
+        stream, hash_stream = graph.split(stream, 2)
+        hash_width, hash_height = frame_dedupe.HASH_SIZES[dedupe]
+        hash_stream = graph.chain(hash_stream, ("scale", (hash_width, hash_height), {"flags": "area"}),
+                                  ("format", ("gray",), {}))
+    if width and width > 0:
+        stream = graph.chain(stream, ("scale", (width, -2), {}))
+    stream = graph.chain(stream, f"showinfo@frames_w{k}")
+    # 丢帧的滤镜之后必须 -vsync 0，否则 image2 会按恒定帧率把被丢掉的帧补回来
+    output_args = "-vsync 0" if fps <= 0 or keyframes_only or dedupe else ""
+    output_args += " " + quality_args(ext, quality)
+    if total_frames > 0:
+        output_args += f" -frames:v {total_frames}"
+    return stream, output_args.strip(), hash_stream
+
+
+def build_extract_command(video_path, windows, output_folder, ext, fps=0, total_frames=0,
+                          keyframes_only=False, min_interval=0, width=0, quality=None, dedupe=None):
+    """
+    生成按窗口抽帧的 ffmpeg 参数。
+
+    keyframes_only 时解码器只解码关键帧（-skip_frame nokey），再用 select 保证相邻两帧至少间隔
+    min_interval 秒（未指定时使用 fps），适合预览图；width 在同一条滤镜链里缩小画面。
+    dedupe 只支持 mpdecimate；dhash / phash 需要边读边过滤，走 build_pipe_command。
+
+    返回:
+        tuple: (cmd, patterns)，patterns 为每个窗口的输出文件模式
+    """
+    graph = FilterGraph()
+    outputs = []
+    patterns = []
+    for k, window in enumerate(windows):
+        stream, output_args, _ = _window_output(graph, video_path, k, window, ext, fps, total_frames,
+                                                keyframes_only, min_interval, width, quality,
+                                                dedupe if dedupe == "mpdecimate" else None)
+        pattern = frame_pattern(output_folder, ext, k if len(windows) > 1 else None)
+        outputs.append(([stream], output_args, pattern))
+        patterns.append(pattern)
+    return graph.command_outputs(outputs), patterns
+
+
+def build_pipe_command(video_path, k, window, ext, fps=0, total_frames=0,
+                       keyframes_only=False, min_interval=0, width=0, quality=None, dedupe=None, hash_fd=None):
+    """
+    单个窗口的画面以 image2pipe 连续写到 stdout，不落地成单独的文件。
+    dedupe 为 dhash / phash 时，灰度小图以 rawvideo 写到文件描述符 hash_fd（由调用方创建的管道）。
+    """
+    graph = FilterGraph()
+    stream, output_args, hash_stream = _window_output(graph, video_path, k, window, ext, fps, total_frames,
+                                                      keyframes_only, min_interval, width, quality, dedupe)
+    output_args += f" -f image2pipe -c:v {PIPE_CODECS[ext]}"
+    outputs = [([stream], output_args, "pipe:1")]
+    if hash_stream is not None:
+        # 每帧立即写出，读取方才能及时把图片与哈希配对，而不必在内存里攒下大量图片
+        hash_args = "-vsync 0 -f rawvideo -pix_fmt gray -flush_packets 1"
+        if total_frames > 0:
+            hash_args += f" -frames:v {total_frames}"
+        outputs.append(([hash_stream], hash_args, f"pipe:{hash_fd}"))
+    return graph.command_outputs(outputs)
+
+
+def parse_showinfo(log):
+    """从 ffmpeg 日志中解析 showinfo 输出，返回 {窗口编号: [(帧序号, pts_time)]}"""
+    frames = {}
+    for line in log.splitlines():
+        m = SHOWINFO.search(line)
+        if m:
+            frames.setdefault(int(m.group(1)), []).append((int(m.group(2)), float(m.group(3))))
+    return frames
+
+
+def strip_showinfo(log) -> str:
+    """去掉逐帧的 showinfo 日志，只保留其余输出"""
+    return "\n".join(line for line in log.splitlines() if not SHOWINFO.search(line))
+
+
+def collect_frames(log, windows, patterns, total_frames=0):
+    """
+    把 showinfo 的时间戳与实际写出的图片对应起来。
+
+    返回:
+        list: [{"path", "time", "window"}]，time 为相对源文件开头的秒数
+    """
+    infos = parse_showinfo(log)
+    frames = []
+    for k, ((start, _), pattern) in enumerate(zip(windows, patterns)):
+        entries = sorted(infos.get(k, []))
+        if total_frames > 0:
+            entries = entries[:total_frames]
+        for i, (_, pts_time) in enumerate(entries):
+            path = pattern % (i + 1)
+            if os.path.exists(path):
+                frames.append({"path": path, "time": round((start or 0) + pts_time, 3), "window": k})
+    return frames
+
+
+# --- 稀疏时间点抓帧 ---
+
+# 同时执行的 seek 数
+GRAB_WORKERS = int(os.getenv("MCP_GRAB_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+# 一次最多抓取的时间点数
+MAX_GRAB_TIMESTAMPS = 1000
+# 相邻时间点间隔不超过该值（或位于同一个 GOP）时合并为一次 seek，顺序解码到后面的时间点
+GROUP_GAP_SECONDS = 2.0
+# 每次 ffmpeg 调用最多写出的图片数
+MAX_GROUP_SIZE = 32
+
+
+def parse_timestamps(timestamps):
+    """校验时间点列表（秒数或 HH:MM:SS），返回秒数列表"""
+    if not isinstance(timestamps, list) or not timestamps:
+        raise ValueError("timestamps 必须是非空列表")
+    if len(timestamps) > MAX_GRAB_TIMESTAMPS:
+        raise ValueError(f"timestamps 最多 {MAX_GRAB_TIMESTAMPS} 个")
+    seconds = []
+    for t in timestamps:
+        try:
+            value = utils.convert_to_seconds(t)
+        except (TypeError, ValueError):
+            raise ValueError(f"时间点格式不正确: {t}")
+        if value < 0:
+            raise ValueError(f"时间点不能为负数: {t}")
+        seconds.append(value)
+    return seconds
+
+
+def group_timestamps(timestamps, index=None):
+    """
+    把排好序的时间点分组：组内只 seek 一次，从第一个时间点顺序解码到最后一个。
+    相邻时间点间隔不超过 GROUP_GAP_SECONDS，或者之间没有关键帧（同一个 GOP，单独 seek 也省不了解码）时归为一组。
+    """
+    groups = []
+    for t in sorted(set(timestamps)):
+        if groups and len(groups[-1]) < MAX_GROUP_SIZE:
+            last = groups[-1][-1]
+            same_gop = index is not None and index.prev_keyframe(t) == index.prev_keyframe(last)
+            if t - last <= GROUP_GAP_SECONDS or same_gop:
+                groups[-1].append(t)
+                continue
+        groups.append([t])
+    return groups
+
+
+def grab_path(output_folder, video_path, t, ext) -> str:
+    """<源文件名>_<毫秒>ms.<ext>：不同视频在同一目录中抓取相同时间点也不会互相覆盖"""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(output_folder, f"{stem}_{int(round(t * 1000)):09d}ms.{ext}")
+
+
+def build_grab_command(video_path, targets, paths) -> str:
+    """
+    一组时间点一次 ffmpeg 调用：输入侧 seek 到第一个时间点，
+    每个输出用输出侧 -ss 丢弃它之前的帧，只取一帧，解码在所有输出之间共享。
+    """
+    start = targets[0]
+    cmd = f"{window_input_args(start, None)} -i {shlex.quote(video_path)}".strip()
+    for t, path in zip(targets, paths):
+        cmd += f" -map 0:v:0 -ss {round(t - start, 6)} -frames:v 1 -y {shlex.quote(path)}"
+    return cmd
+
+
+def build_keyframe_grab_command(video_path, keyframes, paths) -> str:
+    """只取关键帧：每个关键帧一个输入，-skip_frame nokey 让解码器跳过非关键帧，只解码这一帧"""
+    parts = []
+    for t in keyframes:
+        parts.append(f"-skip_frame nokey -noaccurate_seek {window_input_args(t, None)} -i {shlex.quote(video_path)}")
+    for i, path in enumerate(paths):
+        parts.append(f"-map {i}:v:0 -frames:v 1 -y {shlex.quote(path)}")
+    return " ".join(p.replace("  ", " ") for p in parts)
+
+
+# --- 分片并行抽取全部帧 ---
+
+# 分片起点比关键帧时间提前的秒数，避免 -ss 的微秒取整越过关键帧而丢掉第一帧
+SHARD_SEEK_MARGIN = 0.0005
+
+
+def plan_shards(index, ranges):
+    """
+    为按关键帧切好的区间计算每个分片的帧数与起始编号，使各分片的输出连成与单次抽取相同的连续编号。
+
+    返回:
+        list: [(start, count, start_number)]，最后一个分片 count 为 None（抽到结尾）；无法统计帧数时返回 None
+    """
+    shards = []
+    start_number = 1
+    for start, end in ranges:
+        count = index.frame_count(start, end) if end is not None else None
+        if end is not None and not count:
+            return None
+        shards.append((start, count, start_number))
+        if count:
+            start_number += count
+    return shards
+
+
+def build_shard_command(video_path, start, count, pattern, start_number) -> str:
+    """抽取一个分片：seek 到分片起点的关键帧，按帧数截止，编号从 start_number 开始"""
+    input_args = window_input_args(max(0.0, start - SHARD_SEEK_MARGIN) if start else 0, None)
+    cmd = f"{input_args} -i {shlex.quote(video_path)}".strip()
+    cmd += " -map 0:v:0 -vf showinfo@frames_w0 -vsync 0"
+    if count:
+        cmd += f" -frames:v {count}"
+    return f"{cmd} -start_number {start_number} -y {shlex.quote(pattern)}"
+
+
+def collect_shard_frames(log, start, count, pattern, start_number):
+    """解析一个分片的 showinfo，返回 [{"path", "time", "window"}]"""
+    offset = max(0.0, start - SHARD_SEEK_MARGIN) if start else 0.0
+    entries = sorted(parse_showinfo(log).get(0, []))
+    if count:
+        entries = entries[:count]
+    result = []
+    for i, (_, pts_time) in enumerate(entries):
+        path = pattern % (start_number + i)
+        if os.path.exists(path):
+            result.append({"path": path, "time": round(offset + pts_time, 3), "window": 0})
+    return result
@@ -1,15 +1,29 @@
 # http_routes.py
 from starlette.routing import Route
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import os
 
 import ffmpeg_mcp.cut_video as cut_video
+import ffmpeg_mcp.batch_jobs as batch_jobs
+import ffmpeg_mcp.frame_archive as frame_archive
+import ffmpeg_mcp.frame_dedupe as frame_dedupe
+import ffmpeg_mcp.frames as frames
+import ffmpeg_mcp.job_graph as job_graph
+import ffmpeg_mcp.packaging as packaging
+import ffmpeg_mcp.pipeline as pipeline
+import ffmpeg_mcp.proxies as proxies
+import ffmpeg_mcp.raw_frames as raw_frames
+import ffmpeg_mcp.sprites as sprites
+import ffmpeg_mcp.thumbnails as thumbnails
 import ffmpeg_mcp.utils as utils
 from ffmpeg_mcp.task_manager import task_manager
 import threading
 import base64 as b64
 import mimetypes
+from urllib.parse import quote
 
 
 # --- Utility functions ---
@@ -144,6 +158,32 @@ async def download_video(request: Request):
     return success(result)
 
 
+async def thumbnail(request: Request):
+    """
+    GET /api/thumbnail?path=&t=&w=&format=jpg
+    同步返回任意时间点的一张缩略图：磁盘缓存命中直接返回，否则关键帧 seek 后取一帧；
+    同一张缩略图的并发请求只运行一次 ffmpeg。
+    """
+    path = request.query_params.get("path")
+    if not path:
+        return error("path is required")
+    try:
+        t, width, ext = thumbnails.parse_request(request.query_params.get("t"), request.query_params.get("w", 0),
+                                                 request.query_params.get("format", "jpg"))
+    except ValueError as e:
+        return error(str(e))
+
+    local_path = await run_in_threadpool(utils.ensure_local_path, path)
+    if not os.path.exists(local_path):
+        return error(f"文件不存在: {path}", status_code=404)
+    try:
+        image_path = await run_in_threadpool(thumbnails.get_thumbnail, local_path, t, width, ext)
+    except ValueError as e:
+        return error(str(e))
+    return FileResponse(image_path, media_type=thumbnails.MEDIA_TYPES[ext],
+                        headers={"Cache-Control": "private, max-age=3600"})
+
+
 async def get_task_status(request: Request):
     """GET /api/get_task_status/{task_id}"""
     task_id = request.path_params["task_id"]
@@ -153,6 +193,53 @@ async def get_task_status(request: Request):
     return success(status)
 
 
+# 渐进式下载：文件暂无新数据时的轮询间隔，以及每次读取的块大小
+TAIL_POLL_SECONDS = 0.5
+TAIL_CHUNK_BYTES = 1024 * 1024
+
+
+async def stream_output(request: Request):
+    """
+    GET /api/stream_output/{task_id}
+    以 chunked 方式输出任务的结果文件。任务使用 movflags=fragmented 时边编码边发送（跟随文件增长），
+    直到任务结束；其它任务等编码完成后再发送整个文件。
+    """
+    task_id = request.path_params["task_id"]
+    task = task_manager.get_task_status(task_id)
+    if not task:
+        return error(f"Task ID {task_id} not found", status_code=404)
+    if task["status"] == "FAILED":
+        return error(f"Task failed: {task.get('error')}", status_code=409)
+    progressive = (task.get("params") or {}).get("movflags") == "fragmented"
+
+    async def tail():
+        handle = None
+        try:
+            while True:
+                task = task_manager.get_task_status(task_id)
+                finished = task["status"] in ("COMPLETED", "FAILED")
+                path = (task.get("result") or {}).get("path")
+                # 忽略同名的旧文件：只打开本次任务开始后写入的输出
+                if (handle is None and path and (progressive or finished) and os.path.exists(path)
+                        and os.path.getmtime(path) >= task["start_time"]):
+                    handle = open(path, "rb")
+                if handle is not None:
+                    chunk = await run_in_threadpool(handle.read, TAIL_CHUNK_BYTES)
+                    if chunk:
+                        yield chunk
+                        continue
+                if finished:
+                    break
+                await asyncio.sleep(TAIL_POLL_SECONDS)
+        finally:
+            if handle is not None:
+                handle.close()
+
+    path = (task.get("result") or {}).get("path") or ""
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return StreamingResponse(tail(), media_type=media_type)
+
+
 async def list_output_videos(request: Request):
     """GET /api/list_output_videos"""
     VIDEO_EXTS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.ts'}
@@ -233,17 +320,21 @@ async def clip_video(request: Request):
     duration = body.get("duration")
     output_path = body.get("output_path")
     time_out = body.get("time_out", 300)
+    preview = body.get("preview", False)
 
     task_id = task_manager.create_task("clip_video", body)
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_path = utils.ensure_local_path(video_path)
+            local_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
             result = cut_video.clip_video_ffmpeg(local_path, start=start, end=end, duration=duration, output_path=output_path, time_out=time_out)
             if isinstance(result, (set, list, tuple)) and len(result) >= 3:
-                status, log, path = list(result)
-                task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": _get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -253,6 +344,36 @@ async def clip_video(request: Request):
     return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
 
 
+async def clip_video_batch(request: Request):
+    """POST /api/clip_video_batch"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    ranges = body.get("ranges")
+    if not video_path:
+        return error("video_path is required")
+    if not ranges or not isinstance(ranges, list):
+        return error("ranges is required and must be a list")
+
+    time_out = body.get("time_out", 600)
+    preview = body.get("preview", False)
+
+    task_id = task_manager.create_task("clip_video_batch", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, clips = cut_video.clip_video_batch(local_path, ranges, time_out=time_out)
+            for clip in clips:
+                clip["url"] = _get_file_url(clip["path"]) if clip["status"] == 0 else ""
+            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "clips": clips})
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
 async def concat_videos(request: Request):
     """POST /api/concat_videos"""
     body = await request.json()
@@ -262,17 +383,28 @@ async def concat_videos(request: Request):
 
     output_path = body.get("output_path")
     fast = body.get("fast", True)
+    chunks = body.get("chunks", 0)
+    movflags = body.get("movflags")
+    if movflags and movflags not in cut_video.MOVFLAGS:
+        return error(f"movflags must be one of {list(cut_video.MOVFLAGS)}")
+    preview = body.get("preview", False)
 
     task_id = task_manager.create_task("concat_videos", body)
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_files = [utils.ensure_local_path(f) for f in input_files]
-            result = cut_video.concat_videos(local_files, output_path, fast)
+            local_files = [proxies.resolve(utils.ensure_local_path(f), preview)[0] for f in input_files]
+            # 输出路径提前公布，/api/stream_output 可以在编码过程中开始读取
+            target = output_path or utils.get_default_output_path(local_files[0], "_merged")
+            task_manager.update_task(task_id, "RUNNING", result={"path": target, "url": _get_file_url(target)})
+            result = cut_video.concat_videos(local_files, target, fast, chunks, movflags)
             if isinstance(result, (tuple, list)) and len(result) >= 3:
                 code, log, path = result[:3]
-                task_manager.update_task(task_id, "COMPLETED", result={"status": code, "log": log, "path": path, "url": _get_file_url(path)})
+                res = {"status": code, "log": log, "path": path, "url": _get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -295,18 +427,26 @@ async def concat_videos_with_mp3(request: Request):
     output_path = body.get("output_path")
     mute_video_audio = body.get("mute_video_audio", True)
     order = body.get("order", "sequence")
+    preview = body.get("preview", False)
 
     task_id = task_manager.create_task("concat_videos_with_mp3", body)
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_videos = [utils.ensure_local_path(v) for v in video_paths]
+            local_videos = [proxies.resolve(utils.ensure_local_path(v), preview)[0] for v in video_paths]
             local_audio = utils.ensure_local_path(audio_path)
-            result = cut_video.concat_videos_with_mp3(local_videos, local_audio, output_path, mute_video_audio, order)
+            # 默认输出名按音频文件生成，预览时单独加上 _preview
+            target = output_path
+            if preview and not target:
+                target = utils.get_default_output_path(local_audio, "_with_mp3_preview", force_ext=".mp4")
+            result = cut_video.concat_videos_with_mp3(local_videos, local_audio, target, mute_video_audio, order)
             if isinstance(result, (tuple, list)) and len(result) >= 3:
-                status, log, path = result[0], result[1], result[2]
-                task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": _get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -329,18 +469,26 @@ async def concat_videos_with_mp3_video_first(request: Request):
     output_path = body.get("output_path")
     mute_video_audio = body.get("mute_video_audio", True)
     order = body.get("order", "sequence")
+    preview = body.get("preview", False)
 
     task_id = task_manager.create_task("concat_videos_with_mp3_video_first", body)
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_videos = [utils.ensure_local_path(v) for v in video_paths]
+            local_videos = [proxies.resolve(utils.ensure_local_path(v), preview)[0] for v in video_paths]
             local_audio = utils.ensure_local_path(audio_path)
-            result = cut_video.concat_videos_with_mp3_video_first(local_videos, local_audio, output_path, mute_video_audio, order)
+            # 默认输出名按音频文件生成，预览时单独加上 _preview
+            target = output_path
+            if preview and not target:
+                target = utils.get_default_output_path(local_audio, "_video_first_preview", force_ext=".mp4")
+            result = cut_video.concat_videos_with_mp3_video_first(local_videos, local_audio, target, mute_video_audio, order)
             if isinstance(result, (tuple, list)) and len(result) >= 3:
-                status, log, path = result[0], result[1], result[2]
-                task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": _get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -364,18 +512,24 @@ async def overlay_video(request: Request):
     position = body.get("position", 1)
     dx = body.get("dx", 0)
     dy = body.get("dy", 0)
+    chunks = body.get("chunks", 0)
+    preview = body.get("preview", False)
 
     task_id = task_manager.create_task("overlay_video", body)
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_bg = utils.ensure_local_path(background)
-            local_ov = utils.ensure_local_path(overlay)
-            result = cut_video.overlay_video(local_bg, local_ov, output_path, position, dx, dy)
+            local_bg, local_ov, ratio = proxies.resolve_overlay(
+                utils.ensure_local_path(background), utils.ensure_local_path(overlay), preview)
+            result = cut_video.overlay_video(local_bg, local_ov, output_path, position,
+                                             proxies.scale_pixels(dx, ratio), proxies.scale_pixels(dy, ratio), chunks)
             if isinstance(result, (set, list, tuple)) and len(result) >= 3:
-                status, log, path = list(result)
-                task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": _get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+                if len(result) > 3:
+                    res["chunked"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -391,22 +545,214 @@ async def scale_video(request: Request):
     video_path = body.get("video_path")
     width = body.get("width")
     height = body.get("height")
+    renditions = body.get("renditions")
     if not video_path:
         return error("video_path is required")
-    if width is None:
+    if width is None and not renditions:
         return error("width is required")
-    if height is None:
+    if height is None and not renditions:
         return error("height is required")
 
     output_path = body.get("output_path")
+    chunks = body.get("chunks", 0)
+    keyframe_interval = body.get("keyframe_interval", 2)
+    package = body.get("package")
+    preview = body.get("preview", False)
+    if preview and renditions:
+        return error("preview 不支持 renditions")
     task_id = task_manager.create_task("scale_video", body)
 
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_path, ratio = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            result = cut_video.scale_video(local_path, proxies.scale_pixels(width, ratio, even=True),
+                                           proxies.scale_pixels(height, ratio, even=True), output_path, chunks,
+                                           renditions, keyframe_interval, package)
+            status, log, path = result[:3]
+            res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+            if len(result) > 3 and renditions and package:
+                res["package"] = result[3]
+            elif len(result) > 3 and renditions:
+                res["renditions"] = [dict(r, url=_get_file_url(r["path"])) for r in result[3]]
+            elif len(result) > 3:
+                res["chunked"] = result[3]
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def run_pipeline(request: Request):
+    """POST /api/run_pipeline"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    operations = body.get("operations")
+    if not video_path:
+        return error("video_path is required")
+    if not operations or not isinstance(operations, list):
+        return error("operations is required and must be a list")
+    unknown = [op.get("op") for op in operations if not isinstance(op, dict) or op.get("op") not in pipeline.OPERATIONS]
+    if unknown:
+        return error(f"unsupported operations: {unknown}, expected one of {list(pipeline.OPERATIONS)}")
+
+    output_path = body.get("output_path")
+    encoding = body.get("encoding")
+    movflags = body.get("movflags")
+    task_id = task_manager.create_task("run_pipeline", body)
+
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
             local_path = utils.ensure_local_path(video_path)
-            status, log, path = cut_video.scale_video(local_path, width, height, output_path)
-            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": _get_file_url(path)})
+            target = output_path or utils.get_default_output_path(local_path, "_pipeline")
+            task_manager.update_task(task_id, "RUNNING", result={"path": target, "url": _get_file_url(target)})
+            result = cut_video.run_pipeline(local_path, operations, target, encoding, movflags)
+            status, log, path = result[:3]
+            res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+            if len(result) > 3:
+                res["plan"] = result[3]
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def run_job_graph(request: Request):
+    """POST /api/run_job_graph"""
+    body = await request.json()
+    steps = body.get("steps")
+    try:
+        job_graph.parse_graph(steps)
+    except ValueError as e:
+        return error(str(e))
+
+    task_id = task_manager.create_task("run_job_graph", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            code, nodes = job_graph.run_graph(
+                steps, on_update=lambda nodes: task_manager.update_task(task_id, "RUNNING", result={"nodes": nodes}))
+            for node in nodes.values():
+                result = node.get("result")
+                if result and not result.get("scratch"):
+                    result["url"] = _get_file_url(result.get("path"))
+            task_manager.update_task(task_id, "COMPLETED", result={"status": code, "nodes": nodes})
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def run_batch(request: Request):
+    """POST /api/run_batch"""
+    body = await request.json()
+    operation = body.get("operation")
+    params = body.get("params")
+    files = body.get("files")
+    pattern = body.get("pattern")
+    output_dir = body.get("output_dir")
+    try:
+        batch_jobs.validate(operation, files, pattern)
+    except ValueError as e:
+        return error(str(e))
+
+    task_id = task_manager.create_task("run_batch", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            job = batch_jobs.run_batch(
+                task_id, operation, params, files, pattern, output_dir,
+                on_progress=lambda summary: task_manager.update_task(task_id, "RUNNING", result=summary))
+            summary = job.summary()
+            summary["status"] = 0 if summary["failed"] == 0 else -1
+            task_manager.update_task(task_id, "COMPLETED", result=summary)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def get_batch_results(request: Request):
+    """GET /api/batch_results/{task_id}?offset=&limit=&status="""
+    task_id = request.path_params["task_id"]
+    job = batch_jobs.get_batch(task_id)
+    if job is None:
+        return error(f"Batch {task_id} not found", status_code=404)
+    try:
+        offset = int(request.query_params.get("offset", 0))
+        limit = min(int(request.query_params.get("limit", 100)), 1000)
+    except ValueError:
+        return error("offset and limit must be integers")
+    status = request.query_params.get("status")
+    return success({"summary": job.summary(), **job.page(offset, limit, status)})
+
+
+async def build_proxies(request: Request):
+    """POST /api/build_proxies — 后台生成预览用的低码率代理文件"""
+    body = await request.json()
+    files = body.get("files")
+    pattern = body.get("pattern")
+    if not files and not pattern:
+        pattern = "**/*"
+    try:
+        batch_jobs.validate_inputs(files, pattern)
+    except ValueError as e:
+        return error(str(e))
+
+    task_id = task_manager.create_task("build_proxies", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            results = proxies.build_all(files, pattern)
+            status = 0 if all("proxy" in r for r in results) else -1
+            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "proxies": results})
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def package_video(request: Request):
+    """POST /api/package_video"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    if not video_path:
+        return error("video_path is required")
+    fmt = body.get("format", "hls")
+    if fmt not in packaging.PACKAGE_FORMATS:
+        return error(f"format must be one of {list(packaging.PACKAGE_FORMATS)}")
+
+    renditions = body.get("renditions")
+    output_dir = body.get("output_dir")
+    segment_seconds = body.get("segment_seconds", packaging.SEGMENT_SECONDS)
+    segment_type = body.get("segment_type", "fmp4")
+    task_id = task_manager.create_task("package_video", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_path = utils.ensure_local_path(video_path)
+            target_dir = output_dir or packaging.default_output_dir(local_path, fmt)
+            manifest = packaging.manifest_path(target_dir, fmt)
+            # 清单路径提前确定，编码过程中客户端即可开始拉流
+            task_manager.update_task(task_id, "RUNNING", result={"path": manifest, "url": _get_file_url(manifest)})
+            result = cut_video.package_video(local_path, fmt, renditions, target_dir, segment_seconds, segment_type)
+            status, log, path = result[:3]
+            res = {"status": status, "log": log, "path": path, "url": _get_file_url(path)}
+            if len(result) > 3:
+                res["package"] = result[3]
+            task_manager.update_task(task_id, "COMPLETED", result=res)
         except Exception as e:
             task_manager.update_task(task_id, "FAILED", error=str(e))
 
@@ -425,15 +771,187 @@ async def extract_frames_from_video(request: Request):
     output_folder = body.get("output_folder")
     format_val = body.get("format", 0)
     total_frames = body.get("total_frames", 0)
+    start = body.get("start")
+    end = body.get("end")
+    duration = body.get("duration")
+    windows = body.get("windows")
+    shards = body.get("shards", 0)
+    keyframes_only = body.get("keyframes_only", False)
+    min_interval = body.get("min_interval", 0)
+    width = body.get("width", 0)
+    quality = body.get("quality")
+    archive = body.get("archive")
+    dedupe = body.get("dedupe")
+    dedupe_threshold = body.get("dedupe_threshold")
+    preview = body.get("preview", False)
+    try:
+        frames.parse_windows(windows, start, end, duration)
+        frames.quality_args(frames.image_ext(format_val), quality)
+        if archive is not None and archive not in frame_archive.ARCHIVE_FORMATS:
+            raise ValueError(f"archive 必须是 {list(frame_archive.ARCHIVE_FORMATS)} 之一")
+        frame_dedupe.validate(dedupe)
+    except ValueError as e:
+        return error(str(e))
 
     task_id = task_manager.create_task("extract_frames", body)
 
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_path, ratio = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, path, extracted = cut_video.extract_frames_from_video(
+                local_path, fps, output_folder, format_val, total_frames, start, end, duration, windows, shards,
+                keyframes_only, min_interval, proxies.scale_pixels(width, ratio, even=True), quality, archive,
+                dedupe, dedupe_threshold)
+            res = {"status": status, "log": log, "path": path,
+                   "url": _get_file_url(path if archive else os.path.dirname(path)),
+                   "frames": extracted}
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def extract_frames_archive(request: Request):
+    """POST /api/extract_frames_archive — 抽帧结果以 zip / tar 流直接返回，边抽边传"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    if not video_path:
+        return error("video_path is required")
+    archive = body.get("archive", "zip")
+    format_val = body.get("format", 1)
+    quality = body.get("quality")
+    if archive not in frame_archive.ARCHIVE_FORMATS:
+        return error(f"archive 必须是 {list(frame_archive.ARCHIVE_FORMATS)} 之一")
+    try:
+        windows = frames.parse_windows(body.get("windows"), body.get("start"), body.get("end"), body.get("duration"))
+        frames.quality_args(frames.image_ext(format_val), quality)
+        frame_dedupe.validate(body.get("dedupe"))
+    except ValueError as e:
+        return error(str(e))
+
+    local_path = await run_in_threadpool(utils.ensure_local_path, video_path)
+    if not os.path.exists(local_path):
+        return error(f"文件不存在: {video_path}", status_code=404)
+    source_path = local_path
+    try:
+        local_path, ratio = await run_in_threadpool(proxies.resolve, local_path, body.get("preview", False))
+    except (ValueError, RuntimeError) as e:
+        return error(str(e))
+    content = frame_archive.iter_archive(
+        local_path, archive, windows, format_val, body.get("fps", 0), body.get("total_frames", 0),
+        body.get("keyframes_only", False), body.get("min_interval", 0),
+        proxies.scale_pixels(body.get("width", 0), ratio, even=True), quality,
+        dedupe=body.get("dedupe"), dedupe_threshold=body.get("dedupe_threshold"))
+    filename = f"{os.path.splitext(os.path.basename(source_path))[0]}_frames.{archive}"
+    return StreamingResponse(content, media_type=frame_archive.MEDIA_TYPES[archive],
+                             headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+
+async def grab_frames(request: Request):
+    """POST /api/grab_frames"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    if not video_path:
+        return error("video_path is required")
+    timestamps = body.get("timestamps")
+    try:
+        frames.parse_timestamps(timestamps)
+    except ValueError as e:
+        return error(str(e))
+
+    keyframe_only = body.get("keyframe_only", False)
+    format_val = body.get("format", 1)
+    output_folder = body.get("output_folder")
+    inline = body.get("inline", False)
+    preview = body.get("preview", False)
+
+    task_id = task_manager.create_task("grab_frames", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, folder, grabs = cut_video.grab_frames(
+                local_path, timestamps, keyframe_only, output_folder, format_val, inline)
+            for grab in grabs:
+                if grab.get("path"):
+                    grab["url"] = _get_file_url(grab["path"])
+            res = {"status": status, "log": log, "path": folder, "frames": grabs}
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def generate_sprite_sheet(request: Request):
+    """POST /api/generate_sprite_sheet"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    if not video_path:
+        return error("video_path is required")
+    interval = body.get("interval", 10)
+    width = body.get("width", 160)
+    columns = body.get("columns", 10)
+    rows = body.get("rows", 10)
+    format_val = body.get("format", 1)
+    keyframes_only = body.get("keyframes_only", False)
+    index_format = body.get("index_format", "vtt")
+    output_folder = body.get("output_folder")
+    preview = body.get("preview", False)
+    try:
+        sprites.validate(interval, width, columns, rows, index_format)
+    except (TypeError, ValueError) as e:
+        return error(str(e))
+
+    task_id = task_manager.create_task("generate_sprite_sheet", body)
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, index_path, sheets = cut_video.generate_sprite_sheet(
+                local_path, interval, width, columns, rows, format_val, keyframes_only, index_format, output_folder)
+            res = {"status": status, "log": log, "path": index_path,
+                   "url": _get_file_url(index_path) if index_path else "",
+                   "sheets": [{"path": p, "url": _get_file_url(p)} for p in sheets]}
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
+
+
+async def extract_raw_frames(request: Request):
+    """POST /api/extract_raw_frames — 原始画面写入共享内存（仅供同一台机器上的进程读取）"""
+    body = await request.json()
+    video_path = body.get("video_path")
+    if not video_path:
+        return error("video_path is required")
+    pix_fmt = body.get("pix_fmt", "rgb24")
+    if pix_fmt not in raw_frames.PIX_FMTS:
+        return error(f"pix_fmt 必须是 {list(raw_frames.PIX_FMTS)} 之一")
+    max_frames = body.get("max_frames", 300)
+    width = body.get("width", 0)
+    height = body.get("height", 0)
+    fps = body.get("fps", 0)
+    start = body.get("start")
+    end = body.get("end")
+
+    task_id = task_manager.create_task("extract_raw_frames", body)
+
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
             local_path = utils.ensure_local_path(video_path)
-            result = cut_video.extract_frames_from_video(local_path, fps, output_folder, format_val, total_frames)
-            task_manager.update_task(task_id, "COMPLETED", result=result)
+            status, log, handle = raw_frames.extract_to_shared_memory(
+                local_path, max_frames, width, height, pix_fmt, fps, start, end)
+            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "handle": handle})
         except Exception as e:
             task_manager.update_task(task_id, "FAILED", error=str(e))
 
@@ -441,6 +959,17 @@ async def extract_frames_from_video(request: Request):
     return success({"task_id": task_id, "status": "PENDING"}, "Task submitted successfully")
 
 
+async def release_raw_frames(request: Request):
+    """POST /api/release_raw_frames"""
+    body = await request.json()
+    name = body.get("name")
+    if not name:
+        return error("name is required")
+    if not raw_frames.release(name):
+        return error(f"Shared memory {name} not found", status_code=404)
+    return success({"released": True})
+
+
 # --- Health check ---
 
 async def health(request: Request):
@@ -458,17 +987,31 @@ routes = [
     Route("/api/get_video_info", get_video_info, methods=["GET"]),
     Route("/api/get_audio_info", get_audio_info, methods=["GET"]),
     Route("/api/download_video", download_video, methods=["GET"]),
+    Route("/api/thumbnail", thumbnail, methods=["GET"]),
     Route("/api/get_task_status/{task_id}", get_task_status, methods=["GET"]),
+    Route("/api/stream_output/{task_id}", stream_output, methods=["GET"]),
     Route("/api/list_output_videos", list_output_videos, methods=["GET"]),
     Route("/api/list_videos_folder", list_videos_folder, methods=["GET"]),
     # Sync POST
     Route("/api/delete_videos", delete_videos, methods=["POST"]),
     # Async POST
     Route("/api/clip_video", clip_video, methods=["POST"]),
+    Route("/api/clip_video_batch", clip_video_batch, methods=["POST"]),
     Route("/api/concat_videos", concat_videos, methods=["POST"]),
     Route("/api/concat_videos_with_mp3", concat_videos_with_mp3, methods=["POST"]),
     Route("/api/concat_videos_with_mp3_video_first", concat_videos_with_mp3_video_first, methods=["POST"]),
     Route("/api/overlay_video", overlay_video, methods=["POST"]),
     Route("/api/scale_video", scale_video, methods=["POST"]),
+    Route("/api/run_pipeline", run_pipeline, methods=["POST"]),
+    Route("/api/run_job_graph", run_job_graph, methods=["POST"]),
+    Route("/api/run_batch", run_batch, methods=["POST"]),
+    Route("/api/batch_results/{task_id}", get_batch_results, methods=["GET"]),
+    Route("/api/package_video", package_video, methods=["POST"]),
+    Route("/api/build_proxies", build_proxies, methods=["POST"]),
     Route("/api/extract_frames_from_video", extract_frames_from_video, methods=["POST"]),
+    Route("/api/extract_frames_archive", extract_frames_archive, methods=["POST"]),
+    Route("/api/grab_frames", grab_frames, methods=["POST"]),
+    Route("/api/generate_sprite_sheet", generate_sprite_sheet, methods=["POST"]),
+    Route("/api/extract_raw_frames", extract_raw_frames, methods=["POST"]),
+    Route("/api/release_raw_frames", release_raw_frames, methods=["POST"]),
 ]
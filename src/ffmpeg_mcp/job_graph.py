@@ -0,0 +1,295 @@
+"""
+作业图（DAG）
+
+一次提交多个步骤，步骤之间通过 depends_on 或参数引用声明依赖：
+    [{"id": "clips", "op": "clip_video_batch", "params": {"video_path": "/videos/a.mp4", "ranges": [[0, 3], [10, 13]]}},
+     {"id": "merged", "op": "concat_videos", "params": {"input_files": "${clips.paths}", "fast": "auto"}}]
+
+参数中的 "${id}" 引用步骤的输出路径，"${id.字段}" 引用其结果中的字段（如 paths、frames）。
+互不依赖的分支并行执行；只被其它步骤消费的中间结果写到 scratch 目录（默认缓存目录下的 scratch，
+可用 MCP_SCRATCH_DIR=/dev/shm 改用 tmpfs），
+整个作业结束后自动删除，只有终点步骤（或标记 "output": true 的步骤）写到 /output。
+"""
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ffmpeg_mcp.cut_video as cut_video
+import ffmpeg_mcp.utils as utils
+
+# 同时执行的步骤数
+JOB_GRAPH_WORKERS = int(os.getenv("MCP_JOB_GRAPH_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+
+REFERENCE = re.compile(r"^\$\{([A-Za-z0-9_\-]+)(?:\.([A-Za-z0-9_]+))?\}$")
+
+
+def scratch_root() -> str:
+    """
+    中间结果目录：MCP_SCRATCH_DIR，默认缓存目录下的 scratch（磁盘）。
+    tmpfs（如 /dev/shm）需要显式配置：Docker 默认只有 64MB，且占用容器的内存限额。
+    """
+    root = os.getenv("MCP_SCRATCH_DIR")
+    if root:
+        os.makedirs(root, exist_ok=True)
+        return root
+    return utils.get_cache_dir("scratch")
+
+
+# --- 可用的步骤操作 ---
+# 每个操作接收 (params, output)，output 为 scratch 中的输出位置（终点步骤为 None，使用 params 中的 output_path），
+# 返回统一结构 {"status", "log", "path", ...}
+
+def _target(output, p, key="output_path", ext=".mp4"):
+    """中间步骤写到 scratch，终点步骤使用调用方指定的输出路径（为空时由各工具生成默认路径）"""
+    return output + ext if output else p.get(key)
+
+
+def _tuple_result(result, **extra):
+    status, log, path = list(result)[:3]
+    res = {"status": status, "log": log, "path": path}
+    if len(result) > 3:
+        res["plan"] = result[3]
+    res.update(extra)
+    return res
+
+
+def _op_clip_video(p, output):
+    return _tuple_result(cut_video.clip_video_ffmpeg(
+        p["video_path"], p.get("start"), p.get("end"), p.get("duration"),
+        _target(output, p)))
+
+
+def _with_output_path(item, path):
+    if isinstance(item, dict):
+        return dict(item, output_path=path)
+    start, end = (list(item) + [None, None])[:2]
+    return {"start": start, "end": end, "output_path": path}
+
+
+def _op_clip_video_batch(p, output):
+    ranges = p["ranges"]
+    if output:
+        os.makedirs(output, exist_ok=True)
+        ranges = [_with_output_path(r, os.path.join(output, f"clip_{i:04d}.mp4")) for i, r in enumerate(ranges)]
+    code, log, clips = cut_video.clip_video_batch(p["video_path"], ranges)
+    paths = [c["path"] for c in clips if c.get("status") == 0]
+    return {"status": code, "log": log, "path": paths[0] if paths else "", "paths": paths, "clips": clips}
+
+
+def _op_scale_video(p, output):
+    return _tuple_result(cut_video.scale_video(
+        p["video_path"], p.get("width", -2), p.get("height", -2),
+        _target(output, p), p.get("chunks", 0)))
+
+
+def _op_overlay_video(p, output):
+    return _tuple_result(cut_video.overlay_video(
+        p["background_video"], p["overlay_video"], _target(output, p),
+        p.get("position", 1), p.get("dx", 0), p.get("dy", 0)))
+
+
+def _op_concat_videos(p, output):
+    return _tuple_result(cut_video.concat_videos(
+        p["input_files"], _target(output, p), p.get("fast", True)))
+
+
+def _op_run_pipeline(p, output):
+    return _tuple_result(cut_video.run_pipeline(
+        p["video_path"], p["operations"], _target(output, p), p.get("encoding")))
+
+
+def _op_extract_frames(p, output):
+    folder = _target(output, p, "output_folder", "")
+    status, log, pattern, frames = cut_video.extract_frames_from_video(
+        p["video_path"], p.get("fps", 0), folder or None, p.get("format", 0), p.get("total_frames", 0),
+        p.get("start"), p.get("end"), p.get("duration"), p.get("windows"), p.get("shards", 0),
+        p.get("keyframes_only", False), p.get("min_interval", 0), p.get("width", 0), p.get("quality"),
+        p.get("archive"), p.get("dedupe"), p.get("dedupe_threshold"))
+    if p.get("archive"):
+        # 归档模式：path 为归档文件，frames 为归档内的文件名
+        return {"status": status, "log": log, "path": pattern,
+                "frames": [f["name"] for f in frames], "timestamps": [f["time"] for f in frames]}
+    return {"status": status, "log": log, "path": os.path.dirname(pattern) if pattern else folder,
+            "frames": [f["path"] for f in frames], "timestamps": [f["time"] for f in frames]}
+
+
+def _op_package_video(p, output):
+    return _tuple_result(cut_video.package_video(
+        p["video_path"], p.get("format", "hls"), p.get("renditions"), _target(output, p, "output_dir", ""),
+        p.get("segment_seconds", 4)))
+
+
+OPERATIONS = {
+    "clip_video": _op_clip_video,
+    "clip_video_batch": _op_clip_video_batch,
+    "scale_video": _op_scale_video,
+    "overlay_video": _op_overlay_video,
+    "concat_videos": _op_concat_videos,
+    "run_pipeline": _op_run_pipeline,
+    "extract_frames_from_video": _op_extract_frames,
+    "package_video": _op_package_video,
+}
+
+
+# --- 解析与校验 ---
+
+def _references(value):
+    """参数中引用到的步骤 id"""
+    if isinstance(value, str):
+        m = REFERENCE.match(value)
+        return {m.group(1)} if m else set()
+    if isinstance(value, list):
+        return set().union(*[_references(v) for v in value]) if value else set()
+    if isinstance(value, dict):
+        return set().union(*[_references(v) for v in value.values()]) if value else set()
+    return set()
+
+
+def parse_graph(steps):
+    """
+    校验步骤列表并补全依赖关系，返回 {id: step}（保持提交顺序）。
+    id 重复、操作不存在、依赖不存在或存在环时抛出 ValueError。
+    """
+    if not steps or not isinstance(steps, list):
+        raise ValueError("steps 不能为空")
+    graph = {}
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ValueError(f"第 {i} 个步骤必须是对象")
+        step_id = str(step.get("id") or f"step{i}")
+        if step_id in graph:
+            raise ValueError(f"步骤 id 重复: {step_id}")
+        if step.get("op") not in OPERATIONS:
+            raise ValueError(f"步骤 {step_id} 的操作 {step.get('op')} 不支持，可选 {list(OPERATIONS)}")
+        params = step.get("params") or {}
+        depends = set(step.get("depends_on") or []) | _references(params)
+        graph[step_id] = {"id": step_id, "op": step["op"], "params": params,
+                          "depends_on": sorted(depends), "output": bool(step.get("output"))}
+    for step in graph.values():
+        missing = [d for d in step["depends_on"] if d not in graph]
+        if missing:
+            raise ValueError(f"步骤 {step['id']} 依赖的步骤不存在: {missing}")
+
+    # 拓扑排序检查环
+    indegree = {k: len(v["depends_on"]) for k, v in graph.items()}
+    ready = [k for k, d in indegree.items() if d == 0]
+    visited = 0
+    while ready:
+        node = ready.pop()
+        visited += 1
+        for k, v in graph.items():
+            if node in v["depends_on"]:
+                indegree[k] -= 1
+                if indegree[k] == 0:
+                    ready.append(k)
+    if visited != len(graph):
+        raise ValueError("步骤之间存在循环依赖")
+    return graph
+
+
+def _resolve(value, results):
+    if isinstance(value, str):
+        m = REFERENCE.match(value)
+        if not m:
+            return value
+        res = results[m.group(1)]
+        if m.group(2):
+            if m.group(2) not in res:
+                raise ValueError(f"步骤 {m.group(1)} 的结果中没有字段 {m.group(2)}")
+            return res[m.group(2)]
+        return res.get("path") or res.get("paths")
+    if isinstance(value, list):
+        resolved = []
+        for v in value:
+            r = _resolve(v, results)
+            # 列表中的引用展开为多个元素，如 ["${a.paths}", "/videos/outro.mp4"]
+            if isinstance(v, str) and REFERENCE.match(v) and isinstance(r, list):
+                resolved.extend(r)
+            else:
+                resolved.append(r)
+        return resolved
+    if isinstance(value, dict):
+        return {k: _resolve(v, results) for k, v in value.items()}
+    return value
+
+
+# --- 执行 ---
+
+def _localize(params):
+    """远程输入先下载到本地（与各工具的 handler 一致）"""
+    params = dict(params)
+    for key in ("video_path", "background_video", "overlay_video"):
+        if isinstance(params.get(key), str):
+            params[key] = utils.ensure_local_path(params[key])
+    if isinstance(params.get("input_files"), list):
+        params["input_files"] = [utils.ensure_local_path(f) for f in params["input_files"]]
+    return params
+
+
+def run_graph(steps, on_update=None, workers: int = None):
+    """
+    执行作业图。
+
+    参数:
+        steps (list): 步骤列表
+        on_update (callable): 节点状态变化时回调 on_update(nodes)，用于刷新任务状态
+    返回:
+        tuple: (status_code, nodes)，nodes 为每个步骤的 {op, status, depends_on, started, finished, result}
+    """
+    graph = parse_graph(steps)
+    dependents = {k: [s for s, v in graph.items() if k in v["depends_on"]] for k in graph}
+    nodes = {k: {"op": v["op"], "status": "PENDING", "depends_on": v["depends_on"]} for k, v in graph.items()}
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="ffmpeg_mcp_dag_", dir=scratch_root())
+
+    def notify():
+        if on_update:
+            on_update({k: dict(v) for k, v in nodes.items()})
+
+    def execute(step_id):
+        step = graph[step_id]
+        intermediate = bool(dependents[step_id]) and not step["output"]
+        output = os.path.join(scratch, step_id) if intermediate else None
+        try:
+            params = _resolve(step["params"], results)
+            params = _localize(params)
+            res = OPERATIONS[step["op"]](params, output)
+        except Exception as e:
+            res = {"status": -1, "log": str(e), "path": ""}
+        res["scratch"] = intermediate
+        return res
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or JOB_GRAPH_WORKERS) as pool:
+            running = {}
+            while True:
+                for step_id, node in nodes.items():
+                    if node["status"] != "PENDING":
+                        continue
+                    states = [nodes[d]["status"] for d in node["depends_on"]]
+                    if any(s in ("FAILED", "SKIPPED") for s in states):
+                        node["status"] = "SKIPPED"
+                    elif all(s == "COMPLETED" for s in states):
+                        node["status"] = "RUNNING"
+                        node["started"] = time.time()
+                        running[pool.submit(execute, step_id)] = step_id
+                notify()
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = running.pop(future)
+                    res = future.result()
+                    results[step_id] = res
+                    node = nodes[step_id]
+                    node["status"] = "COMPLETED" if res.get("status") == 0 else "FAILED"
+                    node["finished"] = time.time()
+                    node["result"] = res
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    code = 0 if all(n["status"] == "COMPLETED" for n in nodes.values()) else -1
+    return code, nodes
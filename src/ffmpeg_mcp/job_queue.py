@@ -0,0 +1,170 @@
+"""
+分片编码任务队列
+
+基于 SQLite 文件的共享队列：协调者（MCP 服务）把分片的 ffmpeg 命令写入队列，
+各节点上的 worker（ffmpeg-mcp-worker）领取执行并把结果写到共享存储。
+worker 定期上报心跳，协调者发现心跳超时的分片会重新放回队列交给其它 worker。
+每次领取都写到独立的输出文件（chunk_0001.attempt2.mp4），被判定超时但仍在运行的慢 worker
+不会覆盖重新分配后的结果；协调者只使用 complete() 接受的那一次输出。
+
+队列使用 SQLite 默认的回滚日志（不使用 WAL：WAL 依赖同一台主机上的共享内存，不能用于网络文件系统）。
+多台主机共享队列文件时，所在的文件系统必须正确支持 POSIX 文件锁（如启用了锁服务的 NFSv3 / NFSv4），
+否则并发领取会出现锁错误甚至损坏队列；只在单机上运行多个 worker 时放在本地磁盘即可。
+"""
+import os
+import shlex
+import sqlite3
+import time
+from contextlib import closing
+
+import ffmpeg_mcp.utils as utils
+
+# worker 超过这么多秒没有心跳即视为已死亡
+HEARTBEAT_TIMEOUT = float(os.getenv("MCP_WORKER_HEARTBEAT_TIMEOUT", "30"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    cmd TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    attempt_path TEXT,
+    code INTEGER,
+    log TEXT,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_status ON chunks (status, id);
+CREATE INDEX IF NOT EXISTS idx_chunks_job ON chunks (job_id, idx);
+"""
+
+
+def default_queue_path() -> str:
+    """队列文件路径：环境变量 MCP_QUEUE_DB，默认在共享目录下"""
+    return os.getenv("MCP_QUEUE_DB") or os.path.join(default_shared_dir(), "chunk_queue.sqlite3")
+
+
+def attempt_output_path(output_path: str, attempt: int) -> str:
+    """第 attempt 次领取时实际写出的文件，保留扩展名以便 ffmpeg 识别输出格式"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.attempt{attempt}{ext}"
+
+
+def default_shared_dir() -> str:
+    """worker 与协调者共享的分片存储目录：环境变量 MCP_SHARED_DIR，默认使用缓存目录"""
+    shared = os.getenv("MCP_SHARED_DIR") or utils.get_cache_dir("shared")
+    os.makedirs(shared, exist_ok=True)
+    return shared
+
+
+class ChunkQueue:
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or default_queue_path()
+        with closing(self._connect()) as conn:
+            # journal_mode 会持久化在文件中，旧版本创建的 WAL 队列在这里切回回滚日志
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.executescript(SCHEMA)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(chunks)")}
+            if "attempt_path" not in columns:
+                conn.execute("ALTER TABLE chunks ADD COLUMN attempt_path TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, job_id: str, commands):
+        """
+        写入一个作业的全部分片，commands 为 [(output_path, cmd), ...]。
+        cmd 中必须恰好出现一次 shlex.quote(output_path)，领取时替换为该次尝试的输出文件。
+        """
+        for output_path, cmd in commands:
+            if cmd.count(shlex.quote(output_path)) != 1:
+                raise ValueError(f"分片命令中必须恰好包含一次输出路径: {output_path}")
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO chunks (job_id, idx, cmd, output_path) VALUES (?, ?, ?, ?)",
+                [(job_id, i, cmd, output_path) for i, (output_path, cmd) in enumerate(commands)],
+            )
+            conn.execute("COMMIT")
+
+    def claim(self, worker_id: str):
+        """
+        领取一个待处理分片，没有时返回 None。
+        返回的 cmd 已改为写到本次尝试独立的 attempt_path。
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM chunks WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            attempt = row["attempts"] + 1
+            attempt_path = attempt_output_path(row["output_path"], attempt)
+            conn.execute(
+                "UPDATE chunks SET status = 'running', worker_id = ?, heartbeat = ?, started = ?, "
+                "attempts = ?, attempt_path = ? WHERE id = ?",
+                (worker_id, now, now, attempt, attempt_path, row["id"]),
+            )
+            conn.execute("COMMIT")
+            cmd = row["cmd"].replace(shlex.quote(row["output_path"]), shlex.quote(attempt_path))
+            return dict(row, status="running", worker_id=worker_id, attempts=attempt,
+                        attempt_path=attempt_path, cmd=cmd)
+
+    def heartbeat(self, chunk_id: int, worker_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE chunks SET heartbeat = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time(), chunk_id, worker_id),
+            )
+
+    def complete(self, chunk_id: int, worker_id: str, code: int, log: str):
+        """
+        上报分片结果；分片已被重新分配给其它 worker 时忽略本次上报。
+        被接受的结果对应记录中的 attempt_path。
+        """
+        status = "done" if code == 0 else "failed"
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE chunks SET status = ?, code = ?, log = ?, finished = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (status, code, log, time.time(), chunk_id, worker_id),
+            )
+
+    def requeue_stale(self, job_id: str = None, timeout: float = HEARTBEAT_TIMEOUT) -> int:
+        """把心跳超时（worker 已死亡）的分片放回队列，返回重新入队的数量"""
+        deadline = time.time() - timeout
+        sql = ("UPDATE chunks SET status = 'pending', worker_id = NULL "
+               "WHERE status = 'running' AND heartbeat < ?")
+        params = [deadline]
+        if job_id is not None:
+            sql += " AND job_id = ?"
+            params.append(job_id)
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).rowcount
+
+    def job_chunks(self, job_id: str):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM chunks WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+            return [dict(r) for r in rows]
+
+    def cancel_job(self, job_id: str) -> int:
+        """取消作业：尚未领取的分片不再分配给 worker，返回仍在执行中的分片数"""
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE chunks SET status = 'cancelled' WHERE job_id = ? AND status = 'pending'", (job_id,))
+            return conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE job_id = ? AND status = 'running'", (job_id,)
+            ).fetchone()[0]
+
+    def delete_job(self, job_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM chunks WHERE job_id = ?", (job_id,))
@@ -0,0 +1,255 @@
+"""
+关键帧索引
+
+每个文件只扫描一次视频流的包信息（不解码），记录所有关键帧的 pts 与字节偏移，
+按 (path, size, mtime) 缓存在内存中。剪辑、分片并行处理等需要知道 GOP 边界的
+功能可以通过 O(log n) 的二分查找直接得到前后关键帧，而不必再次调用 ffprobe。
+"""
+import bisect
+import shlex
+import threading
+from array import array
+from collections import OrderedDict
+from fractions import Fraction
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.utils as utils
+
+# 内存中最多缓存多少个文件的索引
+MAX_CACHED_INDEXES = 256
+
+
+class KeyframeIndex:
+    """
+    单个视频文件的关键帧索引。
+
+    pts 与 pos 均为 int64 数组（array('q')），pts 已减去流起始时间，
+    单位为流的 time_base，因此换算出的秒数可以直接作为输入侧 -ss 使用。
+    gop_frames[i] 为 pts 落在第 i 个关键帧与下一个关键帧之间的帧数（含关键帧本身）。
+    """
+
+    def __init__(self, time_base: Fraction, pts: array, pos: array, duration: float = 0.0,
+                 gop_frames: array = None):
+        self.time_base = time_base
+        self.pts = pts
+        self.pos = pos
+        self.duration = duration
+        self.gop_frames = gop_frames
+
+    def __len__(self):
+        return len(self.pts)
+
+    def _to_pts(self, seconds) -> int:
+        return int(round(utils.convert_to_seconds(seconds) / self.time_base))
+
+    def _to_seconds(self, pts: int) -> float:
+        return float(pts * self.time_base)
+
+    def times(self) -> list:
+        """所有关键帧的时间（秒）"""
+        return [self._to_seconds(p) for p in self.pts]
+
+    def prev_keyframe(self, t):
+        """返回 <= t 的最近关键帧时间（秒），不存在时返回 None"""
+        i = bisect.bisect_right(self.pts, self._to_pts(t)) - 1
+        if i < 0:
+            return None
+        return self._to_seconds(self.pts[i])
+
+    def next_keyframe(self, t):
+        """返回 >= t 的最近关键帧时间（秒），不存在时返回 None"""
+        i = bisect.bisect_left(self.pts, self._to_pts(t))
+        if i >= len(self.pts):
+            return None
+        return self._to_seconds(self.pts[i])
+
+    def nearest_keyframe(self, t):
+        """返回距离 t 最近的关键帧时间（秒），索引为空时返回 None"""
+        prev_kf = self.prev_keyframe(t)
+        next_kf = self.next_keyframe(t)
+        if prev_kf is None:
+            return next_kf
+        if next_kf is None:
+            return prev_kf
+        t = utils.convert_to_seconds(t)
+        return prev_kf if t - prev_kf <= next_kf - t else next_kf
+
+    def is_keyframe(self, t, tolerance: float = 0.001) -> bool:
+        """t 是否（在容差范围内）正好落在关键帧上"""
+        nearest = self.nearest_keyframe(t)
+        return nearest is not None and abs(nearest - utils.convert_to_seconds(t)) <= tolerance
+
+    def frame_count(self, start, end=None):
+        """
+        pts 落在 [start, end) 内的帧数，start / end 须为关键帧时间（end 为 None 表示到结尾）。
+        没有逐 GOP 帧数时返回 None。
+        """
+        if self.gop_frames is None:
+            return None
+        i = bisect.bisect_left(self.pts, self._to_pts(start))
+        j = len(self.pts) if end is None else bisect.bisect_left(self.pts, self._to_pts(end))
+        return sum(self.gop_frames[i:j])
+
+    def byte_offset(self, t):
+        """返回 <= t 的最近关键帧在文件中的字节偏移，不存在时返回 None"""
+        i = bisect.bisect_right(self.pts, self._to_pts(t)) - 1
+        if i < 0:
+            return None
+        return self.pos[i]
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _parse_rational(value, default=Fraction(1, 1000)) -> Fraction:
+    try:
+        num, den = str(value).split("/")
+        if int(den) == 0:
+            return default
+        return Fraction(int(num), int(den))
+    except (ValueError, TypeError):
+        return default
+
+
+def build_keyframe_index(video_path: str, timeout: int = 600):
+    """
+    扫描视频流的包（-show_entries packet，不解码）构建关键帧索引。
+
+    返回:
+        KeyframeIndex，文件无法解析或没有视频流时返回 None
+    """
+    fmt_ctx = ffmpeg.media_format_ctx(video_path)
+    if fmt_ctx is None or len(fmt_ctx.video_streams) == 0:
+        return None
+    stream = fmt_ctx.video_streams[0]
+    time_base = _parse_rational(stream.time_base)
+    start_pts = int(stream.start_pts or 0)
+    duration = float(stream.duration or 0)
+
+    cmd = f" -v error -select_streams v:0 -show_entries packet=pts,pos,flags -of csv=p=0 -i {shlex.quote(video_path)}"
+    code, _, log = ffmpeg.run_ffprobe(cmd, timeout=timeout)
+    if code != 0:
+        print(f"关键帧索引构建失败: {log}")
+        return None
+
+    keyframes = []
+    frame_pts = array("q")
+    for line in log.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 3:
+            continue
+        try:
+            pts = int(parts[0]) - start_pts
+        except ValueError:
+            continue  # pts 为 N/A
+        frame_pts.append(pts)
+        if "K" not in parts[2]:
+            continue
+        try:
+            pos = int(parts[1])
+        except ValueError:
+            pos = -1
+        keyframes.append((pts, pos))
+    keyframes.sort()
+
+    key_pts = array("q", (k[0] for k in keyframes))
+    # 逐 GOP 统计帧数（按 pts 归属），只保留计数，不常驻每一帧的 pts
+    gop_frames = array("q", [0] * len(key_pts))
+    for pts in frame_pts:
+        i = bisect.bisect_right(key_pts, pts) - 1
+        if i >= 0:
+            gop_frames[i] += 1
+
+    return KeyframeIndex(
+        time_base,
+        key_pts,
+        array("q", (k[1] for k in keyframes)),
+        duration,
+        gop_frames,
+    )
+
+
+def _lookup(key):
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+        return index
+
+
+def _store(key, index):
+    with _cache_lock:
+        _cache[key] = index
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+
+
+def get_keyframe_index(video_path: str):
+    """
+    获取视频的关键帧索引，命中缓存时不会调用 ffprobe。
+    缓存以 (path, size, mtime) 为键，文件被修改后自动重建。
+    """
+    try:
+        key = utils.file_fingerprint(video_path)
+    except OSError:
+        return None
+
+    index = _lookup(key)
+    if index is not None:
+        return index
+
+    index = build_keyframe_index(video_path)
+    if index is None:
+        return None
+    _store(key, index)
+    return index
+
+
+def cached_keyframe_index(video_path: str):
+    """只查缓存，不扫描文件；索引尚未建立（或文件已被修改）时返回 None"""
+    try:
+        return _lookup(utils.file_fingerprint(video_path))
+    except OSError:
+        return None
+
+
+_building = set()
+
+
+def prefetch_keyframe_index(video_path: str):
+    """
+    在后台线程中构建关键帧索引并放入缓存，调用方不必等待全量扫描。
+    同一文件（同一指纹）已在缓存中或正在构建时不会重复启动。
+
+    返回:
+        threading.Thread 或 None（无需构建时）
+    """
+    try:
+        key = utils.file_fingerprint(video_path)
+    except OSError:
+        return None
+    with _cache_lock:
+        if key in _cache or key in _building:
+            return None
+        _building.add(key)
+
+    def build():
+        try:
+            get_keyframe_index(video_path)
+        except Exception as e:
+            print(f"关键帧索引后台构建失败: {e}")
+        finally:
+            with _cache_lock:
+                _building.discard(key)
+
+    thread = threading.Thread(target=build, daemon=True)
+    thread.start()
+    return thread
+
+
+def clear_cache():
+    """清空所有已缓存的关键帧索引"""
+    with _cache_lock:
+        _cache.clear()
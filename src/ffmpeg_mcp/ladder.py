@@ -0,0 +1,100 @@
+"""
+多码率阶梯（rendition ladder）
+
+一次解码后用 split 把画面分成多路，每路各自 scale 并按自己的编码参数输出，
+避免为每个分辨率重复解码源视频。可选把各路的关键帧强制对齐到固定间隔，
+便于之后切片打包（HLS/DASH）时各码率的分片边界一致、可以无缝切换。
+"""
+import re
+
+# 未指定编码器时的默认值
+DEFAULT_VIDEO_CODEC = "libx264"
+
+
+def parse_rendition(spec) -> dict:
+    """
+    解析单个 rendition，支持：
+      - 整数：目标高度，如 720
+      - 字符串："1280x720"、"720p"、"720"
+      - 字典：{"width", "height", "codec", "video_bitrate", "maxrate", "crf", "preset",
+               "audio_bitrate", "output_path", "name"}
+    """
+    if isinstance(spec, dict):
+        r = dict(spec)
+    elif isinstance(spec, int):
+        r = {"height": spec}
+    elif isinstance(spec, str):
+        m = re.fullmatch(r"\s*(\d+)\s*[xX:]\s*(-?\d+)\s*", spec) or re.fullmatch(r"\s*(\d+)p?\s*", spec)
+        if not m:
+            raise ValueError(f"无法解析的 rendition: {spec}")
+        r = {"width": int(m.group(1)), "height": int(m.group(2))} if m.lastindex == 2 else {"height": int(m.group(1))}
+    else:
+        raise ValueError(f"无法解析的 rendition: {spec}")
+
+    r["width"] = int(r.get("width") or -2)
+    r["height"] = int(r.get("height") or -2)
+    if r["width"] < 0 and r["height"] < 0:
+        raise ValueError(f"rendition 至少需要指定宽或高: {spec}")
+    r.setdefault("codec", DEFAULT_VIDEO_CODEC)
+    if not r.get("name"):
+        r["name"] = f"{r['height']}p" if r["height"] > 0 else f"{r['width']}w"
+    return r
+
+
+def parse_renditions(specs) -> list:
+    if not specs:
+        raise ValueError("renditions 不能为空")
+    renditions = [parse_rendition(s) for s in specs]
+    names = [r["name"] for r in renditions]
+    if len(set(names)) != len(names):
+        raise ValueError(f"rendition 名称重复: {names}")
+    return renditions
+
+
+def split_filter(renditions, input_label="0:v"):
+    """
+    生成 split + scale 滤镜图。
+
+    返回:
+        tuple: (filter_complex, [输出标签, ...])
+    """
+    n = len(renditions)
+    labels = [f"v{i}" for i in range(n)]
+    if n == 1:
+        r = renditions[0]
+        return f"[{input_label}]scale={r['width']}:{r['height']}[{labels[0]}]", labels
+    parts = [f"[{input_label}]split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    for i, r in enumerate(renditions):
+        parts.append(f"[s{i}]scale={r['width']}:{r['height']}[{labels[i]}]")
+    return ";".join(parts), labels
+
+
+def keyframe_args(rendition, interval, stream_index=None) -> str:
+    """按固定间隔强制关键帧，并关闭场景切换插入的额外关键帧，使各路 GOP 边界一致"""
+    if not interval or interval <= 0:
+        return ""
+    spec = "" if stream_index is None else f":v:{stream_index}"
+    args = f"-force_key_frames{spec} 'expr:gte(t,n_forced*{interval})'"
+    if rendition["codec"] == "libx264":
+        args += f" -sc_threshold{spec} 0"
+    elif rendition["codec"] == "libx265":
+        args += f" -x265-params{spec} scenecut=0"
+    return args
+
+
+def video_encoder_args(rendition, stream_index=None) -> str:
+    """
+    单路的视频编码参数。stream_index 不为空时使用按输出流编号的写法（-c:v:0 ...），
+    用于 HLS/DASH 这类一个输出包含多路视频的场景。
+    """
+    spec = "" if stream_index is None else f":{stream_index}"
+    args = [f"-c:v{spec} {rendition['codec']}"]
+    if rendition.get("video_bitrate"):
+        args.append(f"-b:v{spec} {rendition['video_bitrate']}")
+        maxrate = rendition.get("maxrate") or rendition["video_bitrate"]
+        args.append(f"-maxrate:v{spec} {maxrate} -bufsize:v{spec} {maxrate}")
+    elif rendition.get("crf") is not None:
+        args.append(f"-crf:v{spec} {rendition['crf']}")
+    if rendition.get("preset"):
+        args.append(f"-preset:v{spec} {rendition['preset']}")
+    return " ".join(args)
@@ -0,0 +1,133 @@
+"""
+内容寻址的磁盘缓存
+
+按 (输入内容指纹, 处理参数) 计算缓存键，把处理结果文件保存在缓存目录中，
+使用 LRU 淘汰（命中时刷新修改时间）并限制总字节数。
+
+淘汰只看修改时间，不知道哪些条目正在被使用；需要在后续步骤中持续读取缓存文件的调用方
+应通过 checkout / put(link_to=...) 把条目硬链接到自己的工作目录，条目被淘汰后链接仍然有效。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import ffmpeg_mcp.utils as utils
+
+
+class MediaCache:
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    @property
+    def root(self) -> str:
+        return utils.get_cache_dir(self.name)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """把任意可 JSON 序列化的参数组合成缓存键"""
+        raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}{ext}")
+
+    def get(self, key: str, ext: str):
+        """命中时返回缓存文件路径并刷新其 LRU 时间，否则返回 None"""
+        path = self.path_for(key, ext)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def checkout(self, key: str, ext: str, dest: str):
+        """
+        命中时把缓存文件硬链接（跨文件系统时复制）到 dest 并刷新 LRU 时间，返回 dest；未命中返回 None。
+        与淘汰互斥执行，之后即使条目被淘汰，dest 仍然可用。
+        """
+        path = self.path_for(key, ext)
+        with self.lock:
+            try:
+                os.utime(path)
+                _link_or_copy(path, dest)
+            except FileNotFoundError:
+                return None
+        return dest
+
+    def put(self, key: str, src_path: str, ext: str, link_to: str = None) -> str:
+        """
+        把已生成的文件移动进缓存，返回缓存中的路径（传入 link_to 时同时链接过去并返回 link_to）。
+        多个线程同时写入同一个键时各自使用独立的临时文件，先写入的保留，后来的副本直接丢弃。
+        """
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            shutil.move(src_path, tmp_path)
+            with self.lock:
+                if os.path.exists(path):
+                    os.utime(path)
+                else:
+                    os.replace(tmp_path, path)
+                if link_to:
+                    _link_or_copy(path, link_to)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+        return link_to or path
+
+    def evict(self, keep: str = None):
+        """超过字节配额时，从最久未使用的文件开始删除"""
+        with self.lock:
+            files = []
+            total = 0
+            for root, dirs, names in os.walk(self.root):
+                for name in names:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+# 规格化后的拼接素材（mezzanine），默认配额 20GB
+mezzanine_cache = MediaCache("mezzanine", int(os.getenv("MCP_MEZZANINE_CACHE_BYTES", str(20 * 1024 ** 3))))
+# 拖动预览雪碧图（大图 + 坐标清单），默认配额 2GB
+sprite_cache = MediaCache("sprites", int(os.getenv("MCP_SPRITE_CACHE_BYTES", str(2 * 1024 ** 3))))
+# 按需缩略图，默认配额 1GB
+thumbnail_cache = MediaCache("thumbnails", int(os.getenv("MCP_THUMBNAIL_CACHE_BYTES", str(1024 ** 3))))
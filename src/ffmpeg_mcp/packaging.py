@@ -0,0 +1,108 @@
+"""
+HLS / DASH 切片打包
+
+把结果写成分片 + 清单（HLS master.m3u8 或 DASH manifest.mpd），输出到 /output 下的独立目录，
+由已有的 StaticFiles 挂载直接提供访问。ffmpeg 的 hls/dash muxer 每完成一个分片就写盘并刷新播放列表，
+客户端在第一个分片生成后即可开始播放，不必等整个编码结束。
+配合多码率阶梯（ladder.py）时各路关键帧按分片时长对齐，各码率的分片边界一致。
+"""
+import os
+import shlex
+
+import ffmpeg_mcp.encode_planner as encode_planner
+import ffmpeg_mcp.ladder as ladder
+import ffmpeg_mcp.utils as utils
+
+PACKAGE_FORMATS = ("hls", "dash")
+SEGMENT_TYPES = ("fmp4", "mpegts")
+MANIFEST_NAMES = {"hls": "master.m3u8", "dash": "manifest.mpd"}
+# 默认分片时长（秒）
+SEGMENT_SECONDS = 4
+
+
+def default_output_dir(video_path, fmt):
+    """默认输出目录：与普通输出同一位置，以 _hls / _dash 结尾"""
+    return os.path.splitext(utils.get_default_output_path(video_path, f"_{fmt}"))[0]
+
+
+def manifest_path(output_dir, fmt):
+    return os.path.join(output_dir, MANIFEST_NAMES[fmt])
+
+
+def _copy_codec_args(fmt_ctx, segment_ext):
+    """不转码打包：流编码能直接封装进分片容器时 copy，否则转成 H.264 / AAC"""
+    plan = {
+        "video": encode_planner.plan_video_copy(fmt_ctx.video_streams[:1], f"x{segment_ext}"),
+        "audio": encode_planner.plan_audio_copy(fmt_ctx.audio_streams[:1], f"x{segment_ext}"),
+    }
+    return encode_planner.codec_args(plan, fallback_video="-c:v libx264", fallback_audio="-c:a aac"), plan
+
+
+def build_package_command(video_path, fmt_ctx, output_dir, fmt="hls", renditions=None,
+                          segment_seconds=SEGMENT_SECONDS, segment_type="fmp4"):
+    """
+    生成打包用的 ffmpeg 参数。
+
+    参数:
+        renditions (list): 多码率阶梯（同 scale_video 的 renditions），为空时只打包源视频一路
+        segment_seconds (float): 分片时长；转码时关键帧按此间隔对齐
+        segment_type (str): HLS 分片类型 fmp4 或 mpegts（DASH 固定为 fmp4）
+    返回:
+        tuple: (cmd, report)
+    """
+    if fmt not in PACKAGE_FORMATS:
+        raise ValueError(f"不支持的打包格式: {fmt}，可选 {PACKAGE_FORMATS}")
+    if segment_type not in SEGMENT_TYPES:
+        raise ValueError(f"不支持的分片类型: {segment_type}，可选 {SEGMENT_TYPES}")
+    if fmt == "dash":
+        segment_type = "fmp4"
+    segment_ext = ".ts" if segment_type == "mpegts" else ".mp4"
+    has_audio = bool(fmt_ctx.audio_streams)
+
+    cmd = f"-i {shlex.quote(video_path)}"
+    report = {"format": fmt, "segment_type": segment_type, "segment_seconds": segment_seconds}
+    if renditions:
+        specs = ladder.parse_renditions(renditions)
+        filter_complex, labels = ladder.split_filter(specs)
+        cmd += f" -filter_complex \"{filter_complex}\""
+        for i, (r, label) in enumerate(zip(specs, labels)):
+            cmd += (f" -map \"[{label}]\" {ladder.video_encoder_args(r, i)}"
+                    f" {ladder.keyframe_args(r, segment_seconds, i)}")
+        names = [r["name"] for r in specs]
+        # HLS 每个码率一路播放列表，各自带一份音频；DASH 音频单独一个 adaptation set
+        audio_maps = len(specs) if fmt == "hls" else 1
+        if has_audio:
+            cmd += " -map 0:a:0" * audio_maps + " -c:a aac"
+        report["renditions"] = names
+    else:
+        codec_args, plan = _copy_codec_args(fmt_ctx, segment_ext)
+        cmd += f" -map 0:v:0 {'-map 0:a:0' if has_audio else ''} {codec_args}"
+        if plan["video"] is not None and plan["video"]["action"] == "encode":
+            cmd += " " + ladder.keyframe_args({"codec": "libx264"}, segment_seconds)
+        names = ["source"]
+        report["plan"] = plan
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = manifest_path(output_dir, fmt)
+    if fmt == "hls":
+        if has_audio:
+            var_map = " ".join(f"v:{i},a:{i},name:{n}" for i, n in enumerate(names))
+        else:
+            var_map = " ".join(f"v:{i},name:{n}" for i, n in enumerate(names))
+        segment_name = "stream_%v_%05d" + (".ts" if segment_type == "mpegts" else ".m4s")
+        cmd += (f" -f hls -hls_time {segment_seconds} -hls_playlist_type event"
+                f" -hls_segment_type {segment_type} -hls_flags independent_segments+temp_file"
+                f" -master_pl_name {MANIFEST_NAMES['hls']}"
+                f" -hls_segment_filename {shlex.quote(os.path.join(output_dir, segment_name))}")
+        if segment_type == "fmp4":
+            cmd += " -hls_fmp4_init_filename init_%v.mp4"
+        cmd += f" -var_stream_map {shlex.quote(var_map)} -y {shlex.quote(os.path.join(output_dir, 'stream_%v.m3u8'))}"
+    else:
+        sets = "id=0,streams=v id=1,streams=a" if has_audio else "id=0,streams=v"
+        cmd += (f" -f dash -seg_duration {segment_seconds} -use_template 1 -use_timeline 1 -streaming 1"
+                f" -adaptation_sets {shlex.quote(sets)}"
+                f" -init_seg_name {shlex.quote('init_$RepresentationID$.m4s')}"
+                f" -media_seg_name {shlex.quote('chunk_$RepresentationID$_$Number%05d$.m4s')}"
+                f" -y {shlex.quote(manifest)}")
+    report["manifest"] = manifest
+    return cmd, report
@@ -0,0 +1,239 @@
+"""
+操作融合流水线
+
+把 clip / scale / overlay / concat 等操作编译进同一个 filtergraph，由一次 ffmpeg 调用完成：
+源视频只解码一次、只编码一次，中间结果不落盘。
+
+operations 形如：
+    [{"op": "clip", "start": 5, "end": 20},
+     {"op": "scale", "width": 1280, "height": -2},
+     {"op": "overlay", "overlay_video": "/videos/logo.mp4", "position": 5, "dx": -20, "dy": -20},
+     {"op": "concat", "input_files": ["/videos/outro.mp4"]}]
+"""
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.utils as utils
+from ffmpeg_mcp.filtergraph import FilterGraph
+
+# 叠加位置：1 左上 2 上居中 3 右上 4 右居中 5 右下 6 下居中 7 左下 8 左居中 9 居中
+OVERLAY_POSITIONS = {
+    1: ("{dx}", "{dy}"),
+    2: ("(W-w)/2+{dx}", "{dy}"),
+    3: ("(W-w)+{dx}", "{dy}"),
+    4: ("(W-w)+{dx}", "(H-h)/2+{dy}"),
+    5: ("(W-w)+{dx}", "(H-h)+{dy}"),
+    6: ("(W-w)/2+{dx}", "(H-h)+{dy}"),
+    7: ("{dx}", "(H-h)+{dy}"),
+    8: ("{dx}", "(H-h)/2+{dy}"),
+    9: ("(W-w)/2+{dx}", "(H-h)/2+{dy}"),
+}
+
+
+def overlay_xy(position, dx=0, dy=0):
+    """叠加位置编号转换为 overlay 滤镜的 x / y 表达式"""
+    try:
+        x, y = OVERLAY_POSITIONS[int(position)]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"不支持的叠加位置: {position}，可选 1-9")
+    return x.format(dx=dx, dy=dy), y.format(dx=dx, dy=dy)
+
+
+class _State:
+    """编译过程中当前时间线的画面/音频流及其规格"""
+
+    def __init__(self, graph, fmt_ctx, input_index):
+        v = fmt_ctx.video_streams[0]
+        a = fmt_ctx.audio_streams[0] if fmt_ctx.audio_streams else None
+        self.graph = graph
+        self.video = graph.input_stream(input_index, "v")
+        self.audio = graph.input_stream(input_index, "a") if a else None
+        self.width = v.width
+        self.height = v.height
+        self.fps = v.r_frame_rate if v.r_frame_rate and v.r_frame_rate != "0/0" else "25"
+        self.sample_rate = (a.sample_rate if a else None) or 48000
+        self.channel_layout = (a.channel_layout if a else None) or "stereo"
+        self.duration = _stream_duration(fmt_ctx)
+
+
+def _stream_duration(fmt_ctx):
+    for s in fmt_ctx.video_streams + fmt_ctx.audio_streams:
+        try:
+            return float(s.duration)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _probe(path):
+    fmt_ctx = ffmpeg.media_format_ctx(path)
+    if fmt_ctx is None or not fmt_ctx.video_streams:
+        raise ValueError(f"无法读取视频流: {path}")
+    return fmt_ctx
+
+
+def _clip_range(op, duration):
+    start = float(op.get("start") or 0)
+    if op.get("end") is not None:
+        end = float(op["end"])
+    elif op.get("duration") is not None:
+        end = start + float(op["duration"])
+    else:
+        end = duration
+    if end is not None and end <= start:
+        raise ValueError(f"clip 的结束时间必须大于开始时间: {op}")
+    return start, end
+
+
+def _op_clip(state, op):
+    start, end = _clip_range(op, state.duration)
+    g = state.graph
+    state.video = g.chain(state.video, ("trim", (), {"start": start, "end": end}), ("setpts", ("PTS-STARTPTS",), {}))
+    if state.audio is not None:
+        state.audio = g.chain(state.audio, ("atrim", (), {"start": start, "end": end}),
+                              ("asetpts", ("PTS-STARTPTS",), {}))
+    if end is not None:
+        state.duration = end - start
+
+
+def _even(value):
+    return max(2, int(round(value / 2.0)) * 2)
+
+
+def _op_scale(state, op):
+    width = int(op.get("width", -2))
+    height = int(op.get("height", -2))
+    if width < 0 and height < 0:
+        raise ValueError("scale 至少需要指定宽或高")
+    # 在编译期解析 -1/-2，后续操作（如 concat）需要确切的分辨率
+    if width < 0:
+        width = _even(height * state.width / state.height)
+    elif height < 0:
+        height = _even(width * state.height / state.width)
+    state.video = state.graph.chain(state.video, ("scale", (width, height), {}), ("setsar", (1,), {}))
+    state.width, state.height = width, height
+
+
+def _op_overlay(state, op):
+    path = op.get("overlay_video")
+    if not path:
+        raise ValueError("overlay 需要 overlay_video")
+    path = utils.ensure_local_path(path)
+    fmt_ctx = _probe(path)
+    g = state.graph
+    index = g.add_input(path)
+    front = g.input_stream(index, "v")
+    if op.get("width") or op.get("height"):
+        front = g.apply("scale", [front], "v", op.get("width", -2), op.get("height", -2))
+    x, y = overlay_xy(op.get("position", 1), op.get("dx", 0), op.get("dy", 0))
+    state.video = g.apply("overlay", [state.video, front], "v", x=x, y=y)
+    if state.audio is not None and fmt_ctx.audio_streams and op.get("mix_audio", True):
+        # 与 overlay_video 保持一致：背景音 3、前景音 1 的权重混音；时长以背景为准
+        state.audio = g.apply("amix", [state.audio, g.input_stream(index, "a")], "a",
+                              inputs=2, duration="first", weights="3 1")
+
+
+def _normalize_video(state, stream):
+    return state.graph.chain(
+        stream,
+        ("scale", (state.width, state.height), {"force_original_aspect_ratio": "decrease"}),
+        ("pad", (state.width, state.height, "(ow-iw)/2", "(oh-ih)/2"), {}),
+        ("setsar", (1,), {}),
+        ("fps", (state.fps,), {}),
+        ("format", ("yuv420p",), {}),
+    )
+
+
+def _normalize_audio(state, stream):
+    return state.graph.chain(
+        stream,
+        ("aresample", (state.sample_rate,), {}),
+        ("aformat", (), {"channel_layouts": state.channel_layout}),
+    )
+
+
+def _op_concat(state, op):
+    files = op.get("input_files") or []
+    if not files:
+        raise ValueError("concat 需要 input_files")
+    g = state.graph
+    segments = [(_normalize_video(state, state.video),
+                 _normalize_audio(state, state.audio) if state.audio is not None else None)]
+    total = state.duration
+    for path in files:
+        path = utils.ensure_local_path(path)
+        fmt_ctx = _probe(path)
+        index = g.add_input(path)
+        video = _normalize_video(state, g.input_stream(index, "v"))
+        audio = None
+        duration = _stream_duration(fmt_ctx)
+        if state.audio is not None:
+            if fmt_ctx.audio_streams:
+                audio = _normalize_audio(state, g.input_stream(index, "a"))
+            else:
+                # 没有音轨的片段补静音，保证 concat 的每一段音视频都齐全
+                silence = g.apply("anullsrc", [], "a", r=state.sample_rate, cl=state.channel_layout)
+                audio = g.apply("atrim", [silence], "a", duration=duration or 0)
+        segments.append((video, audio))
+        total = total + duration if total is not None and duration is not None else None
+
+    inputs = []
+    for video, audio in segments:
+        inputs.append(video)
+        if state.audio is not None:
+            inputs.append(audio)
+    a = 1 if state.audio is not None else 0
+    outputs = g.apply("concat", inputs, "va" if a else "v", n=len(segments), v=1, a=a)
+    state.video, state.audio = (outputs if a else (outputs, None))
+    state.duration = total
+
+
+OPERATIONS = {
+    "clip": _op_clip,
+    "scale": _op_scale,
+    "overlay": _op_overlay,
+    "concat": _op_concat,
+}
+
+
+def compile_pipeline(video_path, operations, output_path, output_args="-c:v libx264 -c:a aac"):
+    """
+    把操作列表编译为一次 ffmpeg 调用。
+
+    第一个操作是 clip 时改为输入侧 seek（-ss/-t），只解码需要的部分。
+
+    返回:
+        tuple: (cmd, plan)
+    """
+    if not operations:
+        raise ValueError("operations 不能为空")
+    for op in operations:
+        if op.get("op") not in OPERATIONS:
+            raise ValueError(f"不支持的操作: {op.get('op')}，可选 {list(OPERATIONS)}")
+
+    fmt_ctx = _probe(video_path)
+    graph = FilterGraph()
+    ops = list(operations)
+    input_args = ""
+    seek = None
+    if ops[0]["op"] == "clip":
+        start, end = _clip_range(ops.pop(0), _stream_duration(fmt_ctx))
+        input_args = f"-ss {start}" + (f" -t {end - start}" if end is not None else "")
+        seek = [start, end]
+    state = _State(graph, fmt_ctx, graph.add_input(video_path, input_args))
+    if seek is not None and seek[1] is not None:
+        state.duration = seek[1] - seek[0]
+
+    for op in ops:
+        OPERATIONS[op["op"]](state, op)
+
+    maps = [state.video] + ([state.audio] if state.audio is not None else [])
+    cmd = graph.command(maps, output_args, output_path)
+    plan = {
+        "operations": [op["op"] for op in operations],
+        "inputs": len(graph.inputs),
+        "input_seek": seek,
+        "width": state.width,
+        "height": state.height,
+        "duration": state.duration,
+        "filter_complex": graph.render(),
+    }
+    return cmd, plan
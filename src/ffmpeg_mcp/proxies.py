@@ -0,0 +1,188 @@
+"""
+低码率代理文件（proxy）
+
+在 4K 等大尺寸素材上反复调整 overlay / scale 等参数很慢。代理文件是按比例缩小到 360p（MCP_PROXY_HEIGHT）、
+低码率的副本，后台预先生成并记录在缓存目录下的 catalog.json 中；工具传入 preview=true 时改用代理文件执行，
+时间类参数不变，像素类参数（坐标、宽高）按代理与源文件的缩放比例换算，确认效果后去掉 preview 即按原分辨率执行。
+
+代理文件按 (源文件指纹, 目标高度) 存放，源文件被修改后自动失效；文件名为 <原文件名>_preview.mp4，
+预览结果的默认输出文件名因此带有 _preview，不会覆盖正式结果。
+"""
+import json
+import os
+import shlex
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import ffmpeg_mcp.batch_jobs as batch_jobs
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.utils as utils
+from ffmpeg_mcp.media_cache import MediaCache
+
+# 代理文件的目标高度，源文件不高于该值时直接使用源文件
+PROXY_HEIGHT = int(os.getenv("MCP_PROXY_HEIGHT", "360"))
+# 后台同时生成的代理数
+PROXY_WORKERS = int(os.getenv("MCP_PROXY_WORKERS", "1"))
+# 低码率、关键帧密集（便于快速 seek）的 H.264 编码参数
+PROXY_ARGS = ("-c:v libx264 -preset veryfast -crf 30 -maxrate 1M -bufsize 2M -g 48 -pix_fmt yuv420p "
+              "-c:a aac -b:a 64k -ac 2 -movflags +faststart")
+CATALOG_NAME = "catalog.json"
+
+executor = ThreadPoolExecutor(max_workers=PROXY_WORKERS, thread_name_prefix="proxy")
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_catalog_lock = threading.Lock()
+
+
+def proxies_dir() -> str:
+    return utils.get_cache_dir("proxies")
+
+
+def catalog_path() -> str:
+    return os.path.join(proxies_dir(), CATALOG_NAME)
+
+
+def load_catalog() -> dict:
+    """{源文件绝对路径: {目标高度: {"proxy", "height", "source_height", "fingerprint", "created"}}}"""
+    try:
+        with open(catalog_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record(src, height, entry):
+    with _catalog_lock:
+        catalog = load_catalog()
+        previous = catalog.setdefault(src, {}).get(str(height))
+        catalog[src][str(height)] = entry
+        tmp_path = catalog_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, catalog_path())
+    # 源文件修改后旧的代理不再使用，顺手删除
+    if previous and previous.get("proxy") != entry["proxy"] and os.path.exists(previous["proxy"]):
+        os.remove(previous["proxy"])
+
+
+def source_height(src) -> int:
+    fmt_ctx = ffmpeg.media_format_ctx(src)
+    if fmt_ctx is None or not fmt_ctx.video_streams:
+        raise ValueError(f"无法读取视频流: {src}")
+    return int(fmt_ctx.video_streams[0].height)
+
+
+def proxy_file(src, height=PROXY_HEIGHT) -> str:
+    key = MediaCache.make_key("proxy", utils.file_fingerprint(src), height)
+    stem = os.path.splitext(os.path.basename(src))[0]
+    return os.path.join(proxies_dir(), key[:2], key, f"{stem}_preview.mp4")
+
+
+def build_proxy_command(src, height, output_path) -> str:
+    return (f"-i {shlex.quote(src)} -map 0:v:0 -map 0:a:0? -vf scale=-2:{height} {PROXY_ARGS} "
+            f"-y {shlex.quote(output_path)}")
+
+
+def _build(src, height, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".part.mp4"
+    code, log = ffmpeg.run_ffmpeg(build_proxy_command(src, height, tmp_path), timeout=3600)
+    if code != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"代理文件生成失败: {src}\n{log}")
+    os.replace(tmp_path, path)
+    _record(src, height, {"proxy": path, "height": height, "source_height": source_height(src),
+                          "fingerprint": list(utils.file_fingerprint(src)), "created": time.time()})
+    return path
+
+
+def ensure_proxy(src, height=PROXY_HEIGHT):
+    """
+    返回 (代理文件路径, 缩放比例)，没有时在当前线程生成（阻塞）。
+    源文件不高于 height 时直接返回 (src, 1.0)；同一代理的并发请求只生成一次。
+    """
+    src = os.path.abspath(src)
+    src_height = source_height(src)
+    if src_height <= height:
+        return src, 1.0
+    ratio = height / src_height
+    path = proxy_file(src, height)
+    if os.path.exists(path):
+        return path, ratio
+    with _inflight_lock:
+        future = _inflight.get(path)
+        owner = future is None
+        if owner:
+            future = _inflight[path] = Future()
+    if owner:
+        try:
+            future.set_result(_build(src, height, path))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with _inflight_lock:
+                _inflight.pop(path, None)
+    return future.result(), ratio
+
+
+def submit(src, height=PROXY_HEIGHT):
+    """在后台线程池中生成代理，返回 Future"""
+    return executor.submit(ensure_proxy, src, height)
+
+
+def build_all(files=None, pattern=None, height=PROXY_HEIGHT):
+    """为 files 以及 /videos 下匹配 pattern 的视频生成代理，返回 [{"path", "proxy", "ratio"} 或 {"path", "error"}]"""
+    futures = [(path, submit(utils.ensure_local_path(path), height))
+               for path in batch_jobs.iter_inputs(files, pattern)]
+    results = []
+    for path, future in futures:
+        try:
+            proxy, ratio = future.result()
+            results.append({"path": path, "proxy": proxy, "ratio": round(ratio, 6)})
+        except Exception as e:
+            results.append({"path": path, "error": str(e)})
+    return results
+
+
+def start_background_scan(pattern="**/*"):
+    """服务启动时调用（MCP_PROXY_AUTOBUILD=1）：后台为 /videos 下的全部视频生成代理"""
+    thread = threading.Thread(target=build_all, kwargs={"pattern": pattern}, daemon=True, name="proxy-scan")
+    thread.start()
+    return thread
+
+
+def scale_pixels(value, ratio, even=False):
+    """
+    像素类参数按代理比例换算，非数字保持不变。
+    even=True 用于宽高：结果取偶数，0 / 负数（-1、-2 表示按比例）保持不变；坐标偏移可以为负数。
+    """
+    if ratio == 1 or not isinstance(value, (int, float)) or isinstance(value, bool):
+        return value
+    if even:
+        if value <= 0:
+            return value
+        return max(2, int(round(value * ratio / 2.0)) * 2)
+    return int(round(value * ratio))
+
+
+def resolve(path, preview=False, height=PROXY_HEIGHT):
+    """preview 时返回 (代理文件路径, 缩放比例)，否则返回 (path, 1.0)"""
+    if not preview:
+        return path, 1.0
+    return ensure_proxy(path, height)
+
+
+def resolve_overlay(background, overlay, preview=False):
+    """
+    画中画预览：背景使用默认代理，前景按与背景相同的比例缩小，保持两者的相对大小。
+    返回 (背景路径, 前景路径, 缩放比例)。
+    """
+    background, ratio = resolve(background, preview)
+    if ratio == 1:
+        return background, overlay, ratio
+    overlay_height = max(2, int(round(source_height(overlay) * ratio / 2.0)) * 2)
+    overlay, _ = ensure_proxy(overlay, overlay_height)
+    return background, overlay, ratio
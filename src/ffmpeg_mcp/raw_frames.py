@@ -0,0 +1,280 @@
+"""
+原始帧流（供机器学习等本机消费者使用）
+
+ffmpeg 以 -f rawvideo 把解码（并可选缩放）后的画面直接写到管道，
+按批读入预先分配好的缓冲区（NumPy 数组或 multiprocessing.shared_memory），
+不经过 PNG 编码、落盘再解码的往返：
+
+    for first_index, batch in raw_frames.iter_frame_batches("/videos/a.mp4", batch_size=64, width=224):
+        model(batch)            # batch 形如 (n, h, w, 3) 的 uint8 数组，下一次迭代会被覆盖
+
+    with raw_frames.SharedFrameRing("/videos/a.mp4", batch_size=64, slots=4, width=224) as ring:
+        handle = ring.handle    # 交给其它进程，raw_frames.attach(handle) 零拷贝读取
+        for slot, first_index, count in ring:
+            queue.put((slot, first_index, count))
+
+NumPy 为可选依赖（pip install ffmpeg-mcp[numpy]）；未安装时批数据以 memoryview 返回。
+"""
+import os
+import shlex
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.frames as frames
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+# 支持的像素格式及每像素字节数
+PIX_FMTS = {"rgb24": 3, "bgr24": 3, "rgba": 4, "gray": 1}
+# 一个共享内存块允许的最大字节数
+MAX_SHARED_BYTES = int(os.getenv("MCP_RAW_FRAMES_MAX_BYTES", str(1 << 30)))
+# extract_to_shared_memory 保留的共享内存总字节数上限，超出时释放最早的块
+MAX_TOTAL_SHARED_BYTES = int(os.getenv("MCP_RAW_FRAMES_TOTAL_BYTES", str(4 << 30)))
+# 未调用 release 的共享内存块保留的秒数
+SHARED_TTL = float(os.getenv("MCP_RAW_FRAMES_TTL", "600"))
+
+
+def _even(value):
+    return max(2, int(round(value / 2.0)) * 2)
+
+
+def frame_geometry(video_path, width=0, height=0):
+    """输出画面尺寸：未指定时使用源尺寸，只指定一边时按比例计算另一边（偶数）"""
+    fmt_ctx = ffmpeg.media_format_ctx(video_path)
+    if fmt_ctx is None or not fmt_ctx.video_streams:
+        raise ValueError(f"无法读取视频流: {video_path}")
+    v = fmt_ctx.video_streams[0]
+    width = int(width or 0)
+    height = int(height or 0)
+    if width <= 0 and height <= 0:
+        return v.width, v.height
+    if width <= 0:
+        width = _even(height * v.width / v.height)
+    elif height <= 0:
+        height = _even(width * v.height / v.width)
+    return width, height
+
+
+def frame_shape(width, height, pix_fmt):
+    channels = PIX_FMTS[pix_fmt]
+    return (height, width) if channels == 1 else (height, width, channels)
+
+
+def build_raw_command(video_path, width, height, pix_fmt="rgb24", fps=0, start=None, end=None, max_frames=0) -> str:
+    """生成写 rawvideo 到 stdout 的 ffmpeg 参数；始终显式缩放到 width x height，保证每帧字节数确定"""
+    if pix_fmt not in PIX_FMTS:
+        raise ValueError(f"pix_fmt 必须是 {list(PIX_FMTS)} 之一")
+    input_args = frames.window_input_args(start, end)
+    filters = []
+    if fps > 0:
+        filters.append(f"fps=1/{fps}")
+    filters.append(f"scale={width}:{height}")
+    cmd = f"{input_args} -i {shlex.quote(video_path)} -map 0:v:0 -vf {shlex.quote(','.join(filters))}".strip()
+    if max_frames > 0:
+        cmd += f" -frames:v {max_frames}"
+    return f"{cmd} -vsync 0 -f rawvideo -pix_fmt {pix_fmt} -v error pipe:1"
+
+
+def iter_frame_batches(video_path, batch_size=32, width=0, height=0, pix_fmt="rgb24", fps=0,
+                       start=None, end=None, max_frames=0):
+    """
+    逐批产出原始帧：(first_index, batch)。
+
+    缓冲区只分配一次并在每批之间复用（零拷贝），需要保留数据时由调用方自行 copy。
+    安装了 NumPy 时 batch 为 (n, h, w, c) 的 uint8 数组，否则为长度 n * 帧字节数的 memoryview。
+    """
+    width, height = frame_geometry(video_path, width, height)
+    shape = frame_shape(width, height, pix_fmt)
+    frame_bytes = width * height * PIX_FMTS[pix_fmt]
+    if np is not None:
+        buffer = np.empty((batch_size,) + shape, dtype=np.uint8)
+    else:
+        buffer = memoryview(bytearray(batch_size * frame_bytes))
+    cmd = build_raw_command(video_path, width, height, pix_fmt, fps, start, end, max_frames)
+    index = 0
+    with ffmpeg.FFmpegPipe(cmd) as pipe:
+        while True:
+            n = pipe.readinto(buffer) // frame_bytes
+            if n == 0:
+                break
+            yield index, (buffer[:n] if np is not None else buffer[:n * frame_bytes])
+            index += n
+            if n < batch_size:
+                break
+    code, log = pipe.result()
+    if code not in (0, None) and index == 0:
+        raise RuntimeError(f"ffmpeg 执行失败: {log}")
+
+
+def attach(handle):
+    """
+    按 handle 打开另一进程创建的共享内存块，返回 (shm, frames)。
+    frames 为 (slots * batch_size, h, w, c) 的 uint8 数组（无 NumPy 时为 memoryview），用完后调用 shm.close()。
+    共享内存由创建方负责 unlink，这里不登记到本进程的 resource_tracker，消费者退出时不会删除它。
+    """
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=handle["name"], track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=handle["name"])
+        # 3.13 之前打开已有的块也会被登记，进程退出时 resource_tracker 会把它 unlink 掉
+        resource_tracker.unregister(shm._name, "shared_memory")
+    count = handle["capacity"]
+    if np is not None:
+        data = np.ndarray((count,) + tuple(handle["shape"]), dtype=np.uint8, buffer=shm.buf)
+    else:
+        data = shm.buf[:count * handle["frame_bytes"]]
+    return shm, data
+
+
+class SharedFrameRing:
+    """
+    把原始帧写进一块共享内存，共 slots 个槽位，每个槽位 batch_size 帧，循环使用。
+
+    迭代产出 (slot, first_index, count)：表示第 slot 个槽位已写入 count 帧。
+    生产者在下一次迭代时才会继续写（写满一圈后覆盖最早的槽位），因此消费者最多可以同时持有 slots - 1 批。
+    slots=1 且 batch_size 足够容纳全部帧时，即为一次性把整段画面放进共享内存。
+    """
+
+    def __init__(self, video_path, batch_size=32, slots=4, width=0, height=0, pix_fmt="rgb24", fps=0,
+                 start=None, end=None, max_frames=0, name=None):
+        self.width, self.height = frame_geometry(video_path, width, height)
+        self.shape = frame_shape(self.width, self.height, pix_fmt)
+        self.frame_bytes = self.width * self.height * PIX_FMTS[pix_fmt]
+        self.batch_size = batch_size
+        self.slots = slots
+        size = self.frame_bytes * batch_size * slots
+        if size > MAX_SHARED_BYTES:
+            raise ValueError(f"共享内存大小 {size} 超过上限 {MAX_SHARED_BYTES}（MCP_RAW_FRAMES_MAX_BYTES）")
+        self.cmd = build_raw_command(video_path, self.width, self.height, pix_fmt, fps, start, end, max_frames)
+        self.shm = shared_memory.SharedMemory(name=name or f"ffmpeg_mcp_{uuid.uuid4().hex[:16]}", create=True,
+                                              size=size)
+        self.handle = {
+            "name": self.shm.name,
+            "shape": list(self.shape),
+            "dtype": "uint8",
+            "pix_fmt": pix_fmt,
+            "frame_bytes": self.frame_bytes,
+            "batch_size": batch_size,
+            "slots": slots,
+            "capacity": batch_size * slots,
+        }
+        self.frames = 0
+        self.log = ""
+        self.code = None
+
+    def __iter__(self):
+        slot_bytes = self.frame_bytes * self.batch_size
+        with ffmpeg.FFmpegPipe(self.cmd) as pipe:
+            slot = 0
+            while True:
+                view = self.shm.buf[slot * slot_bytes:(slot + 1) * slot_bytes]
+                try:
+                    n = pipe.readinto(view) // self.frame_bytes
+                finally:
+                    view.release()
+                if n == 0:
+                    break
+                yield slot, self.frames, n
+                self.frames += n
+                if n < self.batch_size:
+                    break
+                slot = (slot + 1) % self.slots
+        self.code, self.log = pipe.result()
+
+    def run(self):
+        """一次性读完（适合 slots * batch_size 足以容纳全部帧的场景），返回写入的帧数"""
+        for _ in self:
+            pass
+        return self.frames
+
+    def close(self, unlink=True):
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- 供 MCP / HTTP 工具使用：把一段画面放进共享内存，交给本机其它进程读取 ---
+
+# name -> (ring, 过期时间)，按创建顺序排列
+_blocks = OrderedDict()
+_blocks_lock = threading.Lock()
+
+
+def _reclaim(reserve_bytes=0):
+    """
+    释放已过期的块；总字节数加上 reserve_bytes 超过 MAX_TOTAL_SHARED_BYTES 时再从最早的块开始释放。
+    已经 attach 的进程仍可读完自己的映射，只是无法再按 name 打开。
+    """
+    now = time.time()
+    with _blocks_lock:
+        expired = [name for name, (_, expires) in _blocks.items() if expires <= now]
+        rings = [_blocks.pop(name)[0] for name in expired]
+        total = sum(ring.shm.size for ring, _ in _blocks.values())
+        while _blocks and total + reserve_bytes > MAX_TOTAL_SHARED_BYTES:
+            _, (ring, _) = _blocks.popitem(last=False)
+            total -= ring.shm.size
+            rings.append(ring)
+    for ring in rings:
+        ring.close()
+
+
+def extract_to_shared_memory(video_path, max_frames=300, width=0, height=0, pix_fmt="rgb24", fps=0,
+                             start=None, end=None):
+    """
+    把最多 max_frames 帧写进一块新的共享内存，返回 (code, log, handle)。
+    共享内存保留到 release(name)，或 SHARED_TTL 秒后过期（handle["expires_at"]），
+    所有块合计超过 MAX_TOTAL_SHARED_BYTES 时最早的块会被提前释放；handle["count"] 为实际写入的帧数。
+    """
+    if max_frames <= 0:
+        raise ValueError("max_frames 必须大于 0")
+    ring = SharedFrameRing(video_path, batch_size=max_frames, slots=1, width=width, height=height,
+                           pix_fmt=pix_fmt, fps=fps, start=start, end=end, max_frames=max_frames)
+    if ring.shm.size > MAX_TOTAL_SHARED_BYTES:
+        ring.close()
+        raise ValueError(f"共享内存大小 {ring.shm.size} 超过总量上限 {MAX_TOTAL_SHARED_BYTES}（MCP_RAW_FRAMES_TOTAL_BYTES）")
+    _reclaim(ring.shm.size)
+    try:
+        ring.run()
+    except Exception:
+        ring.close()
+        raise
+    if ring.frames == 0:
+        ring.close()
+        return ring.code if ring.code else -1, ring.log, None
+    expires = time.time() + SHARED_TTL
+    with _blocks_lock:
+        _blocks[ring.shm.name] = (ring, expires)
+    # 到期后即使没有新的请求也会被回收
+    timer = threading.Timer(SHARED_TTL + 1, _reclaim)
+    timer.daemon = True
+    timer.start()
+    return 0, ring.log, dict(ring.handle, count=ring.frames, width=ring.width, height=ring.height,
+                             expires_at=round(expires, 3))
+
+
+def release(name) -> bool:
+    """释放 extract_to_shared_memory 创建的共享内存"""
+    with _blocks_lock:
+        entry = _blocks.pop(name, None)
+    if entry is None:
+        return False
+    entry[0].close()
+    _reclaim()
+    return True
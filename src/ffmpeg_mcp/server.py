@@ -3,9 +3,18 @@ import os
 import sys
 cur_path=os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, cur_path+"/..")
-from typing import List
+from typing import List, Union
 from mcp.server.fastmcp import FastMCP
 import ffmpeg_mcp.cut_video as cut_video
+import ffmpeg_mcp.batch_jobs as batch_jobs
+import ffmpeg_mcp.frame_archive as frame_archive
+import ffmpeg_mcp.frame_dedupe as frame_dedupe
+import ffmpeg_mcp.frames as frames
+import ffmpeg_mcp.job_graph as job_graph
+import ffmpeg_mcp.packaging as packaging
+import ffmpeg_mcp.proxies as proxies
+import ffmpeg_mcp.raw_frames as raw_frames
+import ffmpeg_mcp.sprites as sprites
 import ffmpeg_mcp.utils as utils
 from ffmpeg_mcp.task_manager import task_manager
 import threading
@@ -107,7 +116,7 @@ def find_video_path(root_path, video_name):
     return ""
 
 @mcp.tool()
-def clip_video(video_path, start=None, end=None,duration = None, output_path=None,time_out=300):
+def clip_video(video_path, start=None, end=None,duration = None, output_path=None,time_out=300, preview: bool = False):
     """
     智能视频剪辑函数
     
@@ -118,6 +127,7 @@ def clip_video(video_path, start=None, end=None,duration = None, output_path=Non
     duration:  int/float/str - 裁剪时长，end和duration必须有一个
     output_path: str - 裁剪后视频输出路径，如果不传入，会有一个默认的输出路径
     time_out: int - 命令行执行超时时间，默认为300s
+    preview: bool - 在低码率 360p 代理文件上快速预览，确认后去掉 preview 即按原分辨率执行
     返回：
     error - 错误码
     str - ffmpeg执行过程中所有日志
@@ -126,17 +136,21 @@ def clip_video(video_path, start=None, end=None,duration = None, output_path=Non
     clip_video("input.mp4", "00:01:30", "02:30")
     """
     task_id = task_manager.create_task("clip_video", {
-        "video_path": video_path, "start": start, "end": end, "duration": duration, "output_path": output_path
+        "video_path": video_path, "start": start, "end": end, "duration": duration, "output_path": output_path,
+        "preview": preview
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_video_path = utils.ensure_local_path(video_path)
+            local_video_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
             result = cut_video.clip_video_ffmpeg(local_video_path, start=start, end=end, duration=duration, output_path=output_path, time_out=time_out)
             if isinstance(result, (set, list, tuple)) and len(result) >= 3:
-                status, log, path = list(result)
-                task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -145,16 +159,54 @@ def clip_video(video_path, start=None, end=None,duration = None, output_path=Non
     threading.Thread(target=run_task).start()
     return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
 
+@mcp.tool()
+def clip_video_batch(video_path, ranges: List[dict], time_out=600, preview: bool = False):
+    """
+    从同一个视频批量剪辑多个片段，一次解码同时输出所有片段，比多次调用 clip_video 快得多
+
+    参数：
+    video_path : str - 源视频文件路径（支持远程URL）
+    ranges : List[dict] - 剪辑区间列表，每项包含 start、end（或 duration）、output_path（可选）
+    time_out: int - 每次 ffmpeg 调用的超时时间，默认为600s
+    preview: bool - 在低码率 360p 代理文件上快速预览，确认后去掉 preview 即按原分辨率执行
+    返回：
+    异步任务，通过 get_task_status 查询每个片段的结果
+    """
+    task_id = task_manager.create_task("clip_video_batch", {
+        "video_path": video_path, "ranges": ranges, "preview": preview
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_video_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, clips = cut_video.clip_video_batch(local_video_path, ranges, time_out=time_out)
+            for clip in clips:
+                clip["url"] = get_file_url(clip["path"]) if clip["status"] == 0 else ""
+            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "clips": clips})
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
 @mcp.tool()
 def concat_videos(input_files: List[str], output_path: str = None, 
-                      fast: bool = True):
+                      fast: Union[bool, str] = True, chunks: int = 0, movflags: str = None,
+                      preview: bool = False):
     """
     使用FFmpeg拼接多个视频文件
     
     参数:
     input_files (List[str]): 输入视频文件路径列表
     output_path (str): 合并后的输出文件路径,如果不传入，会一个默认的输出路径
-    fast (bool): 拼接方法，可选值："True"（默认，要求所有视频必须具有相同的编码格式、分辨率、帧率等参数）| "False(当不确定合并的视频编码格式、分辨率、帧率等参数是否相同的情况下，这个参数应该是False)"
+    fast (bool|str): 拼接方法，可选值："True"（默认，要求所有视频必须具有相同的编码格式、分辨率、帧率等参数）| "False(当不确定合并的视频编码格式、分辨率、帧率等参数是否相同的情况下，这个参数应该是False)" | "auto"（推荐：只转码与多数输入规格不一致的视频，其余直接拼接，速度接近 True 且不会失败）
+    
+    chunks (int): fast=False 时大于1表示把输入分成 chunks 组并行编码后无损拼接，0 表示不分组
+    
+    movflags (str): MP4 输出写法，fragmented（分片 MP4，编码过程中即可通过 /api/stream_output/{task_id} 边编码边下载）| faststart（moov 前置，完成后的文件可边下边播）
+    
+    preview (bool): 在低码率 360p 代理文件上快速预览，确认后去掉 preview 即按原分辨率执行
     
     返回:
     执行日志
@@ -165,17 +217,24 @@ def concat_videos(input_files: List[str], output_path: str = None,
     3. 输出文件格式由output_path后缀决定（如.mp4/.mkv）
     """
     task_id = task_manager.create_task("concat_videos", {
-        "input_files": input_files, "output_path": output_path, "fast": fast
+        "input_files": input_files, "output_path": output_path, "fast": fast, "chunks": chunks,
+        "movflags": movflags, "preview": preview
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_input_files = [utils.ensure_local_path(f) for f in input_files]
-            result = cut_video.concat_videos(local_input_files, output_path, fast)
+            local_input_files = [proxies.resolve(utils.ensure_local_path(f), preview)[0] for f in input_files]
+            # 输出路径提前公布，编码过程中即可按路径/URL 读取已写出的部分
+            target = output_path or utils.get_default_output_path(local_input_files[0], "_merged")
+            task_manager.update_task(task_id, "RUNNING", result={"path": target, "url": get_file_url(target)})
+            result = cut_video.concat_videos(local_input_files, target, fast, chunks, movflags)
             if isinstance(result, (tuple, list)) and len(result) >= 2:
                 code, log = result[:2]
-                task_manager.update_task(task_id, "COMPLETED", result={"status": code, "log": log, "url": "Use list_output_videos to find the exact path if not specified"})
+                res = {"status": code, "log": log, "path": target, "url": get_file_url(target)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -213,7 +272,8 @@ def get_audio_info(audio_path: str):
 @mcp.tool()
 def concat_videos_with_mp3(video_paths: List[str], audio_path: str,
                             output_path: str = None, mute_video_audio: bool = True,
-                            order: str = "sequence"):
+                            order: str = "sequence",
+                            preview: bool = False):
     """
     根据音频时长拼接视频，视频过长则裁剪，过短则循环重复，最终输出以音频长度为准的视频。
 
@@ -223,27 +283,35 @@ def concat_videos_with_mp3(video_paths: List[str], audio_path: str,
     output_path (str): 输出路径，可选，不传则自动生成
     mute_video_audio (bool): 是否静音视频原声。True=只保留MP3音频(默认), False=视频原声与MP3混合
     order (str): 视频拼接顺序。sequence=按数组顺序(默认), random=随机抽取, reverse=倒序
+    preview (bool): 视频使用低码率 360p 代理文件快速预览（音频不变），确认后去掉 preview 即按原分辨率执行
 
     返回:
     异步任务，通过 get_task_status 查询结果
     """
     task_id = task_manager.create_task("concat_videos_with_mp3", {
         "video_paths": video_paths, "audio_path": audio_path,
-        "output_path": output_path, "mute_video_audio": mute_video_audio, "order": order
+        "output_path": output_path, "mute_video_audio": mute_video_audio, "order": order,
+        "preview": preview
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_videos = [utils.ensure_local_path(v) for v in video_paths]
+            local_videos = [proxies.resolve(utils.ensure_local_path(v), preview)[0] for v in video_paths]
             local_audio = utils.ensure_local_path(audio_path)
+            # 默认输出名按音频文件生成，预览时单独加上 _preview，避免与原分辨率结果同名
+            target = output_path
+            if preview and not target:
+                target = utils.get_default_output_path(local_audio, "_with_mp3_preview", force_ext=".mp4")
             result = cut_video.concat_videos_with_mp3(
-                local_videos, local_audio, output_path, mute_video_audio, order
+                local_videos, local_audio, target, mute_video_audio, order
             )
             if isinstance(result, (tuple, list)) and len(result) >= 3:
-                status, log, path = result[0], result[1], result[2]
-                task_manager.update_task(task_id, "COMPLETED",
-                    result={"status": status, "log": log, "path": path, "url": get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -255,7 +323,8 @@ def concat_videos_with_mp3(video_paths: List[str], audio_path: str,
 @mcp.tool()
 def concat_videos_with_mp3_video_first(video_paths: List[str], audio_path: str,
                                         output_path: str = None, mute_video_audio: bool = True,
-                                        order: str = "sequence"):
+                                        order: str = "sequence",
+                                        preview: bool = False):
     """
     以视频长度为准拼接视频。如果视频总时长超过音频时长，报错【音频长度不足】。
     音频足够时，拼接视频并裁剪多余音频到视频总时长。
@@ -266,27 +335,35 @@ def concat_videos_with_mp3_video_first(video_paths: List[str], audio_path: str,
     output_path (str): 输出路径，可选，不传则自动生成
     mute_video_audio (bool): 是否静音视频原声。True=只保留MP3音频(默认), False=视频原声与MP3混合
     order (str): 视频拼接顺序。sequence=按数组顺序(默认), random=随机抽取, reverse=倒序
+    preview (bool): 视频使用低码率 360p 代理文件快速预览（音频不变），确认后去掉 preview 即按原分辨率执行
 
     返回:
     异步任务，通过 get_task_status 查询结果
     """
     task_id = task_manager.create_task("concat_videos_with_mp3_video_first", {
         "video_paths": video_paths, "audio_path": audio_path,
-        "output_path": output_path, "mute_video_audio": mute_video_audio, "order": order
+        "output_path": output_path, "mute_video_audio": mute_video_audio, "order": order,
+        "preview": preview
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_videos = [utils.ensure_local_path(v) for v in video_paths]
+            local_videos = [proxies.resolve(utils.ensure_local_path(v), preview)[0] for v in video_paths]
             local_audio = utils.ensure_local_path(audio_path)
+            # 默认输出名按音频文件生成，预览时单独加上 _preview，避免与原分辨率结果同名
+            target = output_path
+            if preview and not target:
+                target = utils.get_default_output_path(local_audio, "_video_first_preview", force_ext=".mp4")
             result = cut_video.concat_videos_with_mp3_video_first(
-                local_videos, local_audio, output_path, mute_video_audio, order
+                local_videos, local_audio, target, mute_video_audio, order
             )
             if isinstance(result, (tuple, list)) and len(result) >= 3:
-                status, log, path = result[0], result[1], result[2]
-                task_manager.update_task(task_id, "COMPLETED",
-                    result={"status": status, "log": log, "path": path, "url": get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+                if len(result) > 3:
+                    res["plan"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -297,7 +374,8 @@ def concat_videos_with_mp3_video_first(video_paths: List[str], audio_path: str,
 
 
 @mcp.tool()
-def overlay_video(background_video, overlay_video, output_path: str = None, position: int = 1,  dx = 0, dy = 0):
+def overlay_video(background_video, overlay_video, output_path: str = None, position: int = 1,  dx = 0, dy = 0, chunks: int = 0,
+                  preview: bool = False):
     """
     两个视频叠加，注意不是拼接长度，而是画中画效果
 
@@ -308,20 +386,27 @@ def overlay_video(background_video, overlay_video, output_path: str = None, posi
     position(enum) - 相对位置，TopLeft=1: 左上角,TopCenter=2: 上居中, TopRight=3: 右上角 RightCenter=4: 右居中 BottomRight=5: 右下角 BottomCenter=6: 下居中 BottomLeft=7: 左下角 LeftCenter=8: 左居中 Center=9: 居中
     dx(int) - 整形,前景视频坐标x偏移值
     dy(int) - 整形,前景视频坐标y偏移值
+    chunks(int) - 大于1时按关键帧切成多段并行编码，适合长视频，0 表示不分片
+    preview(bool) - 在低码率 360p 代理文件上快速预览，像素类参数按比例换算；确认后去掉 preview 即按原分辨率执行
     """
     task_id = task_manager.create_task("overlay_video", {
-        "background_video": background_video, "overlay_video": overlay_video, "output_path": output_path, "position": position
+        "background_video": background_video, "overlay_video": overlay_video, "output_path": output_path, "position": position, "chunks": chunks,
+        "preview": preview
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
-            local_background = utils.ensure_local_path(background_video)
-            local_overlay = utils.ensure_local_path(overlay_video)
-            result = cut_video.overlay_video(local_background, local_overlay, output_path, position, dx, dy)
+            local_background, local_overlay, ratio = proxies.resolve_overlay(
+                utils.ensure_local_path(background_video), utils.ensure_local_path(overlay_video), preview)
+            result = cut_video.overlay_video(local_background, local_overlay, output_path, position,
+                                             proxies.scale_pixels(dx, ratio), proxies.scale_pixels(dy, ratio), chunks)
             if isinstance(result, (set, list, tuple)) and len(result) >= 3:
-                status, log, path = list(result)
-                task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": get_file_url(path)})
+                status, log, path = list(result)[:3]
+                res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+                if len(result) > 3:
+                    res["chunked"] = result[3]
+                task_manager.update_task(task_id, "COMPLETED", result=res)
             else:
                 task_manager.update_task(task_id, "COMPLETED", result=result)
         except Exception as e:
@@ -331,7 +416,9 @@ def overlay_video(background_video, overlay_video, output_path: str = None, posi
     return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
        
 @mcp.tool()   
-def scale_video(video_path, width, height,output_path: str = None):
+def scale_video(video_path, width: int = -2, height: int = -2, output_path: str = None, chunks: int = 0,
+                renditions: list = None, keyframe_interval: float = 2, package: str = None,
+                preview: bool = False):
     """
     视频缩放
 
@@ -339,17 +426,245 @@ def scale_video(video_path, width, height,output_path: str = None):
     width(int) - 目标宽度。
     height(int) - 目标高度。
     output_path(str) - 输出路径
+    chunks(int) - 大于1时按关键帧切成多段并行编码，适合长视频，0 表示不分片
+    renditions(list) - 多码率阶梯，如 [1080, 720, "854x480", {"height": 360, "video_bitrate": "800k"}]，
+                       一次解码输出全部分辨率，结果中 renditions 给出每一路的路径和大小
+    keyframe_interval(float) - 多码率时各路关键帧对齐的间隔（秒），0 表示不对齐；打包时即分片时长
+    package(str) - 与 renditions 一起使用：hls 或 dash，输出切片和清单（output_path 为输出目录）
+    preview(bool) - 在低码率 360p 代理文件上快速预览，width / height 按比例换算；不支持 renditions
     """ 
+    if preview and renditions:
+        return {"error": "preview 不支持 renditions"}
     task_id = task_manager.create_task("scale_video", {
-        "video_path": video_path, "width": width, "height": height, "output_path": output_path
+        "video_path": video_path, "width": width, "height": height, "output_path": output_path, "chunks": chunks,
+        "renditions": renditions, "keyframe_interval": keyframe_interval, "package": package, "preview": preview
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_video_path, ratio = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            result = cut_video.scale_video(local_video_path, proxies.scale_pixels(width, ratio, even=True),
+                                           proxies.scale_pixels(height, ratio, even=True), output_path, chunks,
+                                           renditions, keyframe_interval, package)
+            status, log, path = result[:3]
+            res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+            if len(result) > 3 and renditions and package:
+                res["package"] = result[3]
+            elif len(result) > 3 and renditions:
+                res["renditions"] = [dict(r, url=get_file_url(r["path"])) for r in result[3]]
+            elif len(result) > 3:
+                res["chunked"] = result[3]
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+@mcp.tool()
+def run_pipeline(video_path: str, operations: list, output_path: str = None, encoding: dict = None,
+                 movflags: str = None):
+    """
+    把多个操作融合为一次 ffmpeg 调用：源视频只解码、编码一次，中间结果不落盘，只写最终输出。
+    代替依次调用 clip_video、scale_video、overlay_video、concat_videos。
+
+    参数：
+    video_path(str) - 源视频路径
+    operations(list) - 按顺序执行的操作，每项带 op 字段：
+        {"op": "clip", "start": 5, "end": 20}（或 duration）
+        {"op": "scale", "width": 1280, "height": -2}
+        {"op": "overlay", "overlay_video": "...", "position": 1-9, "dx": 0, "dy": 0, "width": 可选, "height": 可选}
+        {"op": "concat", "input_files": ["..."]}（追加到当前结果之后，自动统一分辨率/帧率/音频格式）
+    output_path(str) - 输出路径，默认自动生成
+    encoding(dict) - 视频编码参数，如 {"codec": "libx264", "crf": 20, "preset": "veryfast"}
+    movflags(str) - fragmented 或 faststart，同 concat_videos
+    """
+    task_id = task_manager.create_task("run_pipeline", {
+        "video_path": video_path, "operations": operations, "output_path": output_path,
+        "encoding": encoding, "movflags": movflags
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_video_path = utils.ensure_local_path(video_path)
+            target = output_path or utils.get_default_output_path(local_video_path, "_pipeline")
+            task_manager.update_task(task_id, "RUNNING", result={"path": target, "url": get_file_url(target)})
+            result = cut_video.run_pipeline(local_video_path, operations, target, encoding, movflags)
+            status, log, path = result[:3]
+            res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+            if len(result) > 3:
+                res["plan"] = result[3]
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+@mcp.tool()
+def run_job_graph(steps: list):
+    """
+    提交一个作业图（DAG）：步骤之间可以互相引用输出，互不依赖的分支并行执行，
+    中间结果写在 scratch 目录（MCP_SCRATCH_DIR）并在结束后自动清理，整个作业只有一个 task_id。
+
+    参数：
+    steps(list) - 步骤列表，每项 {"id", "op", "params", "depends_on"(可选), "output"(可选)}
+        op 可选 clip_video, clip_video_batch, scale_video, overlay_video, concat_videos,
+        run_pipeline, extract_frames_from_video, package_video，params 与对应工具的参数相同；
+        参数值 "${id}" 引用步骤的输出路径，"${id.paths}" / "${id.frames}" 引用多个输出。
+        例：[{"id": "clips", "op": "clip_video_batch", "params": {"video_path": "...", "ranges": [[0, 3], [10, 13]]}},
+             {"id": "merged", "op": "concat_videos", "params": {"input_files": "${clips.paths}", "fast": "auto"}}]
+
+    异步任务：get_task_status 的 result.nodes 给出每个步骤的状态和结果。
+    """
+    try:
+        job_graph.parse_graph(steps)
+    except ValueError as e:
+        return {"error": str(e)}
+    task_id = task_manager.create_task("run_job_graph", {"steps": steps})
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            code, nodes = job_graph.run_graph(
+                steps, on_update=lambda nodes: task_manager.update_task(task_id, "RUNNING", result={"nodes": nodes}))
+            for node in nodes.values():
+                result = node.get("result")
+                if result and not result.get("scratch"):
+                    result["url"] = get_file_url(result.get("path"))
+            task_manager.update_task(task_id, "COMPLETED", result={"status": code, "nodes": nodes})
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+@mcp.tool()
+def run_batch(operation: str, params: dict = None, files: List[str] = None, pattern: str = None,
+              output_dir: str = None):
+    """
+    对大量文件执行同一个操作，整体只有一个 task_id。
+
+    参数：
+    operation(str) - clip_video, clip_video_batch, scale_video, run_pipeline, extract_frames_from_video, package_video 之一
+    params(dict) - 操作参数（不含 video_path），如 {"width": 640, "height": -2}
+    files(List[str]) - 输入文件列表
+    pattern(str) - /videos 下的 glob，如 "**/*.mp4"，与 files 可同时使用
+    output_dir(str) - 输出目录，默认 /output/batch_<task_id 前 8 位>
+
+    异步任务：get_task_status 返回完成/失败/运行中的数量和 ETA，
+    每个文件的结果通过 get_batch_results 分页查询。
+    """
+    try:
+        batch_jobs.validate(operation, files, pattern)
+    except ValueError as e:
+        return {"error": str(e)}
+    task_id = task_manager.create_task("run_batch", {
+        "operation": operation, "params": params, "files": files, "pattern": pattern, "output_dir": output_dir
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            job = batch_jobs.run_batch(
+                task_id, operation, params, files, pattern, output_dir,
+                on_progress=lambda summary: task_manager.update_task(task_id, "RUNNING", result=summary))
+            summary = job.summary()
+            summary["status"] = 0 if summary["failed"] == 0 else -1
+            task_manager.update_task(task_id, "COMPLETED", result=summary)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+
+@mcp.tool()
+def get_batch_results(task_id: str, offset: int = 0, limit: int = 100, status: str = None):
+    """
+    分页查询批量作业中每个文件的结果（按完成顺序）。
+
+    参数：
+    task_id(str) - run_batch 返回的 task_id
+    offset(int) / limit(int) - 分页
+    status(str) - 只看 completed 或 failed
+    """
+    job = batch_jobs.get_batch(task_id)
+    if job is None:
+        return {"error": f"Batch {task_id} not found"}
+    return {"summary": job.summary(), **job.page(offset, min(limit, 1000), status)}
+
+@mcp.tool()
+def build_proxies(files: List[str] = None, pattern: str = None):
+    """
+    在后台为视频生成低码率 360p 代理文件（记录在代理目录的 catalog.json 中），
+    之后各工具传入 preview=true 时直接使用，无需等待生成。
+
+    参数：
+    files(List[str]) - 视频列表
+    pattern(str) - /videos 下的 glob，如 "**/*.mp4"；files 与 pattern 都不传时为 /videos 下的全部视频
+
+    结果中 proxies 给出每个视频的代理路径和缩放比例（不高于 360p 的视频直接使用原文件）。
+    """
+    if not files and not pattern:
+        pattern = "**/*"
+    try:
+        batch_jobs.validate_inputs(files, pattern)
+    except ValueError as e:
+        return {"error": str(e)}
+    task_id = task_manager.create_task("build_proxies", {"files": files, "pattern": pattern})
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            results = proxies.build_all(files, pattern)
+            status = 0 if all("proxy" in r for r in results) else -1
+            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "proxies": results})
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+
+@mcp.tool()
+def package_video(video_path, format: str = "hls", renditions: list = None, output_dir: str = None,
+                  segment_seconds: float = 4, segment_type: str = "fmp4"):
+    """
+    把视频打包为 HLS 或 DASH（分片 + 清单），输出到 /output 下，可直接通过 URL 播放。
+
+    参数：
+    video_path(str) - 视频路径
+    format(str) - hls 或 dash
+    renditions(list) - 多码率阶梯，如 [1080, 720, 480]；为空时只打包原视频（编码兼容时不转码）
+    output_dir(str) - 输出目录，默认自动生成
+    segment_seconds(float) - 分片时长（秒）
+    segment_type(str) - HLS 分片类型：fmp4 或 mpegts
+
+    异步任务：任务进入 RUNNING 后结果中即给出清单 url，第一个分片生成后即可开始播放。
+    """
+    task_id = task_manager.create_task("package_video", {
+        "video_path": video_path, "format": format, "renditions": renditions, "output_dir": output_dir,
+        "segment_seconds": segment_seconds, "segment_type": segment_type
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
             local_video_path = utils.ensure_local_path(video_path)
-            status, log, path = cut_video.scale_video(local_video_path, width, height, output_path)
-            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "path": path, "url": get_file_url(path)})
+            target_dir = output_dir or packaging.default_output_dir(local_video_path, format)
+            manifest = packaging.manifest_path(target_dir, format)
+            # 清单路径提前确定，编码过程中客户端即可开始拉流
+            task_manager.update_task(task_id, "RUNNING", result={"path": manifest, "url": get_file_url(manifest)})
+            result = cut_video.package_video(local_video_path, format, renditions, target_dir,
+                                             segment_seconds, segment_type)
+            status, log, path = result[:3]
+            res = {"status": status, "log": log, "path": path, "url": get_file_url(path)}
+            if len(result) > 3:
+                res["package"] = result[3]
+            task_manager.update_task(task_id, "COMPLETED", result=res)
         except Exception as e:
             task_manager.update_task(task_id, "FAILED", error=str(e))
 
@@ -357,7 +672,11 @@ def scale_video(video_path, width, height,output_path: str = None):
     return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
 
 @mcp.tool()   
-def extract_frames_from_video(video_path,fps=0, output_folder=None, format=0, total_frames=0):
+def extract_frames_from_video(video_path,fps=0, output_folder=None, format=0, total_frames=0,
+                              start=None, end=None, duration=None, windows: list = None, shards: int = 0,
+                              keyframes_only: bool = False, min_interval: float = 0, width: int = 0,
+                              quality: str = None, archive: str = None, dedupe: str = None,
+                              dedupe_threshold: int = None, preview: bool = False):
     """
     提取视频中的图像。
 
@@ -366,24 +685,195 @@ def extract_frames_from_video(video_path,fps=0, output_folder=None, format=0, to
     fps(int) - 每多少秒抽一帧，如果传0，代表全部都抽,传1，代表每一秒抽1帧。
     output_folder(str) - 把图片输出到哪个目录
     format(int) - 抽取的图片格式，0：代表png 1:jpg 2:webp
-    total_frames(int) - 最多抽取多少张，0代表不限制
+    total_frames(int) - 每个时间窗口最多抽取多少张，0代表不限制
+    start / end / duration - 只抽取这一段内的帧，直接 seek 到开始位置，不从头解码
+    windows(list) - 多个时间窗口，如 [[60, 65], {"start": "01:30:00", "duration": 5}]，一次调用完成
+    shards(int) - 抽取全部帧时（fps=0，不限张数和时间）在关键帧处切成多少段并行抽取，编号与单次抽取一致
+    keyframes_only(bool) - 预览图模式：只解码关键帧，几秒内完成长视频的预览条，帧时间不精确
+    min_interval(float) - keyframes_only 时相邻两帧的最小间隔（秒），默认取 fps
+    width(int) - 输出宽度，0 为原始尺寸，高度按比例
+    quality(str) - jpg / webp 质量预设：low, medium, high
+    archive(str) - zip 或 tar：所有帧写进一个归档文件（附 frames.json），不生成成千上万个单独的图片文件
+    dedupe(str) - 去掉相邻的重复画面：mpdecimate（最快）、dhash / phash（感知哈希，需要 numpy）。
+                  dhash / phash 在同一次解码中额外输出灰度小图，抽帧过程中边读边算哈希，
+                  重复的图片在写入磁盘或归档之前就被丢弃（ffmpeg 内部仍会编码一次）
+    dedupe_threshold(int) - dhash / phash 的汉明距离阈值（0-64），距离上一张保留帧大于该值才保留
+    preview(bool) - 在低码率 360p 代理文件上抽帧，width 按比例换算
+
+    结果中的 frames 给出每张图片的路径和在源视频中的时间（秒）。
     """ 
+    try:
+        frames.parse_windows(windows, start, end, duration)
+        frames.quality_args(frames.image_ext(format), quality)
+        if archive is not None and archive not in frame_archive.ARCHIVE_FORMATS:
+            raise ValueError(f"archive 必须是 {list(frame_archive.ARCHIVE_FORMATS)} 之一")
+        frame_dedupe.validate(dedupe)
+    except ValueError as e:
+        return {"error": str(e)}
     task_id = task_manager.create_task("extract_frames", {
-        "video_path": video_path, "fps": fps, "format": format, "total_frames": total_frames
+        "video_path": video_path, "fps": fps, "format": format, "total_frames": total_frames,
+        "start": start, "end": end, "duration": duration, "windows": windows, "shards": shards,
+        "keyframes_only": keyframes_only, "min_interval": min_interval, "width": width, "quality": quality,
+        "archive": archive, "dedupe": dedupe, "dedupe_threshold": dedupe_threshold, "preview": preview
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_video_path, ratio = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, path, extracted = cut_video.extract_frames_from_video(
+                local_video_path, fps, output_folder, format, total_frames, start, end, duration, windows, shards,
+                keyframes_only, min_interval, proxies.scale_pixels(width, ratio, even=True), quality, archive,
+                dedupe, dedupe_threshold)
+            res = {"status": status, "log": log, "path": path,
+                   "url": get_file_url(path if archive else os.path.dirname(path)),
+                   "frames": extracted}
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+@mcp.tool()
+def grab_frames(video_path: str, timestamps: list, keyframe_only: bool = False, format: int = 1,
+                output_folder: str = None, inline: bool = False, preview: bool = False):
+    """
+    抓取视频中任意时间点的画面（缩略图、画面质检），直接 seek 到每个时间点，不解码整个视频。
+
+    参数：
+    video_path(str) - 视频路径
+    timestamps(list) - 时间点列表，秒数或 HH:MM:SS，如 [1.5, 30, "00:10:00"]
+    keyframe_only(bool) - 取每个时间点最近的关键帧，几乎不需要解码，时间不精确
+    format(int) - 图片格式，0：png 1:jpg 2:webp
+    output_folder(str) - 图片输出目录，默认每次调用新建一个 grab_<随机串> 子目录
+    inline(bool) - 以 Base64 返回图片内容而不是文件路径
+    preview(bool) - 在低码率 360p 代理文件上抓帧
+
+    结果中的 frames 与 timestamps 一一对应，time 为实际取到的帧时间。
+    """
+    try:
+        frames.parse_timestamps(timestamps)
+    except ValueError as e:
+        return {"error": str(e)}
+    task_id = task_manager.create_task("grab_frames", {
+        "video_path": video_path, "timestamps": timestamps, "keyframe_only": keyframe_only,
+        "format": format, "inline": inline, "preview": preview
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_video_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, folder, grabs = cut_video.grab_frames(
+                local_video_path, timestamps, keyframe_only, output_folder, format, inline)
+            for grab in grabs:
+                if grab.get("path"):
+                    grab["url"] = get_file_url(grab["path"])
+            res = {"status": status, "log": log, "path": folder, "frames": grabs}
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+@mcp.tool()
+def generate_sprite_sheet(video_path: str, interval: float = 10, width: int = 160, columns: int = 10, rows: int = 10,
+                          format: int = 1, keyframes_only: bool = False, index_format: str = "vtt",
+                          output_folder: str = None, preview: bool = False):
+    """
+    生成播放器拖动预览用的雪碧图：一次 ffmpeg 调用（fps + scale + tile）输出若干张大图，
+    以及每张缩略图时间与坐标的索引。同一视频、同样布局的结果会被缓存。
+
+    参数：
+    video_path(str) - 视频路径
+    interval(float) - 每隔多少秒一张缩略图
+    width(int) - 缩略图宽度，高度按比例
+    columns / rows(int) - 每张大图的列数和行数
+    format(int) - 大图格式，0：png 1:jpg 2:webp
+    keyframes_only(bool) - 只解码关键帧，长视频快很多，缩略图时间取最近的关键帧
+    index_format(str) - vtt（WebVTT，xywh 坐标）或 json
+    output_folder(str) - 输出目录
+    preview(bool) - 在低码率 360p 代理文件上生成（缩略图宽度通常不超过代理宽度，画面几乎没有差别）
+
+    结果中 path 为索引文件，sheets 为各张大图。
+    """
+    try:
+        sprites.validate(interval, width, columns, rows, index_format)
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}
+    task_id = task_manager.create_task("generate_sprite_sheet", {
+        "video_path": video_path, "interval": interval, "width": width, "columns": columns, "rows": rows,
+        "format": format, "keyframes_only": keyframes_only, "index_format": index_format, "preview": preview
+    })
+
+    def run_task():
+        task_manager.update_task(task_id, "RUNNING")
+        try:
+            local_video_path, _ = proxies.resolve(utils.ensure_local_path(video_path), preview)
+            status, log, index_path, sheets = cut_video.generate_sprite_sheet(
+                local_video_path, interval, width, columns, rows, format, keyframes_only, index_format,
+                output_folder)
+            res = {"status": status, "log": log, "path": index_path,
+                   "url": get_file_url(index_path) if index_path else "",
+                   "sheets": [{"path": p, "url": get_file_url(p)} for p in sheets]}
+            task_manager.update_task(task_id, "COMPLETED", result=res)
+        except Exception as e:
+            task_manager.update_task(task_id, "FAILED", error=str(e))
+
+    threading.Thread(target=run_task).start()
+    return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
+
+@mcp.tool()
+def extract_raw_frames(video_path: str, max_frames: int = 300, width: int = 0, height: int = 0,
+                       pix_fmt: str = "rgb24", fps: float = 0, start=None, end=None):
+    """
+    把解码后的原始画面（rawvideo）直接写进一块共享内存，供同一台机器上的进程零拷贝读取，
+    不经过图片编码和落盘。读取方式：ffmpeg_mcp.raw_frames.attach(handle)，用完后调用 release_raw_frames。
+
+    参数：
+    video_path(str) - 视频路径
+    max_frames(int) - 最多写入多少帧（决定共享内存大小，上限 MCP_RAW_FRAMES_MAX_BYTES）
+    width / height(int) - 输出尺寸，0 为原始尺寸，只给一边时按比例
+    pix_fmt(str) - rgb24, bgr24, rgba, gray
+    fps(float) - 每多少秒取一帧，0 为每一帧
+    start / end - 只读取这一段（输入侧 seek）
+
+    结果中的 handle 包含共享内存名 name、单帧 shape、实际帧数 count、过期时间 expires_at
+    （未释放的块 MCP_RAW_FRAMES_TTL 秒后自动回收）。
+    """
+    if pix_fmt not in raw_frames.PIX_FMTS:
+        return {"error": f"pix_fmt 必须是 {list(raw_frames.PIX_FMTS)} 之一"}
+    task_id = task_manager.create_task("extract_raw_frames", {
+        "video_path": video_path, "max_frames": max_frames, "width": width, "height": height,
+        "pix_fmt": pix_fmt, "fps": fps, "start": start, "end": end
     })
 
     def run_task():
         task_manager.update_task(task_id, "RUNNING")
         try:
             local_video_path = utils.ensure_local_path(video_path)
-            result = cut_video.extract_frames_from_video(local_video_path, fps, output_folder, format, total_frames)
-            task_manager.update_task(task_id, "COMPLETED", result=result)
+            status, log, handle = raw_frames.extract_to_shared_memory(
+                local_video_path, max_frames, width, height, pix_fmt, fps, start, end)
+            task_manager.update_task(task_id, "COMPLETED", result={"status": status, "log": log, "handle": handle})
         except Exception as e:
             task_manager.update_task(task_id, "FAILED", error=str(e))
 
     threading.Thread(target=run_task).start()
     return {"task_id": task_id, "status": "PENDING", "message": "Task submitted successfully"}
 
+
+@mcp.tool()
+def release_raw_frames(name: str):
+    """
+    释放 extract_raw_frames 创建的共享内存。
+
+    参数：
+    name(str) - handle 中的 name
+    """
+    return {"released": raw_frames.release(name)}
+
 @mcp.tool()
 def download_video(video_path: str, base64: bool = False):
     """
@@ -551,6 +1041,10 @@ def main():
     host = os.getenv('MCP_HOST', '0.0.0.0')
     port = int(os.getenv('MCP_PORT', '8032'))
 
+    # 后台为 /videos 下的视频生成预览用代理文件
+    if os.getenv('MCP_PROXY_AUTOBUILD', '0') == '1':
+        proxies.start_background_scan()
+
     # 针对较新版本 MCP SDK 的安全配置 (DNS Rebinding Protection)
     # 必须在调用 mcp.sse_app() 之前配置，因为 middleware 在创建时就生成了
     if hasattr(mcp, "settings"):
@@ -0,0 +1,137 @@
+"""
+拖动预览雪碧图（seek-preview sprite sheet）
+
+一次 ffmpeg 调用完成取帧、缩放、拼图：fps（或只解码关键帧 + select）→ scale → showinfo → tile，
+每满 columns x rows 张输出一张大图；showinfo 记录每张缩略图在源视频中的时间，
+据此生成 WebVTT（播放器常用的 #xywh 格式）或 JSON 坐标索引。
+
+结果按 (输入内容指纹, 布局参数) 缓存在 sprite_cache 中，同一视频同样的布局不会重复解码。
+"""
+import glob
+import json
+import os
+import shutil
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.frames as frames
+import ffmpeg_mcp.raw_frames as raw_frames
+from ffmpeg_mcp.filtergraph import FilterGraph
+
+INDEX_FORMATS = ("vtt", "json")
+# 单张大图的最大边长（像素），避免播放器端解码过大的图片
+MAX_SHEET_SIDE = 16384
+
+
+def validate(interval, width, columns, rows, index_format):
+    if not interval or interval <= 0:
+        raise ValueError("interval 必须大于 0")
+    if not width or width <= 0:
+        raise ValueError("width 必须大于 0")
+    if columns < 1 or rows < 1:
+        raise ValueError("columns 和 rows 必须大于 0")
+    if width * columns > MAX_SHEET_SIDE:
+        raise ValueError(f"width * columns 不能超过 {MAX_SHEET_SIDE}")
+    if index_format not in INDEX_FORMATS:
+        raise ValueError(f"index_format 必须是 {list(INDEX_FORMATS)} 之一")
+
+
+def layout(video_path, interval, width, columns, rows, ext, keyframes_only):
+    """布局参数（同时作为缓存键的一部分）；缩略图高度按源画面比例计算为偶数"""
+    width, height = raw_frames.frame_geometry(video_path, width)
+    return {"interval": interval, "width": width, "height": height, "columns": columns, "rows": rows,
+            "ext": ext, "keyframes_only": bool(keyframes_only)}
+
+
+def build_sprite_command(video_path, spec, pattern) -> str:
+    graph = FilterGraph()
+    index = graph.add_input(video_path, "-skip_frame nokey" if spec["keyframes_only"] else "")
+    stream = graph.input_stream(index, "v")
+    if spec["keyframes_only"]:
+        stream = graph.chain(
+            stream, ("select", (f"isnan(prev_selected_t)+gte(t-prev_selected_t,{spec['interval']})",), {}))
+    else:
+        stream = graph.chain(stream, ("fps", (f"1/{spec['interval']}",), {}))
+    stream = graph.chain(stream,
+                         ("scale", (spec["width"], spec["height"]), {}),
+                         "showinfo@frames_w0",
+                         ("tile", (f"{spec['columns']}x{spec['rows']}",), {}))
+    output_args = "-vsync 0 " + frames.quality_args(spec["ext"], "medium")
+    return graph.command([stream], output_args.strip(), pattern)
+
+
+def build_cues(times, spec, duration):
+    """缩略图时间列表 → [{"start", "end", "sheet", "x", "y", "w", "h"}]，每张缩略图覆盖到下一张开始"""
+    per_sheet = spec["columns"] * spec["rows"]
+    cues = []
+    for i, start in enumerate(times):
+        if i + 1 < len(times):
+            end = times[i + 1]
+        else:
+            end = duration if duration and duration > start else start + spec["interval"]
+        slot = i % per_sheet
+        cues.append({
+            "start": round(start, 3), "end": round(end, 3), "sheet": i // per_sheet,
+            "x": (slot % spec["columns"]) * spec["width"], "y": (slot // spec["columns"]) * spec["height"],
+            "w": spec["width"], "h": spec["height"],
+        })
+    return cues
+
+
+def render_sheets(video_path, spec, work_dir, time_out=1000):
+    """
+    生成大图到 work_dir，返回 (status, log, sheets, cues)。
+    sheets 为按顺序排列的大图路径。
+    """
+    pattern = os.path.join(work_dir, f"sheet_%04d.{spec['ext']}")
+    code, log = ffmpeg.run_ffmpeg(build_sprite_command(video_path, spec, pattern), timeout=time_out)
+    times = [t for _, t in sorted(frames.parse_showinfo(log).get(0, []))]
+    sheets = sorted(glob.glob(os.path.join(work_dir, f"sheet_*.{spec['ext']}")))
+    fmt_ctx = ffmpeg.media_format_ctx(video_path)
+    duration = float(fmt_ctx.video_streams[0].duration or 0) if fmt_ctx is not None and fmt_ctx.video_streams else 0
+    cues = build_cues(times, spec, duration)
+    if cues and cues[-1]["sheet"] >= len(sheets):
+        code = code or -1
+    return code, frames.strip_showinfo(log), sheets, cues
+
+
+def _vtt_time(seconds) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+def write_index(path, index_format, spec, cues, sheet_names):
+    """写 WebVTT 或 JSON 索引；sheet_names 为相对索引文件的大图文件名"""
+    if index_format == "vtt":
+        lines = ["WEBVTT", ""]
+        for cue in cues:
+            lines.append(f"{_vtt_time(cue['start'])} --> {_vtt_time(cue['end'])}")
+            lines.append(f"{sheet_names[cue['sheet']]}#xywh={cue['x']},{cue['y']},{cue['w']},{cue['h']}")
+            lines.append("")
+        content = "\n".join(lines)
+    else:
+        content = json.dumps({
+            "width": spec["width"], "height": spec["height"], "columns": spec["columns"], "rows": spec["rows"],
+            "interval": spec["interval"], "sheets": sheet_names,
+            "cues": [dict(cue, sheet=sheet_names[cue["sheet"]]) for cue in cues],
+        }, ensure_ascii=False, indent=2)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def link_or_copy(src, dst):
+    """缓存文件放到输出目录：同一文件系统上用硬链接，否则复制"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
+
+
+def sheet_name(prefix, i, ext) -> str:
+    return f"{prefix}_{i + 1:03d}.{ext}"
@@ -0,0 +1,91 @@
+"""
+按需缩略图
+
+任意视频、任意时间点的一张缩略图，同步返回：
+- 命中：按 (文件指纹, t, w, 格式) 从内容寻址的磁盘缓存 thumbnail_cache 直接返回；
+- 未命中：输入侧 -ss 跳到 t 之前的关键帧，只解码到 t 取一帧，缩放后写入缓存；
+- 同一张缩略图的并发请求合并为一次 ffmpeg 调用，其余请求等待同一个结果。
+"""
+import os
+import shlex
+import tempfile
+import threading
+from concurrent.futures import Future
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.frames as frames
+import ffmpeg_mcp.utils as utils
+from ffmpeg_mcp.media_cache import thumbnail_cache
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+# 允许的最大宽度
+MAX_WIDTH = 3840
+# 单次 ffmpeg 调用的超时（秒）
+THUMBNAIL_TIMEOUT = int(os.getenv("MCP_THUMBNAIL_TIMEOUT", "30"))
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def parse_request(t, w=0, format="jpg"):
+    """校验参数，返回 (秒数, 宽度, 扩展名)"""
+    if t is None or t == "":
+        raise ValueError("t is required")
+    seconds = frames.parse_timestamps([t])[0]
+    try:
+        width = int(w or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"w 必须是整数: {w}")
+    if width < 0 or width > MAX_WIDTH:
+        raise ValueError(f"w 必须在 0 到 {MAX_WIDTH} 之间")
+    if format not in MEDIA_TYPES:
+        raise ValueError(f"format 必须是 {list(MEDIA_TYPES)} 之一")
+    return seconds, width, format
+
+
+def build_thumbnail_command(video_path, t, width, ext, output_path) -> str:
+    parts = [frames.window_input_args(t, None), "-i", shlex.quote(video_path), "-map 0:v:0 -frames:v 1"]
+    if width > 0:
+        parts.append(f"-vf scale={width}:-2")
+    parts += [frames.quality_args(ext, "medium"), "-y", shlex.quote(output_path)]
+    return " ".join(p for p in parts if p)
+
+
+def _render(video_path, t, width, ext, key):
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{ext}", prefix="ffmpeg_mcp_thumb_")
+    os.close(fd)
+    try:
+        code, log = ffmpeg.run_ffmpeg(build_thumbnail_command(video_path, t, width, ext, tmp_path),
+                                      timeout=THUMBNAIL_TIMEOUT)
+        if code != 0 or os.path.getsize(tmp_path) == 0:
+            raise ValueError(f"无法在 {t} 秒处取到画面: {log.strip()[-500:]}")
+        return thumbnail_cache.put(key, tmp_path, f".{ext}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_thumbnail(video_path, t, width=0, ext="jpg") -> str:
+    """
+    返回缓存中缩略图文件的路径（阻塞调用）。
+    取不到画面（t 超出时长等）时抛出 ValueError。
+    """
+    key = thumbnail_cache.make_key("thumbnail", utils.file_fingerprint(video_path), round(t, 3), width, ext)
+    cached = thumbnail_cache.get(key, f".{ext}")
+    if cached:
+        return cached
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        future.set_result(_render(video_path, t, width, ext, key))
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    return future.result()
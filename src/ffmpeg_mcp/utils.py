@@ -1,8 +1,10 @@
 import os
 import requests
 import hashlib
+import threading
 import tempfile
 import zipfile
+from collections import OrderedDict
 
 def convert_to_seconds(time_input):
     """
@@ -169,4 +171,62 @@ def ensure_local_path(path_or_url: str) -> str:
     except Exception as e:
         print(f"Download failed for {path_or_url}: {e}")
         # 如果下载失败，抛出异常以便上层捕获
-        raise ValueError(f"无法下载远程视频: {path_or_url}. 错误: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"无法下载远程视频: {path_or_url}. 错误: {str(e)}")
+
+def file_fingerprint(path: str) -> tuple:
+    """
+    返回文件指纹 (绝对路径, 文件大小, 修改时间ns, inode)，用于各类按文件缓存的失效判断。
+    文件被覆盖、修改或被另一个文件替换（rename）后指纹随之变化，旧缓存自然失效。
+    """
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    return (abs_path, st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+# file_fingerprint -> 内容哈希，未改动的文件只完整读取一次
+_content_hashes = OrderedDict()
+_content_hashes_lock = threading.Lock()
+MAX_CONTENT_HASHES = 4096
+
+
+def content_fingerprint(path: str) -> str:
+    """
+    文件完整内容的 sha256，与路径无关：复制、重新同步或重新下载的同一素材得到同一个值。
+    结果按 file_fingerprint 记在内存中，文件没有变化时不会重复读取。
+    """
+    key = file_fingerprint(path)
+    with _content_hashes_lock:
+        digest = _content_hashes.get(key)
+        if digest is not None:
+            _content_hashes.move_to_end(key)
+            return digest
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _content_hashes_lock:
+        _content_hashes[key] = digest
+        while len(_content_hashes) > MAX_CONTENT_HASHES:
+            _content_hashes.popitem(last=False)
+    return digest
+
+
+def get_cache_dir(name: str) -> str:
+    """
+    返回缓存子目录（不存在时自动创建）。
+    优先使用环境变量 MCP_CACHE_DIR，其次是根目录下的 /cache（Docker 卷挂载），最后是项目根目录下的 cache。
+    """
+    current_file_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.abspath(os.path.join(current_file_dir, "../../"))
+    root = os.getenv("MCP_CACHE_DIR") or ("/cache" if os.path.exists("/cache") else os.path.join(project_root, "cache"))
+    cache_dir = os.path.join(root, name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_videos_dir() -> str:
+    """素材目录：/videos（Docker 卷挂载），否则项目根目录下的 videos"""
+    current_file_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.abspath(os.path.join(current_file_dir, "../../"))
+    return "/videos" if os.path.exists("/videos") else os.path.join(project_root, "videos")
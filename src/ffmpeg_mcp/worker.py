@@ -0,0 +1,68 @@
+# worker.py
+"""
+分片编码 worker：从共享队列领取分片命令并执行 ffmpeg，结果写到共享存储。
+
+启动方式（每个节点可以启动多个）：
+    MCP_QUEUE_DB=/shared/chunk_queue.sqlite3 ffmpeg-mcp-worker
+
+跨主机共享队列文件时，共享存储必须支持 POSIX 文件锁，见 job_queue.py。
+"""
+import os
+import socket
+import threading
+import time
+
+import ffmpeg_mcp.ffmpeg as ffmpeg
+from ffmpeg_mcp.job_queue import ChunkQueue, HEARTBEAT_TIMEOUT
+
+
+def process_one(queue: ChunkQueue, worker_id: str, runner=None, heartbeat_interval: float = None) -> bool:
+    """
+    领取并执行一个分片，执行期间后台线程定期上报心跳。
+
+    返回:
+        bool: 是否处理了分片（队列为空时返回 False）
+    """
+    runner = runner or (lambda cmd: ffmpeg.run_ffmpeg(cmd, timeout=3600))
+    heartbeat_interval = heartbeat_interval or max(1.0, HEARTBEAT_TIMEOUT / 3)
+    chunk = queue.claim(worker_id)
+    if chunk is None:
+        return False
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(heartbeat_interval):
+            queue.heartbeat(chunk["id"], worker_id)
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    try:
+        code, log = runner(chunk["cmd"])
+    except Exception as e:
+        code, log = -1, f"worker 执行异常: {e}"
+    finally:
+        stop.set()
+        beater.join()
+    queue.complete(chunk["id"], worker_id, code, log)
+    return True
+
+
+def main():
+    queue = ChunkQueue(os.getenv("MCP_QUEUE_DB"))
+    worker_id = os.getenv("MCP_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+    poll_interval = float(os.getenv("MCP_WORKER_POLL", "1"))
+    print(f"Worker {worker_id} polling {queue.db_path}")
+    while True:
+        try:
+            if not process_one(queue, worker_id):
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"Worker error: {e}")
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -156,3 +156,32 @@ def test_audio_long(tmp_path_factory):
         capture_output=True,
     )
     return str(path)
+
+
+@pytest.fixture(scope="session")
+def test_clips(tmp_path_factory):
+    """生成 6 段编码参数相同、画面不同的 3 秒测试视频（含音轨）"""
+    folder = tmp_path_factory.mktemp("clips")
+    paths = []
+    for i in range(6):
+        path = folder / f"clip_{i}.mp4"
+        subprocess.run(
+            ['ffmpeg', '-y', '-f', 'lavfi', '-i', f'testsrc=duration=3:size=320x240:rate=25,hue=h={i * 60}',
+             '-f', 'lavfi', '-i', f'sine=frequency={300 + i * 100}:duration=3',
+             '-c:v', 'libx264', '-g', '25', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', str(path)],
+            capture_output=True,
+        )
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture(scope="session")
+def media_duration():
+    """用本地 ffprobe 读取容器时长（秒）"""
+    def probe(path):
+        out = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path],
+            capture_output=True, text=True,
+        )
+        return float(out.stdout.strip())
+    return probe
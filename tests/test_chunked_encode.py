@@ -0,0 +1,33 @@
+"""
+分片规划测试（纯函数，不需要服务端）
+"""
+from ffmpeg_mcp.chunked_encode import build_chunk_commands, clamp_to_inputs
+
+RANGES = [(0.0, 10.0), (10.0, 20.0), (20.0, 30.0), (30.0, None)]
+
+
+class TestClampToInputs:
+
+    def test_no_extra_inputs(self):
+        assert clamp_to_inputs(RANGES, []) == RANGES
+        assert clamp_to_inputs(RANGES, [None]) == RANGES
+
+    def test_longer_overlay_keeps_all_chunks(self):
+        assert clamp_to_inputs(RANGES, [45.0]) == RANGES
+
+    def test_short_overlay_merges_tail(self):
+        """叠加视频在 15 秒结束：之后的分片并入 10 秒起的那一段，该段一直编码到结尾"""
+        assert clamp_to_inputs(RANGES, [15.0]) == [(0.0, 10.0), (10.0, None)]
+
+    def test_overlay_ends_on_boundary(self):
+        assert clamp_to_inputs(RANGES, [20.0]) == [(0.0, 10.0), (10.0, None)]
+
+    def test_shortest_input_wins(self):
+        assert clamp_to_inputs(RANGES, [45.0, 5.0]) == [(0.0, None)]
+
+    def test_merged_chunk_seeks_overlay_before_its_end(self, tmp_path):
+        ranges = clamp_to_inputs(RANGES, [15.0])
+        commands = build_chunk_commands("bg.mp4", ranges, "-c:v libx264", str(tmp_path), ".mp4", ["ov.mp4"])
+        last = commands[-1][1].split()
+        assert last.count("-ss") == 2 and last[last.index("ov.mp4") - 2:last.index("ov.mp4")] == ["10.0", "-i"]
+        assert "-t" not in last
@@ -24,6 +24,25 @@ class TestConcatVideosWithMp3:
         res = info.get('result', {})
         assert res.get('status') == 0, f"处理失败: {res.get('log')}"
         assert res.get('path'), "缺少输出路径"
+        # 只替换音频时画面应直接 stream copy
+        assert res.get('plan', {}).get('video', {}).get('action') == 'copy', f"规划结果: {res.get('plan')}"
+
+    def test_single_pass_trims_last_video(self, mcp_client, test_clips, test_audio_medium, media_duration):
+        """两段 3s 视频 + 5s 音频 → 第二段由 concat 列表的 outpoint 截到 2s，一次 ffmpeg 输出 5s"""
+        result = mcp_client.call_tool("concat_videos_with_mp3", {
+            "video_paths": test_clips[:2],
+            "audio_path": test_audio_medium,
+            "mute_video_audio": True,
+            "order": "sequence",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED', f"任务失败: {info.get('error')}"
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert abs(media_duration(res['path']) - 5) < 0.5
 
     def test_order_reverse(self, mcp_client, test_video_url, test_audio_medium):
         """order=reverse 倒序拼接"""
@@ -0,0 +1,41 @@
+"""
+拼接规格化规划测试（纯函数，不需要服务端和 ffmpeg）
+"""
+from types import SimpleNamespace
+
+import ffmpeg_mcp.cut_video as cut_video
+import ffmpeg_mcp.encode_planner as encode_planner
+
+H264 = ("h264", "High", 1280, 720, "yuv420p", "25/1", "1/12800")
+AAC = ("aac", "48000", 2, "stereo")
+CTX = SimpleNamespace(video_streams=[object()], audio_streams=[object()])
+
+
+class TestNormalizationBlocker:
+
+    def test_encodable_target(self):
+        assert encode_planner.normalization_blocker((H264, AAC)) is None
+        assert encode_planner.normalization_blocker((H264, None)) is None
+
+    def test_codec_without_encoder(self):
+        prores = ("prores", "HQ") + H264[2:]
+        assert "prores" in encode_planner.normalization_blocker((prores, AAC))
+        pcm = ("pcm_s16le", "48000", 2, "stereo")
+        assert "pcm_s16le" in encode_planner.normalization_blocker((H264, pcm))
+
+
+class TestNormalizeCommand:
+
+    def test_uses_target_encoders(self):
+        cmd = cut_video._normalize_command("in.mp4", CTX, (H264, AAC), "out.mp4")
+        assert "-c:v libx264" in cmd and "-profile:v high " in cmd and "-c:a aac" in cmd
+
+    def test_profile_names_are_mapped(self):
+        video = ("h264", "High 4:4:4 Predictive") + H264[2:]
+        cmd = cut_video._normalize_command("in.mp4", CTX, (video, AAC), "out.mp4")
+        assert "-profile:v high444 " in cmd
+
+    def test_unknown_profile_is_dropped(self):
+        video = ("hevc", "Rext") + H264[2:]
+        cmd = cut_video._normalize_command("in.mp4", CTX, (video, AAC), "out.mp4")
+        assert "-c:v libx265" in cmd and "-profile:v" not in cmd
@@ -0,0 +1,58 @@
+"""
+流式去重测试（本地管道，不需要服务端和 ffmpeg）
+"""
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import ffmpeg_mcp.frame_dedupe as frame_dedupe
+from ffmpeg_mcp.frames import build_pipe_command
+
+
+def gray_frame(seed):
+    """9x8 的灰度小图（dhash 输入），seed 不同画面就不同"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(8, 9), dtype=np.uint8).tobytes()
+
+
+class TestStreamFilter:
+
+    def test_drops_duplicates_while_streaming(self):
+        # 画面序列 A A B B B A：相邻重复被丢弃，回到 A 时重新保留
+        raws = [gray_frame(s) for s in (1, 1, 2, 2, 2, 1)]
+        r, w = os.pipe()
+        f = frame_dedupe.StreamFilter("dhash", r, threshold=0)
+        kept = []
+        for i, raw in enumerate(raws):
+            os.write(w, raw)
+            kept += f.feed(f"img{i}")
+        os.close(w)
+        kept += f.finish()
+        assert kept == [(0, "img0"), (2, "img2"), (5, "img5")]
+        assert f.dropped == 3
+
+    def test_images_without_hash_are_kept(self):
+        r, w = os.pipe()
+        f = frame_dedupe.StreamFilter("dhash", r)
+        os.write(w, gray_frame(1))
+        os.close(w)
+        assert f.feed("a") + f.feed("b") + f.finish() == [(0, "a"), (1, "b")]
+
+    def test_select_distinct_matches_stream(self):
+        raws = [gray_frame(s) for s in (3, 3, 4, 3)]
+        hashes = frame_dedupe.hash_frames(b"".join(raws), "dhash")
+        assert frame_dedupe.select_distinct(hashes, 0) == [0, 2, 3]
+
+
+class TestPipeCommand:
+
+    def test_hash_output_goes_to_fd(self):
+        cmd = build_pipe_command("in.mp4", 0, (None, None), "jpg", fps=1, dedupe="dhash", hash_fd=7)
+        assert "pipe:1" in cmd and cmd.rstrip().endswith("pipe:7")
+        assert "-f rawvideo -pix_fmt gray" in cmd
+
+    def test_no_hash_output_for_mpdecimate(self):
+        cmd = build_pipe_command("in.mp4", 0, (None, None), "jpg", fps=1, dedupe="mpdecimate")
+        assert "mpdecimate" in cmd and "rawvideo" not in cmd
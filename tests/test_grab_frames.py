@@ -0,0 +1,26 @@
+"""
+grab_frames 的关键帧索引使用（替换 ffmpeg 调用，不需要服务端）
+"""
+import ffmpeg_mcp.cut_video as cut_video
+import ffmpeg_mcp.ffmpeg as ffmpeg
+import ffmpeg_mcp.keyframe_index as keyframe_index
+
+
+def test_grouping_does_not_wait_for_index(tmp_path, monkeypatch):
+    """keyframe_only=False 时不同步构建索引：未缓存时按时间间隔分组，索引交给后台构建"""
+    video = tmp_path / "a.mp4"
+    video.write_bytes(b"0")
+    prefetched = []
+
+    def blocking(path):
+        raise AssertionError("不应同步构建关键帧索引")
+
+    monkeypatch.setattr(keyframe_index, "get_keyframe_index", blocking)
+    monkeypatch.setattr(keyframe_index, "prefetch_keyframe_index", prefetched.append)
+    monkeypatch.setattr(ffmpeg, "run_ffmpeg", lambda cmd, timeout=None: (0, ""))
+    keyframe_index.clear_cache()
+
+    _, log, _, grabs = cut_video.grab_frames(str(video), [1, 1.5, 60], output_folder=str(tmp_path / "out"))
+    assert prefetched == [str(video)]
+    assert len(grabs) == 3
+    assert "in 2 ffmpeg runs" in log
@@ -81,6 +81,15 @@ class TestParameterValidation:
         resp = requests.get(f"{BASE_URL}/api/download_video", headers=HEADERS)
         assert resp.status_code == 400
 
+    def test_thumbnail_missing_time(self):
+        resp = requests.get(f"{BASE_URL}/api/thumbnail", headers=HEADERS, params={"path": "/videos/test.mp4"})
+        assert resp.status_code == 400
+
+    def test_thumbnail_nonexistent_file(self):
+        resp = requests.get(f"{BASE_URL}/api/thumbnail", headers=HEADERS,
+                            params={"path": "/videos/nonexistent_xyz.mp4", "t": 1})
+        assert resp.status_code == 404
+
     def test_find_video_path_missing_params(self):
         resp = requests.get(f"{BASE_URL}/api/find_video_path", headers=HEADERS)
         assert resp.status_code == 400
@@ -93,6 +102,49 @@ class TestParameterValidation:
         )
         assert resp.status_code == 400
 
+    def test_clip_video_batch_missing_ranges(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/clip_video_batch",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4"},
+        )
+        assert resp.status_code == 400
+
+    def test_run_job_graph_cycle(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/run_job_graph",
+            headers=HEADERS,
+            json={"steps": [
+                {"id": "a", "op": "scale_video", "params": {"video_path": "${b}", "width": 320}},
+                {"id": "b", "op": "scale_video", "params": {"video_path": "${a}", "width": 320}},
+            ]},
+        )
+        assert resp.status_code == 400
+
+    def test_run_batch_unknown_operation(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/run_batch",
+            headers=HEADERS,
+            json={"operation": "delete_videos", "files": ["/videos/test.mp4"]},
+        )
+        assert resp.status_code == 400
+
+    def test_run_pipeline_unknown_operation(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/run_pipeline",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "operations": [{"op": "blur"}]},
+        )
+        assert resp.status_code == 400
+
+    def test_package_video_invalid_format(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/package_video",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "format": "smooth"},
+        )
+        assert resp.status_code == 400
+
     def test_concat_videos_missing_input_files(self):
         resp = requests.post(
             f"{BASE_URL}/api/concat_videos",
@@ -141,6 +193,86 @@ class TestParameterValidation:
         )
         assert resp.status_code == 400
 
+    def test_extract_frames_invalid_window(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/extract_frames_from_video",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "start": 10, "end": 5},
+        )
+        assert resp.status_code == 400
+
+    def test_extract_frames_invalid_quality(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/extract_frames_from_video",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "format": 1, "quality": "ultra"},
+        )
+        assert resp.status_code == 400
+
+    def test_extract_frames_invalid_dedupe(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/extract_frames_from_video",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "dedupe": "ssim"},
+        )
+        assert resp.status_code == 400
+
+    def test_extract_raw_frames_invalid_pix_fmt(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/extract_raw_frames",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "pix_fmt": "yuv444p16"},
+        )
+        assert resp.status_code == 400
+
+    def test_release_raw_frames_unknown(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/release_raw_frames",
+            headers=HEADERS,
+            json={"name": "ffmpeg_mcp_nonexistent"},
+        )
+        assert resp.status_code == 404
+
+    def test_extract_frames_archive_invalid_format(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/extract_frames_archive",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "archive": "rar"},
+        )
+        assert resp.status_code == 400
+
+    def test_grab_frames_missing_timestamps(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/grab_frames",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "timestamps": []},
+        )
+        assert resp.status_code == 400
+
+    def test_generate_sprite_sheet_invalid_index_format(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/generate_sprite_sheet",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "index_format": "srt"},
+        )
+        assert resp.status_code == 400
+
+    def test_build_proxies_invalid_pattern(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/build_proxies",
+            headers=HEADERS,
+            json={"pattern": "../outside/*.mp4"},
+        )
+        assert resp.status_code == 400
+
+    def test_scale_video_preview_with_renditions(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/scale_video",
+            headers=HEADERS,
+            json={"video_path": "/videos/test.mp4", "renditions": [360], "preview": True},
+        )
+        assert resp.status_code == 400
+
     def test_extract_frames_missing_video_path(self):
         resp = requests.post(
             f"{BASE_URL}/api/extract_frames_from_video",
@@ -166,6 +298,28 @@ class TestTaskStatus:
         assert body["code"] == 1
         assert "not found" in body["message"].lower()
 
+    def test_stream_output_nonexistent_task(self):
+        resp = requests.get(
+            f"{BASE_URL}/api/stream_output/nonexistent-id",
+            headers=HEADERS,
+        )
+        assert resp.status_code == 404
+
+    def test_batch_results_nonexistent_task(self):
+        resp = requests.get(
+            f"{BASE_URL}/api/batch_results/nonexistent-id",
+            headers=HEADERS,
+        )
+        assert resp.status_code == 404
+
+    def test_concat_invalid_movflags(self):
+        resp = requests.post(
+            f"{BASE_URL}/api/concat_videos",
+            headers=HEADERS,
+            json={"input_files": ["/videos/a.mp4"], "movflags": "nope"},
+        )
+        assert resp.status_code == 400
+
 
 # --- 同步端点 ---
 
@@ -253,6 +407,21 @@ class TestAsyncTaskLifecycle:
         assert result["status"] == 0
         assert "path" in result
 
+    def test_thumbnail_concurrent_requests(self, test_video_url):
+        """并发请求同一张缩略图：都返回同样的图片"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        params = {"path": test_video_url, "t": 1.5, "w": 120}
+
+        def fetch(_):
+            return requests.get(f"{BASE_URL}/api/thumbnail", headers=HEADERS, params=params)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(fetch, range(4)))
+        assert all(r.status_code == 200 for r in responses)
+        assert all(r.headers["content-type"].startswith("image/jpeg") for r in responses)
+        assert len({r.content for r in responses}) == 1
+
     def test_concat_videos_full_lifecycle(self, test_video_url):
         """concat_videos 提交任务并轮询到完成"""
         resp = requests.post(
@@ -279,3 +448,24 @@ class TestAsyncTaskLifecycle:
             pytest.fail("任务轮询超时")
 
         assert status == "COMPLETED", f"任务失败: {status_resp.json()['data'].get('error')}"
+
+    def test_extract_frames_archive_stream(self, test_video_url):
+        """抽帧结果以 zip 流返回"""
+        import io
+        import json
+        import zipfile
+
+        resp = requests.post(
+            f"{BASE_URL}/api/extract_frames_archive",
+            headers=HEADERS,
+            json={"video_path": test_video_url, "fps": 1, "format": 1, "archive": "zip", "end": 4},
+            stream=True,
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/zip")
+        archive = zipfile.ZipFile(io.BytesIO(resp.content))
+        names = archive.namelist()
+        assert names[-1] == "frames.json"
+        index = json.loads(archive.read("frames.json"))
+        assert index["status"] == 0
+        assert [f["name"] for f in index["frames"]] == names[:-1]
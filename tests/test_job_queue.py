@@ -0,0 +1,175 @@
+"""
+分片编码共享队列测试（本地 SQLite 文件，不需要服务端）
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import ffmpeg_mcp.chunked_encode as chunked_encode
+from ffmpeg_mcp.job_queue import ChunkQueue
+from ffmpeg_mcp.worker import process_one
+
+
+def make_commands(tmp_path, count=3):
+    return [(str(tmp_path / f"chunk_{i}.mp4"), f"cmd {i} -y {tmp_path / f'chunk_{i}.mp4'}") for i in range(count)]
+
+
+def make_queue(tmp_path):
+    queue = ChunkQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue("job", make_commands(tmp_path))
+    return queue
+
+
+def write_output(cmd, data=b"ok"):
+    """模拟 ffmpeg：把数据写到命令末尾的输出文件"""
+    with open(cmd.split()[-1], "wb") as f:
+        f.write(data)
+
+
+class TestChunkQueue:
+
+    def test_claim_in_order(self, tmp_path):
+        queue = make_queue(tmp_path)
+        first = queue.claim("w1")
+        second = queue.claim("w2")
+        assert (first["idx"], second["idx"]) == (0, 1)
+        assert first["worker_id"] == "w1"
+
+    def test_complete(self, tmp_path):
+        queue = make_queue(tmp_path)
+        chunk = queue.claim("w1")
+        queue.complete(chunk["id"], "w1", 0, "ok")
+        rows = queue.job_chunks("job")
+        assert rows[0]["status"] == "done"
+        assert rows[0]["log"] == "ok"
+        assert [r["status"] for r in rows[1:]] == ["pending", "pending"]
+
+    def test_dead_worker_requeued(self, tmp_path):
+        """worker 领取后不再上报心跳，分片被重新分配，原 worker 迟到的结果被忽略"""
+        queue = make_queue(tmp_path)
+        chunk = queue.claim("dead")
+        assert queue.requeue_stale("job", timeout=-1) == 1
+
+        retry = queue.claim("alive")
+        assert retry["id"] == chunk["id"]
+        queue.complete(chunk["id"], "dead", 1, "stale result")
+        queue.complete(retry["id"], "alive", 0, "ok")
+
+        row = queue.job_chunks("job")[0]
+        assert row["status"] == "done"
+        assert row["worker_id"] == "alive"
+        assert row["attempts"] == 2
+        assert row["attempt_path"] == retry["attempt_path"]
+
+    def test_each_attempt_writes_its_own_file(self, tmp_path):
+        queue = make_queue(tmp_path)
+        first = queue.claim("slow")
+        queue.requeue_stale("job", timeout=-1)
+        second = queue.claim("fast")
+        assert first["attempt_path"].endswith("chunk_0.attempt1.mp4")
+        assert second["attempt_path"].endswith("chunk_0.attempt2.mp4")
+        assert first["cmd"].endswith(first["attempt_path"])
+        assert second["cmd"].endswith(second["attempt_path"])
+
+    def test_command_must_contain_output_path(self, tmp_path):
+        queue = ChunkQueue(str(tmp_path / "queue.sqlite3"))
+        with pytest.raises(ValueError):
+            queue.enqueue("job", [(str(tmp_path / "chunk_0.mp4"), "cmd 0")])
+
+    def test_rollback_journal(self, tmp_path):
+        """队列文件可能位于网络文件系统上，不能使用 WAL；旧的 WAL 队列也会切回回滚日志"""
+        path = str(tmp_path / "queue.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        ChunkQueue(path)
+        conn = sqlite3.connect(path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        conn.close()
+
+    def test_heartbeat_keeps_chunk(self, tmp_path):
+        queue = make_queue(tmp_path)
+        chunk = queue.claim("w1")
+        queue.heartbeat(chunk["id"], "w1")
+        assert queue.requeue_stale("job", timeout=60) == 0
+
+    def test_delete_job(self, tmp_path):
+        queue = make_queue(tmp_path)
+        queue.delete_job("job")
+        assert queue.job_chunks("job") == []
+        assert queue.claim("w1") is None
+
+    def test_cancel_job(self, tmp_path):
+        """取消后待处理分片不再被领取，返回仍在执行的分片数"""
+        queue = make_queue(tmp_path)
+        chunk = queue.claim("w1")
+        assert queue.cancel_job("job") == 1
+        assert queue.claim("w2") is None
+        queue.complete(chunk["id"], "w1", 0, "ok")
+        assert queue.cancel_job("job") == 0
+        assert [r["status"] for r in queue.job_chunks("job")] == ["done", "cancelled", "cancelled"]
+
+
+class TestRunCommandsQueue:
+
+    def test_failed_chunk_waits_for_running_chunks(self, tmp_path):
+        """一个分片失败后，协调者等其它 worker 正在执行的分片结束才删除作业，剩余分片不再执行"""
+        queue = ChunkQueue(str(tmp_path / "queue.sqlite3"))
+        commands = make_commands(tmp_path)
+        claimed = threading.Event()
+        ran = []
+
+        def slow(cmd):
+            claimed.set()
+            time.sleep(0.5)
+            ran.append(cmd.split()[1])
+            return 0, "ok"
+
+        def run_slow():
+            while not process_one(queue, "slow", runner=slow):
+                time.sleep(0.01)
+
+        def run_failing():
+            claimed.wait(5)
+            process_one(queue, "failing", runner=lambda cmd: (ran.append(cmd.split()[1]) or 1, "boom"))
+
+        threads = [threading.Thread(target=run_slow), threading.Thread(target=run_failing)]
+        for t in threads:
+            t.start()
+        results = chunked_encode.run_commands_queue(commands, timeout=10, queue=queue, poll_interval=0.05)
+        assert ran == ["1", "0"]
+        assert [code for code, _, _ in results] == [0, 1, 0]
+        for t in threads:
+            t.join()
+        assert queue.claim("late") is None
+
+    def test_late_worker_does_not_overwrite_accepted_chunk(self, tmp_path):
+        """心跳超时被重新分配的慢 worker 迟到写出的文件不会进入拼接"""
+        queue = ChunkQueue(str(tmp_path / "queue.sqlite3"))
+        commands = make_commands(tmp_path, 1)
+        slow = {}
+
+        def run_workers():
+            while not slow:
+                chunk = queue.claim("slow")
+                if chunk is None:
+                    time.sleep(0.01)
+                    continue
+                slow.update(chunk)
+            # 慢 worker 不上报心跳，被判定超时后由另一个 worker 完成
+            while not process_one(queue, "fast", runner=lambda cmd: (write_output(cmd, b"good"), (0, "ok"))[1]):
+                queue.requeue_stale(timeout=-1)
+                time.sleep(0.01)
+
+        worker = threading.Thread(target=run_workers)
+        worker.start()
+        results = chunked_encode.run_commands_queue(commands, timeout=10, queue=queue, poll_interval=0.05)
+        worker.join()
+        # 慢 worker 最终写完自己的文件并上报，结果被忽略
+        write_output(slow["cmd"], b"late")
+        queue.complete(slow["id"], "slow", 0, "late")
+        assert [code for code, _, _ in results] == [0]
+        with open(commands[0][0], "rb") as f:
+            assert f.read() == b"good"
@@ -0,0 +1,159 @@
+"""
+关键帧索引测试（纯内存索引，不需要服务端和 ffprobe）
+"""
+import os
+from array import array
+from fractions import Fraction
+
+import pytest
+
+import ffmpeg_mcp.keyframe_index as keyframe_index
+from ffmpeg_mcp.keyframe_index import KeyframeIndex
+
+
+def make_index(times, time_base=Fraction(1, 1000), gop_frames=None):
+    pts = array("q", (int(t * 1000) for t in times))
+    pos = array("q", (i * 100 for i in range(len(pts))))
+    gops = array("q", gop_frames) if gop_frames is not None else None
+    return KeyframeIndex(time_base, pts, pos, duration=times[-1] + 2 if times else 0.0, gop_frames=gops)
+
+
+@pytest.fixture
+def index():
+    # 关键帧在 0 / 2 / 4.5 / 10 秒
+    return make_index([0, 2, 4.5, 10], gop_frames=[50, 60, 130, 40])
+
+
+class TestLookup:
+
+    def test_prev_keyframe(self, index):
+        assert index.prev_keyframe(3) == 2
+        assert index.prev_keyframe(9.999) == 4.5
+        assert index.prev_keyframe(100) == 10
+
+    def test_next_keyframe(self, index):
+        assert index.next_keyframe(0.001) == 2
+        assert index.next_keyframe(4.6) == 10
+        assert index.next_keyframe(10.5) is None
+
+    def test_nearest_keyframe(self, index):
+        assert index.nearest_keyframe(3.0) == 2
+        assert index.nearest_keyframe(3.5) == 4.5
+        # 距离相等时取前一个关键帧
+        assert index.nearest_keyframe(1.0) == 0
+        assert index.nearest_keyframe(50) == 10
+
+    def test_exact_hits(self, index):
+        for t in (0, 2, 4.5, 10):
+            assert index.prev_keyframe(t) == t
+            assert index.next_keyframe(t) == t
+            assert index.nearest_keyframe(t) == t
+            assert index.is_keyframe(t)
+        assert not index.is_keyframe(3)
+
+    def test_boundaries(self, index):
+        assert index.prev_keyframe(-1) is None
+        assert index.next_keyframe(-1) == 0
+        assert index.nearest_keyframe(-1) == 0
+        assert index.byte_offset(-1) is None
+        assert index.byte_offset(0) == 0
+        assert index.byte_offset(5) == 200
+
+    def test_time_strings(self, index):
+        assert index.prev_keyframe("00:00:03") == 2
+        assert index.next_keyframe("00:00:04.6") == 10
+
+    def test_frame_count(self, index):
+        assert index.frame_count(0, 4.5) == 110
+        assert index.frame_count(4.5) == 170
+        assert make_index([0, 2]).frame_count(0) is None
+
+    def test_empty_index(self):
+        empty = make_index([])
+        assert len(empty) == 0
+        assert empty.times() == []
+        assert empty.prev_keyframe(1) is None
+        assert empty.next_keyframe(1) is None
+        assert empty.nearest_keyframe(1) is None
+        assert not empty.is_keyframe(0)
+        assert empty.byte_offset(1) is None
+
+
+class TestCache:
+
+    @pytest.fixture(autouse=True)
+    def fake_build(self, monkeypatch):
+        keyframe_index.clear_cache()
+        builds = []
+
+        def build(path, timeout=600):
+            builds.append(path)
+            return make_index([0, len(builds)])
+
+        monkeypatch.setattr(keyframe_index, "build_keyframe_index", build)
+        yield builds
+        keyframe_index.clear_cache()
+
+    def test_hit_does_not_rebuild(self, tmp_path, fake_build):
+        video = tmp_path / "a.mp4"
+        video.write_bytes(b"0" * 10)
+        first = keyframe_index.get_keyframe_index(str(video))
+        assert keyframe_index.get_keyframe_index(str(video)) is first
+        assert len(fake_build) == 1
+
+    def test_fingerprint_change_invalidates(self, tmp_path, fake_build):
+        video = tmp_path / "a.mp4"
+        video.write_bytes(b"0" * 10)
+        first = keyframe_index.get_keyframe_index(str(video))
+        # 同样大小、不同 mtime 的改写
+        stat = video.stat()
+        os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = keyframe_index.get_keyframe_index(str(video))
+        assert second is not first
+        assert len(fake_build) == 2
+        # 大小变化同样会重建
+        video.write_bytes(b"0" * 20)
+        assert keyframe_index.get_keyframe_index(str(video)) is not second
+        assert len(fake_build) == 3
+
+    def test_lru_eviction(self, tmp_path, monkeypatch, fake_build):
+        monkeypatch.setattr(keyframe_index, "MAX_CACHED_INDEXES", 2)
+        paths = []
+        for name in ("a", "b", "c"):
+            p = tmp_path / f"{name}.mp4"
+            p.write_bytes(b"0")
+            paths.append(str(p))
+        a, b, c = paths
+        keyframe_index.get_keyframe_index(a)
+        keyframe_index.get_keyframe_index(b)
+        # 访问 a 使其成为最近使用，随后加入 c 时淘汰 b
+        keyframe_index.get_keyframe_index(a)
+        keyframe_index.get_keyframe_index(c)
+        assert len(fake_build) == 3
+        keyframe_index.get_keyframe_index(a)
+        assert len(fake_build) == 3
+        keyframe_index.get_keyframe_index(b)
+        assert fake_build[-1] == b and len(fake_build) == 4
+
+    def test_missing_file(self, tmp_path, fake_build):
+        assert keyframe_index.get_keyframe_index(str(tmp_path / "missing.mp4")) is None
+        assert fake_build == []
+
+    def test_cached_lookup_never_builds(self, tmp_path, fake_build):
+        video = tmp_path / "a.mp4"
+        video.write_bytes(b"0")
+        assert keyframe_index.cached_keyframe_index(str(video)) is None
+        assert fake_build == []
+        built = keyframe_index.get_keyframe_index(str(video))
+        assert keyframe_index.cached_keyframe_index(str(video)) is built
+
+    def test_prefetch_builds_in_background(self, tmp_path, fake_build):
+        video = tmp_path / "a.mp4"
+        video.write_bytes(b"0")
+        thread = keyframe_index.prefetch_keyframe_index(str(video))
+        assert thread is not None
+        thread.join(5)
+        assert keyframe_index.cached_keyframe_index(str(video)) is not None
+        # 已缓存时不再启动构建
+        assert keyframe_index.prefetch_keyframe_index(str(video)) is None
+        assert len(fake_build) == 1
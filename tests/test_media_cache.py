@@ -0,0 +1,126 @@
+"""
+内容寻址磁盘缓存测试（本地临时目录，不需要服务端）
+"""
+import os
+import shutil
+import threading
+import time
+
+import ffmpeg_mcp.utils as utils
+from ffmpeg_mcp.media_cache import MediaCache
+
+
+def make_cache(tmp_path, monkeypatch, max_bytes=1024 ** 2):
+    monkeypatch.setenv("MCP_CACHE_DIR", str(tmp_path / "cache"))
+    return MediaCache("test", max_bytes)
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+class TestMediaCache:
+
+    def test_put_and_get(self, tmp_path, monkeypatch):
+        cache = make_cache(tmp_path, monkeypatch)
+        key = cache.make_key("a", 1)
+        assert cache.get(key, ".bin") is None
+        path = cache.put(key, write_file(tmp_path / "src.bin", b"data"), ".bin")
+        assert cache.get(key, ".bin") == path
+        assert open(path, "rb").read() == b"data"
+        assert not os.path.exists(tmp_path / "src.bin")
+
+    def test_concurrent_put_same_key(self, tmp_path, monkeypatch):
+        """多个线程同时写入同一个键：全部成功，保留先写入的副本，不留下临时文件"""
+        cache = make_cache(tmp_path, monkeypatch)
+        key = cache.make_key("same")
+        errors = []
+        results = []
+
+        def put(n):
+            try:
+                for i in range(50):
+                    src = write_file(tmp_path / f"src_{n}_{i}.bin", b"x" * 100)
+                    results.append(cache.put(key, src, ".bin"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=put, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert set(results) == {cache.path_for(key, ".bin")}
+        leftovers = [n for _, _, names in os.walk(cache.root) for n in names if n.endswith(".tmp")]
+        assert leftovers == []
+
+    def test_evict_least_recently_used(self, tmp_path, monkeypatch):
+        cache = make_cache(tmp_path, monkeypatch, max_bytes=250)
+        paths = []
+        for i in range(3):
+            paths.append(cache.put(cache.make_key(i), write_file(tmp_path / f"{i}.bin", b"x" * 100), ".bin"))
+            time.sleep(0.01)
+        assert not os.path.exists(paths[0])
+        assert os.path.exists(paths[1]) and os.path.exists(paths[2])
+
+    def test_checkout_survives_eviction(self, tmp_path, monkeypatch):
+        """取出的硬链接在缓存条目被淘汰后仍然可读"""
+        cache = make_cache(tmp_path, monkeypatch, max_bytes=150)
+        key = cache.make_key("in-use")
+        cache.put(key, write_file(tmp_path / "a.bin", b"a" * 100), ".bin")
+        dest = str(tmp_path / "job.bin")
+        assert cache.checkout(key, ".bin", dest) == dest
+        cache.put(cache.make_key("other"), write_file(tmp_path / "b.bin", b"b" * 100), ".bin")
+        assert cache.get(key, ".bin") is None
+        assert open(dest, "rb").read() == b"a" * 100
+        assert cache.checkout(key, ".bin", str(tmp_path / "miss.bin")) is None
+
+    def test_put_link_to(self, tmp_path, monkeypatch):
+        cache = make_cache(tmp_path, monkeypatch)
+        src = write_file(tmp_path / "work.bin", b"data")
+        assert cache.put(cache.make_key("linked"), src, ".bin", link_to=src) == src
+        assert open(src, "rb").read() == b"data"
+
+
+class TestContentFingerprint:
+
+    def test_same_head_tail_different_middle(self, tmp_path):
+        """大小与头尾相同、中间不同的两个文件不能得到同一个指纹"""
+        head, tail = b"h" * 1024 * 1024, b"t" * 1024 * 1024
+        a = write_file(tmp_path / "a.bin", head + b"A" * 1024 + tail)
+        b = write_file(tmp_path / "b.bin", head + b"B" * 1024 + tail)
+        assert utils.content_fingerprint(a) != utils.content_fingerprint(b)
+
+    def test_copy_has_same_fingerprint(self, tmp_path):
+        """内容寻址：复制到别处的同一素材命中同一个缓存键"""
+        a = write_file(tmp_path / "a.bin", b"clip" * 1000)
+        os.makedirs(tmp_path / "synced")
+        b = str(tmp_path / "synced" / "a.bin")
+        shutil.copyfile(a, b)
+        assert utils.content_fingerprint(a) == utils.content_fingerprint(b)
+
+    def test_rewrite_changes_fingerprint(self, tmp_path):
+        path = write_file(tmp_path / "a.bin", b"a" * 100)
+        before = utils.content_fingerprint(path)
+        assert utils.content_fingerprint(path) == before
+        st = os.stat(path)
+        write_file(path, b"b" * 100)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        assert utils.content_fingerprint(path) != before
+
+    def test_unchanged_file_hashed_once(self, tmp_path, monkeypatch):
+        path = write_file(tmp_path / "a.bin", b"a" * 100)
+        reads = []
+        real_open = open
+
+        def counting_open(file, *args, **kwargs):
+            reads.append(file)
+            return real_open(file, *args, **kwargs)
+
+        digest = utils.content_fingerprint(path)
+        monkeypatch.setattr("builtins.open", counting_open)
+        assert utils.content_fingerprint(path) == digest
+        assert reads == []
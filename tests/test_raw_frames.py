@@ -0,0 +1,82 @@
+"""
+共享内存原始帧测试（本地共享内存，不需要服务端和 ffmpeg）
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+
+import ffmpeg_mcp.raw_frames as raw_frames
+
+
+def make_handle(shm, count=2, shape=(2, 2, 3)):
+    return {"name": shm.name, "shape": list(shape), "frame_bytes": 12, "capacity": count}
+
+
+# 独立的消费者进程（有自己的 resource_tracker，multiprocessing 子进程会共用父进程的）
+CONSUMER = """
+import json, sys
+import ffmpeg_mcp.raw_frames as raw_frames
+shm, data = raw_frames.attach(json.loads(sys.argv[1]))
+print(int(data[0, 0, 0, 0]) if hasattr(data, "shape") else data[0])
+shm.close()
+"""
+
+
+class FakeRing:
+    def __init__(self, size):
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.shm.close()
+        self.shm.unlink()
+
+
+class TestAttach:
+
+    def test_consumer_exit_keeps_block(self):
+        """另一进程 attach 后退出，共享内存块仍然存在"""
+        shm = shared_memory.SharedMemory(create=True, size=24)
+        try:
+            shm.buf[0] = 7
+            src = os.path.join(os.path.dirname(__file__), "..", "src")
+            proc = subprocess.run([sys.executable, "-c", CONSUMER, json.dumps(make_handle(shm))],
+                                  capture_output=True, text=True, timeout=60,
+                                  env=dict(os.environ, PYTHONPATH=os.path.abspath(src)))
+            assert proc.returncode == 0, proc.stderr
+            assert proc.stdout.strip() == "7"
+            assert "leaked shared_memory" not in proc.stderr
+            # 消费者的 resource_tracker 在其退出后异步清理，稍等再检查
+            time.sleep(0.5)
+            again = shared_memory.SharedMemory(name=shm.name)
+            assert again.buf[0] == 7
+            again.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class TestReclaim:
+
+    def test_expired_and_over_budget(self, monkeypatch):
+        monkeypatch.setattr(raw_frames, "MAX_TOTAL_SHARED_BYTES", 3 * 4096)
+        monkeypatch.setattr(raw_frames, "_blocks", raw_frames.OrderedDict())
+        expired, oldest, newest = FakeRing(4096), FakeRing(4096), FakeRing(4096)
+        now = time.time()
+        raw_frames._blocks[expired.shm.name] = (expired, now - 1)
+        raw_frames._blocks[oldest.shm.name] = (oldest, now + 60)
+        raw_frames._blocks[newest.shm.name] = (newest, now + 60)
+        try:
+            raw_frames._reclaim(2 * 4096)
+            assert expired.closed and oldest.closed and not newest.closed
+            assert list(raw_frames._blocks) == [newest.shm.name]
+            assert raw_frames.release(newest.shm.name)
+            assert not raw_frames.release(newest.shm.name)
+        finally:
+            for ring in (expired, oldest, newest):
+                if not ring.closed:
+                    ring.close()
@@ -22,6 +22,47 @@ class TestClipVideo:
         assert info.get('result', {}).get('status') == 0
 
 
+class TestClipVideoBatch:
+    """clip_video_batch 批量剪辑"""
+
+    def test_clip_multiple_ranges(self, mcp_client, test_video_url):
+        """一次任务输出多个片段"""
+        result = mcp_client.call_tool("clip_video_batch", {
+            "video_path": test_video_url,
+            "ranges": [
+                {"start": 0, "end": 2},
+                {"start": 3, "duration": 2},
+                {"start": 6, "end": 8},
+            ],
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        clips = res.get('clips', [])
+        assert len(clips) == 3
+        assert all(c.get('status') == 0 and c.get('path') for c in clips)
+
+    def test_bad_range_reported_per_clip(self, mcp_client, test_video_url):
+        """无效区间只让对应片段失败；两次批量剪辑的默认输出路径互不相同"""
+        paths = []
+        for _ in range(2):
+            result = mcp_client.call_tool("clip_video_batch", {
+                "video_path": test_video_url,
+                "ranges": [{"start": 0, "end": 2}, {"start": 3}],
+            })
+            info = mcp_client.poll_task(result.get('task_id'))
+            assert info.get('status') == 'COMPLETED'
+            clips = info.get('result', {}).get('clips', [])
+            assert clips[0].get('status') == 0 and clips[0].get('path')
+            assert clips[1].get('status') == -1 and clips[1].get('error')
+            paths.append(clips[0]['path'])
+        assert paths[0] != paths[1]
+
+
 class TestConcatVideos:
     """concat_videos 视频拼接"""
 
@@ -37,6 +78,54 @@ class TestConcatVideos:
         info = mcp_client.poll_task(task_id)
         assert info.get('status') == 'COMPLETED'
 
+    def test_concat_auto_mode(self, mcp_client, test_video_url):
+        """auto 模式：规格一致的输入不转码，直接拼接"""
+        result = mcp_client.call_tool("concat_videos", {
+            "input_files": [test_video_url, test_video_url, test_video_url],
+            "fast": "auto",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0
+        assert res.get('plan', {}).get('normalized') == []
+
+    def test_concat_fragmented(self, mcp_client, test_video_url):
+        """fragmented 输出：路径在任务运行时即公布，结果为分片 MP4"""
+        result = mcp_client.call_tool("concat_videos", {
+            "input_files": [test_video_url, test_video_url],
+            "fast": False,
+            "movflags": "fragmented",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert res.get('path')
+
+    def test_concat_tree(self, mcp_client, test_clips, media_duration):
+        """6 个输入、chunks=3：每组 2 个并行重新编码，再 stream copy 拼接，时长等于各段之和"""
+        result = mcp_client.call_tool("concat_videos", {
+            "input_files": test_clips,
+            "fast": False,
+            "chunks": 3,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert res.get('plan') == {"mode": "tree", "fan_in": 2, "groups": 3}
+        assert abs(media_duration(res['path']) - 3 * len(test_clips)) < 0.5
+
 
 class TestScaleVideo:
     """scale_video 视频缩放"""
@@ -54,3 +143,421 @@ class TestScaleVideo:
         info = mcp_client.poll_task(task_id)
         assert info.get('status') == 'COMPLETED'
         assert info.get('result', {}).get('status') == 0
+
+    def test_scale_chunked(self, mcp_client, test_video_url):
+        """按关键帧分片并行编码"""
+        result = mcp_client.call_tool("scale_video", {
+            "video_path": test_video_url,
+            "width": 320,
+            "height": -2,
+            "chunks": 2,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert res.get('chunked', {}).get('chunks', 0) >= 1
+
+    def test_scale_renditions(self, mcp_client, test_video_url):
+        """一次解码输出多码率阶梯"""
+        result = mcp_client.call_tool("scale_video", {
+            "video_path": test_video_url,
+            "renditions": [360, "320x180"],
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        renditions = res.get('renditions', [])
+        assert [r.get('height') for r in renditions] == [360, 180]
+        assert all(r.get('size', 0) > 0 for r in renditions)
+
+
+class TestPreviewProxy:
+    """preview=true — 在低码率代理文件上快速预览"""
+
+    def test_build_proxies(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("build_proxies", {"files": [test_video_url]})
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('proxies')}"
+        assert res['proxies'][0]['proxy']
+
+    def test_scale_preview(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("scale_video", {
+            "video_path": test_video_url,
+            "width": 1280,
+            "height": -2,
+            "preview": True,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+
+    def test_preview_rejects_renditions(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("scale_video", {
+            "video_path": test_video_url,
+            "renditions": [360],
+            "preview": True,
+        })
+        assert 'error' in result
+
+
+class TestRunPipeline:
+    """run_pipeline — 多个操作融合为一次 ffmpeg"""
+
+    def test_clip_scale_overlay_concat(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("run_pipeline", {
+            "video_path": test_video_url,
+            "operations": [
+                {"op": "clip", "start": 1, "end": 4},
+                {"op": "scale", "width": 320},
+                {"op": "overlay", "overlay_video": test_video_url, "position": 5, "width": 80},
+                {"op": "concat", "input_files": [test_video_url]},
+            ],
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        plan = res.get('plan', {})
+        assert plan.get('width') == 320
+        assert plan.get('operations') == ['clip', 'scale', 'overlay', 'concat']
+
+
+class TestRunJobGraph:
+    """run_job_graph — 多步骤 DAG，一个 task_id"""
+
+    def test_clip_batch_then_concat(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("run_job_graph", {"steps": [
+            {"id": "clips", "op": "clip_video_batch",
+             "params": {"video_path": test_video_url, "ranges": [[0, 2], [4, 6]]}},
+            {"id": "small", "op": "scale_video", "params": {"video_path": test_video_url, "width": 160}},
+            {"id": "merged", "op": "concat_videos",
+             "params": {"input_files": "${clips.paths}", "fast": "auto"}},
+        ]})
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        nodes = res.get('nodes', {})
+        assert res.get('status') == 0, f"节点状态: {nodes}"
+        assert nodes['clips']['result']['scratch'] is True
+        assert nodes['merged']['result'].get('url')
+
+
+class TestRunBatch:
+    """run_batch — 同一操作批量作用于多个文件"""
+
+    def test_scale_many(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("run_batch", {
+            "operation": "scale_video",
+            "params": {"width": 160},
+            "files": [test_video_url, test_video_url],
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('total') == 2
+        assert res.get('completed') == 2, f"汇总: {res}"
+
+        page = mcp_client.call_tool("get_batch_results", {"task_id": task_id, "limit": 1})
+        assert page.get('total') == 2
+        assert len(page.get('items', [])) == 1
+        assert page['items'][0]['status'] == 0
+
+
+class TestPackageVideo:
+    """package_video — HLS / DASH 打包"""
+
+    def test_hls_ladder(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("package_video", {
+            "video_path": test_video_url,
+            "format": "hls",
+            "renditions": [360, 180],
+            "segment_seconds": 2,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert res.get('path', '').endswith('master.m3u8')
+        assert res.get('package', {}).get('renditions') == ['360p', '180p']
+
+    def test_dash_source(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("package_video", {
+            "video_path": test_video_url,
+            "format": "dash",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert res.get('path', '').endswith('manifest.mpd')
+
+
+class TestExtractFrames:
+    """extract_frames_from_video — 按时间窗口抽帧"""
+
+    def test_windows_with_timestamps(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_frames_from_video", {
+            "video_path": test_video_url,
+            "fps": 1,
+            "format": 1,
+            "windows": [[1, 3], {"start": 4, "duration": 2}],
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        frames = res.get('frames', [])
+        assert {f['window'] for f in frames} == {0, 1}
+        for f in frames:
+            low, high = (1, 3) if f['window'] == 0 else (4, 6)
+            assert low - 0.1 <= f['time'] <= high
+
+
+    def test_sharded_numbering(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_frames_from_video", {
+            "video_path": test_video_url,
+            "format": 1,
+            "shards": 3,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        names = [f['path'].rsplit('/', 1)[-1] for f in res.get('frames', [])]
+        assert names == [f"frame_{i:04d}.jpg" for i in range(1, len(names) + 1)]
+        times = [f['time'] for f in res.get('frames', [])]
+        assert times == sorted(times)
+
+
+    def test_keyframes_only_preview(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_frames_from_video", {
+            "video_path": test_video_url,
+            "format": 2,
+            "keyframes_only": True,
+            "min_interval": 2,
+            "width": 160,
+            "quality": "low",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        times = [f['time'] for f in res.get('frames', [])]
+        assert times
+        assert all(b - a >= 2 - 0.01 for a, b in zip(times, times[1:]))
+
+
+    def test_tar_archive_on_disk(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_frames_from_video", {
+            "video_path": test_video_url,
+            "fps": 1,
+            "format": 1,
+            "archive": "tar",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        assert res.get('path', '').endswith('.tar')
+        assert res.get('frames')
+        assert res['frames'][0]['name'] == 'frame_0001.jpg'
+
+
+    def test_mpdecimate_dedupe(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_frames_from_video", {
+            "video_path": test_video_url,
+            "fps": 1,
+            "format": 1,
+            "dedupe": "mpdecimate",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        paths = [f['path'] for f in res.get('frames', [])]
+        assert paths
+        # 去重后仍然从 frame_0001 开始连续编号
+        assert all(p.endswith(f"frame_{i:04d}.jpg") for i, p in enumerate(paths, 1))
+
+
+    def test_dhash_dedupe_into_archive(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_frames_from_video", {
+            "video_path": test_video_url,
+            "fps": 1,
+            "format": 1,
+            "archive": "zip",
+            "dedupe": "dhash",
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        names = [f['name'] for f in res.get('frames', [])]
+        assert names
+        # 重复画面在写入归档之前就被丢弃，归档内仍然连续编号
+        assert names == [f"frame_{i:04d}.jpg" for i in range(1, len(names) + 1)]
+        assert all(f['time'] is not None for f in res['frames'])
+
+
+class TestGrabFrames:
+    """grab_frames — 任意时间点抓帧"""
+
+    def test_sparse_timestamps(self, mcp_client, test_video_url):
+        timestamps = [0.5, 1, 1.5, 5]
+        result = mcp_client.call_tool("grab_frames", {
+            "video_path": test_video_url,
+            "timestamps": timestamps,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        grabs = res.get('frames', [])
+        assert [g['timestamp'] for g in grabs] == timestamps
+        assert all(g['path'] for g in grabs)
+
+    def test_separate_calls_do_not_collide(self, mcp_client, test_video_url):
+        """两次抓取相同时间点：默认各自写到独立的子目录"""
+        folders = []
+        for _ in range(2):
+            result = mcp_client.call_tool("grab_frames", {
+                "video_path": test_video_url,
+                "timestamps": [1],
+            })
+            info = mcp_client.poll_task(result.get('task_id'))
+            assert info.get('status') == 'COMPLETED'
+            res = info.get('result', {})
+            assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+            folders.append(res.get('path'))
+        assert folders[0] != folders[1]
+
+    def test_keyframe_only_inline(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("grab_frames", {
+            "video_path": test_video_url,
+            "timestamps": [2, 4],
+            "keyframe_only": True,
+            "inline": True,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        for g in res.get('frames', []):
+            assert g['data']
+            assert g['mime_type'].startswith('image/')
+
+
+class TestGenerateSpriteSheet:
+    """generate_sprite_sheet — 拖动预览雪碧图"""
+
+    def _run(self, mcp_client, args):
+        result = mcp_client.call_tool("generate_sprite_sheet", args)
+        task_id = result.get('task_id')
+        assert task_id
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        return res
+
+    def test_vtt_index(self, mcp_client, test_video_url):
+        res = self._run(mcp_client, {
+            "video_path": test_video_url,
+            "interval": 1,
+            "width": 96,
+            "columns": 4,
+            "rows": 2,
+        })
+        assert res.get('path', '').endswith('.vtt')
+        assert res.get('sheets')
+
+    def test_cached_json_index(self, mcp_client, test_video_url):
+        args = {"video_path": test_video_url, "interval": 2, "width": 64, "index_format": "json",
+                "keyframes_only": True}
+        first = self._run(mcp_client, args)
+        second = self._run(mcp_client, args)
+        assert first.get('path', '').endswith('.json')
+        assert '缓存命中' in second.get('log', '')
+        assert len(second.get('sheets', [])) == len(first.get('sheets', []))
+
+
+class TestExtractRawFrames:
+    """extract_raw_frames — 原始画面写入共享内存"""
+
+    def test_shared_memory_handle(self, mcp_client, test_video_url):
+        result = mcp_client.call_tool("extract_raw_frames", {
+            "video_path": test_video_url,
+            "max_frames": 10,
+            "width": 64,
+            "height": 36,
+        })
+        task_id = result.get('task_id')
+        assert task_id
+
+        info = mcp_client.poll_task(task_id)
+        assert info.get('status') == 'COMPLETED'
+        res = info.get('result', {})
+        assert res.get('status') == 0, f"处理失败: {res.get('log')}"
+        handle = res['handle']
+        assert handle['shape'] == [36, 64, 3]
+        assert 0 < handle['count'] <= 10
+        assert handle['frame_bytes'] == 36 * 64 * 3
+
+        released = mcp_client.call_tool("release_raw_frames", {"name": handle['name']})
+        assert released.get('released') is True